@@ -0,0 +1,115 @@
+import importlib.util
+import threading
+from functools import lru_cache
+from typing import Optional, Union
+
+import httpx
+from openai import (
+    AsyncAzureOpenAI,
+    AsyncOpenAI,
+    AzureOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
+
+from app.config.settings import AzureOpenAISettings, OpenAISettings, Settings, get_settings
+
+# HTTP/2 n'est activé que si le paquet optionnel `h2` est installé (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class LLMClients:
+    """
+    Registre des clients OpenAI ou Azure OpenAI partagés par toute l'application.
+
+    Les clients synchrone et asynchrone sont créés une seule fois, à la première utilisation, et
+    conservent leur pool de connexions HTTP keep-alive entre les appels d'embedding et de chat.
+    """
+
+    def __init__(self, settings: Settings):
+        """
+        Args:
+            settings: Les paramètres de l'application ; `use_azure` choisit le fournisseur.
+        """
+        self.use_azure = settings.use_azure
+        self.llm_settings: Union[OpenAISettings, AzureOpenAISettings] = (
+            settings.azure_openai if self.use_azure else settings.openai
+        )
+        self.chat_model = self.llm_settings.default_model
+        self.embedding_model = self.llm_settings.embedding_model
+        self._client: Optional[Union[OpenAI, AzureOpenAI]] = None
+        self._async_client: Optional[Union[AsyncOpenAI, AsyncAzureOpenAI]] = None
+        self._lock = threading.Lock()
+
+    def _http_options(self) -> dict:
+        """Options du client httpx : limites du pool keep-alive et HTTP/2 si disponible."""
+        llm = self.llm_settings
+        return {
+            "limits": httpx.Limits(
+                max_connections=llm.max_connections,
+                max_keepalive_connections=llm.max_keepalive_connections,
+                keepalive_expiry=llm.keepalive_expiry,
+            ),
+            "http2": HTTP2_AVAILABLE,
+        }
+
+    def _client_options(self) -> dict:
+        """Options communes aux constructeurs des clients OpenAI et Azure OpenAI, dont les délais explicites."""
+        llm = self.llm_settings
+        options = {
+            "api_key": llm.api_key,
+            "max_retries": llm.max_retries,
+            "timeout": httpx.Timeout(llm.read_timeout, connect=llm.connect_timeout),
+        }
+        if self.use_azure:
+            options["api_version"] = llm.api_version
+            options["azure_endpoint"] = llm.azure_endpoint
+        return options
+
+    @property
+    def client(self) -> Union[OpenAI, AzureOpenAI]:
+        """Le client synchrone partagé."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    client_class = AzureOpenAI if self.use_azure else OpenAI
+                    self._client = client_class(
+                        http_client=DefaultHttpxClient(**self._http_options()),
+                        **self._client_options(),
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> Union[AsyncOpenAI, AsyncAzureOpenAI]:
+        """Le client asynchrone partagé, à utiliser depuis une même boucle d'événements."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    client_class = AsyncAzureOpenAI if self.use_azure else AsyncOpenAI
+                    self._async_client = client_class(
+                        http_client=DefaultAsyncHttpxClient(**self._http_options()),
+                        **self._client_options(),
+                    )
+        return self._async_client
+
+    def close(self) -> None:
+        """Ferme le client synchrone et ses connexions."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Ferme les deux clients et leurs connexions."""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.close()
+        self.close()
+
+
+@lru_cache()
+def get_llm_clients() -> LLMClients:
+    """Crée et retourne le registre partagé des clients LLM."""
+    return LLMClients(get_settings())
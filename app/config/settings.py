@@ -2,7 +2,7 @@ import logging
 import os
 from datetime import timedelta
 from functools import lru_cache
-from typing import Optional
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -23,6 +23,12 @@ class LLMSettings(BaseModel):
     temperature: float = 0.0
     max_tokens: Optional[int] = None
     max_retries: int = 3
+    # Client HTTP partagé : délais (secondes) et limites du pool de connexions keep-alive
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
 
 
 class OpenAISettings(LLMSettings):
@@ -30,7 +36,7 @@ class OpenAISettings(LLMSettings):
 
     api_key: str = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY"))
     default_model: str = Field(default="gpt-4o")
-    embedding_model: str = Field(default="text-embedding-3-small")
+    embedding_model: str = Field(default_factory=lambda: os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"))
 
 
 class AzureOpenAISettings(LLMSettings):
@@ -40,30 +46,165 @@ class AzureOpenAISettings(LLMSettings):
     api_version: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_VERSION", "2024-02-01"))
     azure_endpoint: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_ENDPOINT"))
     default_model: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4"))
-    embedding_model: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small"))
+    embedding_model: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large"))
 
 
 class DatabaseSettings(BaseModel):
     """Paramètres de connexion à la base de données."""
 
     service_url: str = Field(default_factory=lambda: os.getenv("TIMESCALE_SERVICE_URL"))
+    # Pool de connexions : taille minimale/maximale et attente maximale d'une connexion (secondes)
+    pool_min_size: int = Field(
+        default_factory=lambda: int(os.getenv("DATABASE_POOL_MIN_SIZE", "1"))
+    )
+    pool_max_size: int = Field(
+        default_factory=lambda: int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+    )
+    pool_timeout: float = Field(
+        default_factory=lambda: float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+    )
+    # Durée d'inactivité au-delà de laquelle une connexion du pool est fermée (secondes)
+    pool_max_idle: float = 600.0
+    # Requêtes préparées côté serveur (à désactiver derrière un PgBouncer en mode transaction)
+    prepare_statements: bool = Field(
+        default_factory=lambda: os.getenv("DATABASE_PREPARE_STATEMENTS", "true").lower() == "true"
+    )
 
 
 class VectorStoreSettings(BaseModel):
     """Paramètres pour le magasin de vecteurs."""
 
     table_name: str = "embeddings"
-    embedding_dimensions: int = 3072
+    embedding_dimensions: int = Field(
+        default_factory=lambda: int(os.getenv("VECTOR_EMBEDDING_DIMENSIONS", "3072"))
+    )
+    # Demande à l'API des embeddings raccourcis à `embedding_dimensions` (modèles text-embedding-3)
+    request_dimensions: bool = Field(
+        default_factory=lambda: os.getenv("VECTOR_REQUEST_DIMENSIONS", "true").lower() == "true"
+    )
+    # Découpage des appels d'embedding : nombre de textes et budget de tokens estimé par requête
+    embedding_batch_size: int = 512
+    embedding_batch_max_tokens: int = 200_000
+    # Type de colonne pgvector : "vector" (float32, HNSW <= 2000 dim) ou "halfvec" (float16, HNSW <= 4000 dim)
+    vector_type: Literal["vector", "halfvec"] = Field(
+        default_factory=lambda: os.getenv("VECTOR_STORAGE_TYPE", "vector")
+    )
     time_partition_interval: timedelta = timedelta(days=7)
+    search_engine: Literal["database", "python", "ivf"] = Field(
+        default_factory=lambda: os.getenv("VECTOR_SEARCH_ENGINE", "database")
+    )
+    # Moteur "ivf" : index IVF en mémoire (nombre de listes, 0 pour la racine carrée du nombre de
+    # lignes, et listes sondées par requête) ; un index plus ancien que `ivf_max_age` secondes est
+    # jugé périmé et les recherches repassent par Postgres jusqu'à sa reconstruction
+    ivf_lists: int = Field(default_factory=lambda: int(os.getenv("VECTOR_IVF_LISTS", "0")))
+    ivf_nprobe: int = Field(default_factory=lambda: int(os.getenv("VECTOR_IVF_NPROBE", "8")))
+    ivf_max_age: float = Field(default_factory=lambda: float(os.getenv("VECTOR_IVF_MAX_AGE", "3600")))
+    # Codes conservés par l'index IVF ("int8" : 4 fois, "binary" : 32 fois moins de mémoire que
+    # "none") ; leurs `ivf_rescore_factor` * k meilleurs candidats sont reclassés en pleine précision
+    # (voir `python -m app.database.quantization` pour choisir)
+    ivf_quantization: Literal["none", "int8", "binary"] = Field(
+        default_factory=lambda: os.getenv("VECTOR_IVF_QUANTIZATION", "none")
+    )
+    ivf_rescore_factor: int = Field(default_factory=lambda: int(os.getenv("VECTOR_IVF_RESCORE_FACTOR", "4")))
+    # Dossier des instantanés des embeddings (`python -m app.database.embedding_snapshot`) : l'index
+    # IVF des volumes en est construit et les candidats y sont reclassés, les workers partageant les
+    # pages projetées ; `CURRENT` est relu au plus toutes les `snapshot_check_interval` secondes
+    snapshot_dir: str = Field(default_factory=lambda: os.getenv("VECTOR_SNAPSHOT_DIR", ""))
+    snapshot_check_interval: float = Field(
+        default_factory=lambda: float(os.getenv("VECTOR_SNAPSHOT_CHECK_INTERVAL", "5"))
+    )
+    # Sur-échantillonnage adaptatif des recherches filtrées ou dédupliquées par série : le nombre de
+    # candidats est multiplié par `search_overfetch_factor` tant qu'une requête rend moins de k
+    # résultats, jusqu'à `search_max_candidates` (maximum de hnsw.ef_search)
+    search_overfetch_factor: int = 4
+    search_max_candidates: int = 1000
+    # Table des centroïdes de séries (moyenne des embeddings des volumes), tenue à jour à chaque écriture
+    series_table_name: str = "series_embeddings"
+    # Niveau de recherche des recommandations : "series" (centroïdes) ou "volume" (un résultat par volume)
+    search_level: Literal["series", "volume"] = Field(
+        default_factory=lambda: os.getenv("VECTOR_SEARCH_LEVEL", "series")
+    )
+
+
+class EmbeddingCacheSettings(BaseModel):
+    """Paramètres du cache d'embeddings (mémoire locale + table Postgres partagée)."""
+
+    enabled: bool = Field(
+        default_factory=lambda: os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    )
+    max_size: int = Field(
+        default_factory=lambda: int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", "2048"))
+    )
+    ttl: timedelta = timedelta(hours=24)
+    persistent: bool = Field(
+        default_factory=lambda: os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+    )
+    # Durée de vie des entrées de la table Postgres, purgées à l'ouverture du cache
+    persistent_ttl: timedelta = Field(
+        default_factory=lambda: timedelta(days=int(os.getenv("EMBEDDING_CACHE_PERSISTENT_TTL_DAYS", "30")))
+    )
+    table_name: str = "embedding_cache"
+
+
+class PredictionCacheSettings(BaseModel):
+    """Paramètres du cache de prédictions complètes, invalidé à chaque modification du catalogue."""
+
+    enabled: bool = Field(
+        default_factory=lambda: os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() == "true"
+    )
+    max_size: int = Field(
+        default_factory=lambda: int(os.getenv("PREDICTION_CACHE_MAX_SIZE", "1024"))
+    )
+    ttl: timedelta = timedelta(hours=1)
+
+
+class SemanticCacheSettings(BaseModel):
+    """Paramètres du cache sémantique des réponses globales du Synthesizer."""
+
+    enabled: bool = Field(
+        default_factory=lambda: os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    )
+    # Similarité cosinus minimale entre deux contextes (profil + séries) pour réutiliser une réponse
+    threshold: float = Field(
+        default_factory=lambda: float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+    )
+    max_size: int = Field(
+        default_factory=lambda: int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", "1024"))
+    )
+    ttl: timedelta = timedelta(hours=6)
+    # Dimension des embeddings de contexte demandés au modèle d'embedding (text-embedding-3)
+    embedding_dimensions: int = 256
+
+
+class TasteVectorSettings(BaseModel):
+    """Paramètres du vecteur de goût construit à partir des embeddings stockés des volumes de l'utilisateur."""
+
+    enabled: bool = Field(
+        default_factory=lambda: os.getenv("TASTE_VECTOR_ENABLED", "true").lower() == "true"
+    )
+    # Poids d'un volume possédé et d'un volume lu ; un volume possédé et lu cumule les deux
+    owned_weight: float = Field(
+        default_factory=lambda: float(os.getenv("TASTE_VECTOR_OWNED_WEIGHT", "1.0"))
+    )
+    read_weight: float = Field(
+        default_factory=lambda: float(os.getenv("TASTE_VECTOR_READ_WEIGHT", "2.0"))
+    )
 
 
 class Settings(BaseModel):
     """Classe principale de paramètres combinant tous les sous-paramètres."""
 
+    use_azure: bool = Field(
+        default_factory=lambda: os.getenv("USE_AZURE_OPENAI", "false").lower() == "true"
+    )
     openai: OpenAISettings = Field(default_factory=OpenAISettings)
     azure_openai: AzureOpenAISettings = Field(default_factory=AzureOpenAISettings)
     database: DatabaseSettings = Field(default_factory=DatabaseSettings)
     vector_store: VectorStoreSettings = Field(default_factory=VectorStoreSettings)
+    embedding_cache: EmbeddingCacheSettings = Field(default_factory=EmbeddingCacheSettings)
+    prediction_cache: PredictionCacheSettings = Field(default_factory=PredictionCacheSettings)
+    semantic_cache: SemanticCacheSettings = Field(default_factory=SemanticCacheSettings)
+    taste_vector: TasteVectorSettings = Field(default_factory=TasteVectorSettings)
 
 
 @lru_cache()
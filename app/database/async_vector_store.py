@@ -0,0 +1,526 @@
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from app.database import catalog_events
+from app.database.embedding_cache import EmbeddingCache
+from app.database.ivf_index import IVFIndex
+from app.database.search_results import SearchResult
+from app.database.vector_codec import (
+    VECTOR_HEADER,
+    configure_async_connection,
+    decode_vectors,
+    register_raw_vector_loader,
+)
+from app.database.vector_store import HNSW_DEFAULT_EF_SEARCH, BaseVectorStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class AsyncVectorStore(BaseVectorStore):
+    """
+    Magasin de vecteurs asynchrone pour le chemin de prédiction.
+
+    Les embeddings sont générés avec le client AsyncOpenAI et les recherches passent par un pool
+    de connexions psycopg asynchrones, sans jamais bloquer la boucle d'événements. Les requêtes SQL
+    sont partagées avec `VectorStore` ; l'écriture du catalogue reste sur le magasin synchrone.
+    """
+
+    def __init__(self):
+        """Initialise le client d'embeddings asynchrone ; le pool est ouvert au premier usage."""
+        super().__init__()
+
+        self.openai_client = self.llm_clients.async_client
+
+        self.embedding_cache = (
+            EmbeddingCache(self.settings.embedding_cache)
+            if self.settings.embedding_cache.enabled
+            else None
+        )
+        self.pool: Optional[AsyncConnectionPool] = None
+        self._pool_lock = asyncio.Lock()
+        # Constructions d'index IVF en cours ; un index construit avant une invalidation est écarté
+        self._ivf_builds: Dict[str, asyncio.Task] = {}
+        self._ivf_generation = 0
+        # Faux si la table des séries manque ou n'a pas été migrée : les recherches au niveau
+        # "series" passent alors au niveau "volume", un résultat par série
+        self._series_ready = True
+
+    async def _get_pool(self) -> AsyncConnectionPool:
+        """Ouvre le pool de connexions au premier appel, après avoir préparé l'extension et les tables."""
+        if self.pool is not None:
+            return self.pool
+        async with self._pool_lock:
+            if self.pool is None:
+                service_url = self.settings.database.service_url
+                async with await psycopg.AsyncConnection.connect(service_url, autocommit=True) as conn:
+                    await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                    if self.embedding_cache is not None and self.settings.embedding_cache.persistent:
+                        await conn.execute(self.embedding_cache.create_table_sql())
+                        await conn.execute(self.embedding_cache.create_index_sql())
+                        # Le service ne crée jamais de VectorStore : la purge est faite ici
+                        await self.embedding_cache.apurge_expired(conn)
+                    self._series_ready = await self._check_search_tables(conn)
+
+                pool = AsyncConnectionPool(
+                    service_url,
+                    configure=configure_async_connection,
+                    check=AsyncConnectionPool.check_connection,
+                    open=False,
+                    **self._pool_options(),
+                )
+                await pool.open()
+                self.pool = pool
+        return self.pool
+
+    async def _missing_columns(self, conn: psycopg.AsyncConnection, level: str) -> List[str]:
+        """Les colonnes de recherche (embedding et champs promus) absentes de la table d'un niveau."""
+        cur = await conn.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s",
+            (self._search_table(level),),
+        )
+        existing = {row[0] for row in await cur.fetchall()}
+        expected = ["embedding"] + [column for column, _ in self._metadata_columns(level).values()]
+        return [column for column in expected if column not in existing]
+
+    async def _check_search_tables(self, conn: psycopg.AsyncConnection) -> bool:
+        """
+        Vérifie que les tables de recherche ont été créées ou migrées par `VectorStore.create_tables`,
+        le magasin asynchrone n'écrivant pas le catalogue.
+
+        Returns:
+            Vrai si la table des séries est utilisable.
+        """
+        missing = await self._missing_columns(conn, "volume")
+        if missing:
+            logging.error(
+                f"{self.vector_settings.table_name} is missing columns {missing}, "
+                f"run VectorStore.create_tables to migrate it"
+            )
+        missing = await self._missing_columns(conn, "series")
+        if missing:
+            logging.warning(
+                f"{self.vector_settings.series_table_name} is missing or not migrated (columns {missing}), "
+                f"searching series at the volume level until VectorStore.create_tables runs"
+            )
+        return not missing
+
+    async def _has_hnsw_index(self, conn: psycopg.AsyncConnection, level: str) -> bool:
+        """Variante asynchrone de `VectorStore._has_hnsw_index`."""
+        table = self._search_table(level)
+        if table not in self._hnsw_indexes:
+            cur = await conn.execute(self._hnsw_index_sql(), (table,))
+            self._hnsw_indexes[table] = (await cur.fetchone())[0]
+        return self._hnsw_indexes[table]
+
+    async def close(self) -> None:
+        """Ferme le pool de connexions, après avoir annulé les constructions d'index IVF en cours."""
+        for task in self._ivf_builds.values():
+            task.cancel()
+        await asyncio.gather(*self._ivf_builds.values(), return_exceptions=True)
+        self._ivf_builds.clear()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def listen_catalog_changes(
+        self,
+        callback: Callable[[str], None],
+        retry_delay: float = 5.0,
+    ) -> None:
+        """
+        Relaie les notifications de modification du catalogue émises par `VectorStore`.
+
+        S'exécute jusqu'à annulation sur une connexion dédiée, hors du pool, et se reconnecte après
+        une coupure. `callback` reçoit le nom de la table modifiée ; il est aussi appelé à chaque
+        (re)connexion, les notifications émises pendant une coupure étant perdues.
+        """
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.settings.database.service_url, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {catalog_events.CATALOG_CHANNEL}")
+                    callback(self.vector_settings.table_name)
+                    async for notify in conn.notifies():
+                        callback(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Catalog listener disconnected: {e}")
+            await asyncio.sleep(retry_delay)
+
+    def pool_stats(self) -> Optional[dict]:
+        """Retourne les métriques du pool de connexions, ou None s'il n'est pas encore ouvert."""
+        return self._pool_stats(self.pool)
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """
+        Génère un embedding pour le texte donné.
+
+        Args:
+            text: Le texte d'entrée pour lequel générer un embedding.
+
+        Returns:
+            Une liste de flottants représentant l'embedding.
+        """
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        """
+        Génère les embeddings de plusieurs textes, les lots étant envoyés en parallèle.
+
+        Voir `VectorStore.get_embeddings` pour la normalisation, le cache et le découpage en lots.
+        """
+        normalized = [EmbeddingCache.normalize_text(text) for text in texts]
+        unique_texts = list(dict.fromkeys(normalized))
+        request_options = self._embedding_request_options()
+        dimensions = request_options.get("dimensions")
+
+        cache = self.embedding_cache if use_cache else None
+        embeddings = {}
+        cache_keys = {}
+        if cache is not None:
+            cache_keys = self._embedding_cache_keys(unique_texts, dimensions)
+            pool = await self._get_pool() if self.settings.embedding_cache.persistent else None
+            if pool is not None:
+                async with pool.connection() as conn:
+                    cached = await cache.aget_many(list(cache_keys.values()), conn)
+            else:
+                cached = await cache.aget_many(list(cache_keys.values()))
+            embeddings = {text: cached[key] for text, key in cache_keys.items() if key in cached}
+
+        missing = [text for text in unique_texts if text not in embeddings]
+        batches = list(self._batch_texts(missing))
+        if batches:
+            start_time = time.time()
+            responses = await asyncio.gather(*(
+                self.openai_client.embeddings.create(
+                    input=batch,
+                    model=self.embedding_model,
+                    **request_options,
+                )
+                for batch in batches
+            ))
+            for batch, response in zip(batches, responses):
+                for item in response.data:
+                    embeddings[batch[item.index]] = item.embedding
+                if response.usage is not None:
+                    self.embedding_tokens += response.usage.total_tokens
+            elapsed_time = time.time() - start_time
+            logging.info(f"{len(missing)} embeddings generated in {elapsed_time:.3f} seconds")
+
+            if cache is not None:
+                new_entries = {cache_keys[text]: embeddings[text] for text in missing}
+                if self.settings.embedding_cache.persistent:
+                    async with (await self._get_pool()).connection() as conn:
+                        await cache.aput_many(new_entries, self.embedding_model, dimensions, conn)
+                else:
+                    await cache.aput_many(new_entries, self.embedding_model, dimensions)
+
+        return [embeddings[text] for text in normalized]
+
+    async def get_volume_embeddings(self, volume_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Variante asynchrone de `VectorStore.get_volume_embeddings`."""
+        if not volume_ids:
+            return {}
+        pool = await self._get_pool()
+        async with pool.connection() as conn, conn.cursor(binary=True) as cur:
+            register_raw_vector_loader(cur, self.vector_settings.vector_type)
+            await cur.execute(
+                self._volume_embeddings_sql(),
+                ([str(volume_id) for volume_id in volume_ids],),
+                prepare=self.settings.database.prepare_statements,
+            )
+            rows = await cur.fetchall()
+        return self._volume_embeddings_by_id(rows)
+
+    async def read_embeddings(
+        self, level: str = "volume", batch_size: int = 10000
+    ) -> Tuple[List[Any], List[dict], np.ndarray]:
+        """Variante asynchrone de `VectorStore.read_embeddings`."""
+        table = self._search_table(level)
+        vector_type = self.vector_settings.vector_type
+        ids: List[Any] = []
+        metadata: List[dict] = []
+        matrix = np.empty((0, self.vector_settings.embedding_dimensions), dtype=np.float32)
+        pool = await self._get_pool()
+        async with pool.connection() as conn, conn.transaction():
+            await conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur = await conn.execute(f"SELECT count(*) FROM {table} WHERE embedding IS NOT NULL")
+            count = (await cur.fetchone())[0]
+            async with conn.cursor(name=f"{table}_read_embeddings", binary=True) as cur:
+                register_raw_vector_loader(cur, vector_type)
+                await cur.execute(f"SELECT id, metadata, embedding FROM {table} WHERE embedding IS NOT NULL ORDER BY id")
+                while rows := await cur.fetchmany(batch_size):
+                    if not ids:
+                        dimensions, _ = VECTOR_HEADER.unpack_from(rows[0][2])
+                        matrix = np.empty((count, dimensions), dtype=np.float32)
+                    start = len(ids)
+                    decode_vectors([row[2] for row in rows], vector_type, out=matrix[start:start + len(rows)])
+                    ids.extend(row[0] for row in rows)
+                    metadata.extend(row[1] for row in rows)
+        logging.info(f"Read {len(ids)} embeddings from {table}")
+        return ids, metadata, matrix
+
+    async def build_ivf_index(self, level: str = "volume") -> IVFIndex:
+        """
+        Variante asynchrone de `VectorStore.build_ivf_index`, l'entraînement tournant dans un thread.
+
+        Un index construit depuis Postgres n'est pas installé si le catalogue a été modifié pendant sa
+        construction (voir `invalidate_ivf_indexes`).
+        """
+        generation = self._ivf_generation
+        snapshot = await asyncio.to_thread(self._current_snapshot, level)
+        if snapshot is not None:
+            ids, metadata, matrix = await asyncio.to_thread(self._snapshot_rows, snapshot)
+        else:
+            ids, metadata, matrix = await self.read_embeddings(level)
+        start_time = time.time()
+        normalized = snapshot is not None and snapshot.normalized
+        index = await asyncio.to_thread(self._new_ivf_index(level).build, ids, metadata, matrix, normalized=normalized)
+        elapsed_time = time.time() - start_time
+        if snapshot is None and generation != self._ivf_generation:
+            logging.info(f"Catalog changed while building the IVF index for {self._search_table(level)}, discarding it")
+            return index
+        self._set_ivf_index(level, index, snapshot.version if snapshot is not None else None)
+        logging.info(
+            f"Built IVF index of {len(index)} rows in {len(index.centroids)} lists "
+            f"for {self._search_table(level)} in {elapsed_time:.3f} seconds"
+        )
+        return index
+
+    def _schedule_ivf_build(self, level: str) -> None:
+        """Lance la construction de l'index IVF d'un niveau en tâche de fond, si elle n'est pas déjà en cours."""
+        task = self._ivf_builds.get(level)
+        if task is not None and not task.done():
+            return
+
+        async def build():
+            try:
+                await self.build_ivf_index(level)
+            except Exception as e:
+                logging.warning(f"IVF index build for {self._search_table(level)} failed: {e}")
+
+        self._ivf_builds[level] = asyncio.create_task(build())
+
+    def invalidate_ivf_indexes(self, table_name: Optional[str] = None) -> None:
+        """
+        Abandonne les index IVF construits depuis Postgres après une modification du catalogue.
+
+        Les recherches "ivf" passent par Postgres jusqu'à la reconstruction, lancée par la recherche
+        suivante. Un index construit depuis un instantané est conservé : il ne change qu'avec la
+        version de l'instantané. Peut être appelée depuis un autre thread (abonnés de `catalog_events`).
+        """
+        self._ivf_generation += 1
+        for level, snapshot_version in list(self._ivf_snapshot_versions.items()):
+            if snapshot_version is None:
+                self._ivf_indexes.pop(level, None)
+                self._ivf_snapshot_versions.pop(level, None)
+
+    async def _search_many_database(
+        self,
+        pool: AsyncConnectionPool,
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        where_clause: str,
+        params: list,
+        level: str,
+        one_per_series: bool,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[List[SearchResult]]:
+        """Variante asynchrone de `VectorStore._search_many_database` (sur-échantillonnage adaptatif compris)."""
+        query_embeddings = [np.asarray(vector, dtype=np.float32) for vector in query_vectors]
+        sql = self._search_many_sql(len(query_embeddings), where_clause, level, one_per_series, columns)
+        adaptive = self._adaptive_search(where_clause, one_per_series, level)
+        candidates = self._initial_candidates(limit, one_per_series, level)
+
+        while True:
+            async with pool.connection() as conn:
+                if adaptive:
+                    adaptive = await self._has_hnsw_index(conn, level)
+                async with conn.transaction() if candidates > HNSW_DEFAULT_EF_SEARCH else nullcontext():
+                    if candidates > HNSW_DEFAULT_EF_SEARCH:
+                        await conn.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(candidates),))
+                    cur = await conn.execute(
+                        sql,
+                        [*query_embeddings, *params, *self._search_limits(limit, candidates, one_per_series, level)],
+                        prepare=self.settings.database.prepare_statements,
+                    )
+                    db_results = await cur.fetchall()
+            grouped = self._group_search_rows(db_results, len(query_embeddings))
+            ranked_counts = self._ranked_counts(db_results, len(query_embeddings), where_clause, one_per_series, level)
+            candidates = self._next_candidates(grouped, limit, candidates, adaptive, ranked_counts)
+            if candidates is None:
+                return grouped
+            logging.info(f"Short vector search results, retrying with {candidates} candidates")
+
+    async def _search_many_ivf(
+        self,
+        pool: AsyncConnectionPool,
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        metadata_filter: Union[dict, List[dict], None],
+        predicates: Any,
+        time_range: Optional[Tuple[datetime, datetime]],
+        level: str,
+        exclude_series_ids: Optional[Sequence[str]],
+        one_per_series: bool,
+        columns: Optional[Sequence[str]],
+    ) -> Optional[List[List[SearchResult]]]:
+        """Variante asynchrone de `VectorStore._search_many_ivf`."""
+        found = self._ivf_candidates(
+            query_vectors, limit, metadata_filter, predicates, time_range,
+            level, exclude_series_ids, one_per_series, columns,
+        )
+        if found is None:
+            return None
+        candidates, rescore = found
+        embeddings = None
+        if rescore:
+            ids = list({str(row_id): row_id for results in candidates for row_id, _, _ in results}.values())
+            embeddings, missing = self._rescore_embeddings(level, ids)
+            if missing:
+                async with pool.connection() as conn, conn.cursor(binary=True) as cur:
+                    register_raw_vector_loader(cur, self.vector_settings.vector_type)
+                    await cur.execute(self._rows_by_id_sql(level, "id, embedding"), (missing,))
+                    embeddings.update(self._normalized_embeddings_by_id(await cur.fetchall()))
+        return self._ivf_results(candidates, query_vectors, limit, embeddings)
+
+    async def search(
+        self,
+        query_text: str,
+        limit: int = 5,
+        metadata_filter: Union[dict, List[dict]] = None,
+        time_range: Optional[Tuple[datetime, datetime]] = None,
+        return_dataframe: bool = True,
+        predicates=None,
+        engine: Optional[str] = None,
+        level: str = "volume",
+        exclude_series_ids: Optional[Sequence[str]] = None,
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Union[List[SearchResult], "pd.DataFrame"]:
+        """Variante asynchrone de `VectorStore.search`."""
+        query_embedding = await self.get_embedding(query_text)
+        results = await self.search_many(
+            [query_embedding],
+            limit=limit,
+            metadata_filter=metadata_filter,
+            time_range=time_range,
+            return_dataframe=return_dataframe,
+            predicates=predicates,
+            engine=engine,
+            level=level,
+            exclude_series_ids=exclude_series_ids,
+            one_per_series=one_per_series,
+            columns=columns,
+        )
+        return results[0]
+
+    async def search_many(
+        self,
+        query_vectors: Sequence[List[float]],
+        limit: int = 5,
+        metadata_filter: Union[dict, List[dict]] = None,
+        time_range: Optional[Tuple[datetime, datetime]] = None,
+        return_dataframe: bool = False,
+        predicates=None,
+        engine: Optional[str] = None,
+        level: str = "volume",
+        exclude_series_ids: Optional[Sequence[str]] = None,
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Union[List[SearchResult], "pd.DataFrame"]]:
+        """
+        Variante asynchrone de `VectorStore.search_many`.
+
+        Si la table des séries manque ou n'est pas migrée, une recherche au niveau "series" est faite
+        au niveau "volume" avec un seul résultat par série.
+        """
+        engine = engine or self.vector_settings.search_engine
+        if len(query_vectors) == 0:
+            return []
+        start_time = time.time()
+        pool = await self._get_pool()
+
+        search = (
+            pool, engine, query_vectors, limit, metadata_filter, time_range,
+            predicates, exclude_series_ids, columns,
+        )
+        if level == "series" and not self._series_ready:
+            level, one_per_series = "volume", True
+        try:
+            grouped = await self._search_many_at_level(*search, level, one_per_series)
+        except (psycopg.errors.UndefinedTable, psycopg.errors.UndefinedColumn) as e:
+            if level != "series":
+                raise
+            logging.warning(f"Series search failed ({e}), searching at the volume level")
+            self._series_ready = False
+            grouped = await self._search_many_at_level(*search, "volume", True)
+
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Async vector search ({engine}) for {len(query_vectors)} queries completed in {elapsed_time:.3f} seconds"
+        )
+
+        if return_dataframe:
+            return [self._create_dataframe_from_results(results) for results in grouped]
+        return grouped
+
+    async def _search_many_at_level(
+        self,
+        pool: AsyncConnectionPool,
+        engine: str,
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        metadata_filter: Union[dict, List[dict], None],
+        time_range: Optional[Tuple[datetime, datetime]],
+        predicates: Any,
+        exclude_series_ids: Optional[Sequence[str]],
+        columns: Optional[Sequence[str]],
+        level: str,
+        one_per_series: bool,
+    ) -> List[List[SearchResult]]:
+        """Exécute `search_many` avec le moteur donné, à un niveau de recherche fixé."""
+        where_clause, params = self._build_where_clause(
+            metadata_filter, predicates, time_range, level, exclude_series_ids
+        )
+        if engine == "database":
+            grouped = await self._search_many_database(
+                pool, query_vectors, limit, where_clause, params, level, one_per_series, columns
+            )
+        elif engine == "python":
+            async with pool.connection() as conn, conn.cursor(binary=True) as cur:
+                register_raw_vector_loader(cur, self.vector_settings.vector_type)
+                await cur.execute(
+                    self._candidates_sql(where_clause, level, columns),
+                    params,
+                    prepare=self.settings.database.prepare_statements,
+                )
+                rows, embeddings = self._decode_candidates(await cur.fetchall())
+            grouped = self._rank_candidates(
+                rows, query_vectors, limit, one_per_series, level, columns, embeddings
+            )
+        elif engine == "ivf":
+            grouped = await self._search_many_ivf(
+                pool, query_vectors, limit, metadata_filter, predicates, time_range,
+                level, exclude_series_ids, one_per_series, columns,
+            )
+            if grouped is None:
+                if self._fresh_ivf_index(level) is None:
+                    self._schedule_ivf_build(level)
+                grouped = await self._search_many_database(
+                    pool, query_vectors, limit, where_clause, params, level, one_per_series, columns
+                )
+        else:
+            raise ValueError(f"Unknown search engine: {engine}")
+        return grouped
@@ -0,0 +1,40 @@
+"""
+Notifications de modification du catalogue vectoriel.
+
+Les écritures (`VectorStore.upsert`, `VectorStore.delete`) préviennent les abonnés du processus
+courant et émettent un NOTIFY Postgres sur `CATALOG_CHANNEL`, relayé aux autres processus par
+`AsyncVectorStore.listen_catalog_changes`.
+"""
+import logging
+import threading
+from typing import Callable, List
+
+# Canal LISTEN/NOTIFY ; la charge utile est le nom de la table modifiée
+CATALOG_CHANNEL = "catalog_changed"
+
+_subscribers: List[Callable[[str], None]] = []
+_lock = threading.Lock()
+
+
+def subscribe(callback: Callable[[str], None]) -> None:
+    """Abonne `callback` aux modifications du catalogue faites dans ce processus."""
+    with _lock:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[str], None]) -> None:
+    """Désabonne `callback` s'il était abonné."""
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(table_name: str) -> None:
+    """Prévient les abonnés du processus qu'une table du catalogue a été modifiée."""
+    with _lock:
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        try:
+            callback(table_name)
+        except Exception as e:
+            logging.warning(f"Catalog change subscriber failed: {e}")
@@ -0,0 +1,291 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import EmbeddingCacheSettings
+
+
+class EmbeddingCache:
+    """
+    Cache d'embeddings à deux niveaux clé sur (modèle, dimensions, texte normalisé).
+
+    Le premier niveau est un LRU en mémoire borné en taille et en durée de vie ; le second est une
+    table Postgres partagée par toutes les répliques, dont les entrées expirent après
+    `persistent_ttl`. Un succès dans l'un ou l'autre niveau évite l'appel réseau à l'API d'embeddings.
+    """
+
+    def __init__(
+        self,
+        settings: EmbeddingCacheSettings,
+        pool=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            settings: Les paramètres du cache.
+            pool: Un pool `psycopg_pool.ConnectionPool` pour le niveau persistant (désactivé si None).
+            clock: La source de temps utilisée pour l'expiration du niveau mémoire.
+        """
+        self.settings = settings
+        self.pool = pool if settings.persistent else None
+        self._clock = clock
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        if self.pool is not None:
+            self.create_table()
+            self.purge_expired()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalise le texte (Unicode NFC, espaces et retours à la ligne regroupés)."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        """Construit la clé de cache d'un texte déjà normalisé."""
+        return hashlib.sha256(f"{model}\x1f{dimensions}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def create_table_sql(self) -> str:
+        """Retourne l'instruction de création de la table du niveau persistant."""
+        return f"""
+            CREATE TABLE IF NOT EXISTS {self.settings.table_name} (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dimensions INTEGER,
+                embedding vector NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+
+    def create_index_sql(self) -> str:
+        """Retourne l'instruction de création de l'index d'expiration du niveau persistant."""
+        return f"""
+            CREATE INDEX IF NOT EXISTS {self.settings.table_name}_created_at_idx
+            ON {self.settings.table_name} (created_at)
+        """
+
+    def create_table(self) -> None:
+        """Crée la table du niveau persistant (et son index d'expiration) si nécessaire."""
+        with self.pool.connection() as conn:
+            conn.execute(self.create_table_sql())
+            conn.execute(self.create_index_sql())
+
+    def _purge_sql(self) -> str:
+        return f"DELETE FROM {self.settings.table_name} WHERE created_at <= LOCALTIMESTAMP - %s"
+
+    def purge_expired(self) -> int:
+        """
+        Supprime les entrées du niveau persistant plus anciennes que `persistent_ttl`.
+
+        Returns:
+            Le nombre d'entrées supprimées.
+        """
+        with self.pool.connection() as conn:
+            deleted = conn.execute(self._purge_sql(), (self.settings.persistent_ttl,)).rowcount
+        self._log_purge(deleted)
+        return deleted
+
+    async def apurge_expired(self, conn) -> int:
+        """Variante asynchrone de `purge_expired` utilisant une connexion `psycopg.AsyncConnection`."""
+        cur = await conn.execute(self._purge_sql(), (self.settings.persistent_ttl,))
+        self._log_purge(cur.rowcount)
+        return cur.rowcount
+
+    def _log_purge(self, deleted: int) -> None:
+        if deleted:
+            logging.info(f"Purged {deleted} expired entries from {self.settings.table_name}")
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        Retourne l'embedding en cache pour la clé, en consultant la mémoire puis Postgres.
+
+        Returns:
+            L'embedding, ou None en cas d'absence dans les deux niveaux.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Retourne les embeddings en cache pour plusieurs clés, avec une seule requête Postgres
+        pour les clés absentes de la mémoire.
+
+        Returns:
+            Un dictionnaire clé -> embedding limité aux clés trouvées.
+        """
+        found = self._get_memory(keys)
+        remaining = [key for key in keys if key not in found]
+        persistent = self._get_persistent(remaining) if remaining else {}
+        return self._merge_persistent(found, remaining, persistent)
+
+    async def aget_many(self, keys: List[str], conn=None) -> Dict[str, List[float]]:
+        """
+        Variante asynchrone de `get_many`, le niveau persistant étant lu avec une connexion psycopg asynchrone.
+
+        Args:
+            keys: Les clés recherchées.
+            conn: Une connexion `psycopg.AsyncConnection` (niveau persistant ignoré si None).
+        """
+        found = self._get_memory(keys)
+        remaining = [key for key in keys if key not in found]
+        persistent = {}
+        if remaining and conn is not None and self.settings.persistent:
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(self._select_sql(), (list(remaining), self.settings.persistent_ttl))
+                    persistent = self._rows_to_vectors(await cur.fetchall())
+            except Exception as e:
+                logging.warning(f"Embedding cache read failed: {e}")
+        return self._merge_persistent(found, remaining, persistent)
+
+    def _get_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Lit les clés présentes et non expirées du niveau mémoire."""
+        found = {}
+        now = self._clock()
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                expires_at, embedding = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[key] = embedding.tolist()
+                else:
+                    del self._memory[key]
+        return found
+
+    def _merge_persistent(
+        self,
+        found: Dict[str, List[float]],
+        remaining: List[str],
+        persistent: Dict[str, np.ndarray],
+    ) -> Dict[str, List[float]]:
+        """Remonte les succès du niveau persistant en mémoire et met à jour les compteurs."""
+        for key, embedding in persistent.items():
+            self._put_memory(key, embedding)
+            found[key] = embedding.tolist()
+
+        with self._lock:
+            self.persistent_hits += len(persistent)
+            self.misses += len(remaining) - len(persistent)
+        return found
+
+    def put(self, key: str, embedding: List[float], model: str, dimensions: Optional[int]) -> None:
+        """Enregistre un embedding dans les deux niveaux du cache."""
+        self.put_many({key: embedding}, model, dimensions)
+
+    def put_many(self, embeddings: Dict[str, List[float]], model: str, dimensions: Optional[int]) -> None:
+        """Enregistre plusieurs embeddings dans les deux niveaux du cache."""
+        rows = self._put_memory_many(embeddings, model, dimensions)
+        if not rows or self.pool is None:
+            return
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.executemany(self._insert_sql(), rows)
+        except Exception as e:
+            logging.warning(f"Embedding cache write failed: {e}")
+
+    async def aput_many(
+        self,
+        embeddings: Dict[str, List[float]],
+        model: str,
+        dimensions: Optional[int],
+        conn=None,
+    ) -> None:
+        """Variante asynchrone de `put_many` utilisant une connexion `psycopg.AsyncConnection`."""
+        rows = self._put_memory_many(embeddings, model, dimensions)
+        if not rows or conn is None or not self.settings.persistent:
+            return
+        try:
+            async with conn.cursor() as cur:
+                await cur.executemany(self._insert_sql(), rows)
+        except Exception as e:
+            logging.warning(f"Embedding cache write failed: {e}")
+
+    def _put_memory_many(
+        self,
+        embeddings: Dict[str, List[float]],
+        model: str,
+        dimensions: Optional[int],
+    ) -> List[tuple]:
+        """Insère les embeddings en mémoire et retourne les lignes à écrire dans le niveau persistant."""
+        rows = []
+        for key, embedding in embeddings.items():
+            vector = np.asarray(embedding, dtype=np.float32)
+            self._put_memory(key, vector)
+            rows.append((key, model, dimensions, vector, self.settings.persistent_ttl))
+        return rows
+
+    def _put_memory(self, key: str, vector: np.ndarray) -> None:
+        """Insère dans le LRU mémoire en évinçant les entrées les plus anciennes au-delà de max_size."""
+        expires_at = self._clock() + self.settings.ttl.total_seconds()
+        with self._lock:
+            self._memory[key] = (expires_at, vector)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.settings.max_size:
+                self._memory.popitem(last=False)
+
+    def _select_sql(self) -> str:
+        """Lecture des entrées non expirées ; paramètres : les clés puis `persistent_ttl`."""
+        return f"""
+            SELECT key, embedding FROM {self.settings.table_name}
+            WHERE key = ANY(%s) AND created_at > LOCALTIMESTAMP - %s
+        """
+
+    def _insert_sql(self) -> str:
+        """Écriture d'une entrée ; une entrée expirée mais pas encore purgée est remplacée."""
+        return f"""
+            INSERT INTO {self.settings.table_name} (key, model, dimensions, embedding)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (key) DO UPDATE
+            SET embedding = EXCLUDED.embedding, created_at = EXCLUDED.created_at
+            WHERE {self.settings.table_name}.created_at <= LOCALTIMESTAMP - %s
+        """
+
+    @staticmethod
+    def _rows_to_vectors(rows: List[tuple]) -> Dict[str, np.ndarray]:
+        return {
+            key: np.asarray(value.to_numpy() if hasattr(value, "to_numpy") else value, dtype=np.float32)
+            for key, value in rows
+        }
+
+    def _get_persistent(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Lit plusieurs entrées du niveau Postgres en une requête."""
+        if self.pool is None:
+            return {}
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(self._select_sql(), (list(keys), self.settings.persistent_ttl)).fetchall()
+        except Exception as e:
+            logging.warning(f"Embedding cache read failed: {e}")
+            return {}
+        return self._rows_to_vectors(rows)
+
+    def clear(self) -> None:
+        """Vide le niveau mémoire."""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        """Retourne les compteurs de succès et d'échecs du cache."""
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "memory_size": len(self._memory),
+            }
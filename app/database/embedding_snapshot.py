@@ -0,0 +1,366 @@
+"""
+Instantanés sur disque des embeddings du catalogue, partagés par les workers via `mmap`.
+
+Un instantané est un répertoire `<dossier>/<version>/` contenant :
+
+- `vectors.npy` : la matrice (n, d) float32 contiguë des embeddings normalisés, au format `.npy` ;
+- `records.bin` : le fichier annexe des ids et métadonnées. Il commence par un en-tête versionné
+  (`SNAPSHOT_MAGIC`, version du format, taille de l'en-tête JSON) suivi de l'en-tête JSON
+  (version de l'instantané, table, nombre de lignes, dimension, position des sections) puis des
+  sections : début de chaque enregistrement, ids triés et leurs positions (recherche par id par
+  dichotomie), enregistrements JSON `[id, metadata]` séparés par des virgules, lus à la demande
+  ou tous ensemble comme un seul tableau JSON.
+
+Le fichier `<dossier>/CURRENT` désigne la version courante ; il est remplacé atomiquement par
+l'export. Seule la table des volumes est exportée ; un lecteur écarte un instantané dont l'en-tête
+(niveau, table, dimension) ne correspond pas au magasin qui l'utilise. Les workers ouvrent les fichiers en lecture seule avec `mmap` : ils partagent les pages du
+cache du système, l'ouverture ne lit que l'en-tête, et `SnapshotReader` bascule sur une nouvelle
+version sans redémarrage. Export :
+
+    python -m app.database.embedding_snapshot --dir /var/lib/booksync/snapshots
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.database.reranker import normalize_rows
+
+if TYPE_CHECKING:
+    from app.database.vector_store import VectorStore
+
+# Signature et version du format du fichier annexe
+SNAPSHOT_MAGIC = b"BKSNAPSH"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Préambule du fichier annexe : signature, version du format, taille de l'en-tête JSON
+PREAMBLE = struct.Struct(f">{len(SNAPSHOT_MAGIC)}sII")
+
+# Alignement des sections du fichier annexe (lues comme tableaux NumPy)
+SECTION_ALIGNMENT = 8
+
+# Lignes normalisées par bloc à l'export, pour borner la mémoire temporaire
+NORMALIZE_BATCH_SIZE = 65536
+
+CURRENT_FILE = "CURRENT"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.bin"
+
+
+class SnapshotError(ValueError):
+    """Instantané illisible : signature, version du format ou tailles incohérentes."""
+
+
+def _pad(size: int) -> bytes:
+    return b"\0" * (-size % SECTION_ALIGNMENT)
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    temporary = path.with_name(f".{path.name}.tmp")
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def write_records(
+    path: Path,
+    version: str,
+    ids: Sequence[Any],
+    metadata: Sequence[dict],
+    header: Dict[str, Any],
+) -> None:
+    """
+    Écrit le fichier annexe d'un instantané (voir le format en tête du module).
+
+    Args:
+        path: Le fichier à écrire.
+        version: La version de l'instantané.
+        ids: Les ids des lignes, dans l'ordre des vecteurs.
+        metadata: Les métadonnées des lignes.
+        header: Les champs ajoutés à l'en-tête JSON (table, niveau, dimension...).
+    """
+    keys = [str(row_id).encode() for row_id in ids]
+    records = [
+        json.dumps([key.decode(), row_metadata or {}], ensure_ascii=False, separators=(",", ":"), default=str).encode()
+        for key, row_metadata in zip(keys, metadata)
+    ]
+    # Début de chaque enregistrement (virgule comprise), plus la fin de la section
+    offsets = np.zeros(len(records) + 1, dtype="<u8")
+    np.cumsum([len(record) + 1 for record in records], out=offsets[1:])
+    id_width = max((len(key) for key in keys), default=1)
+    sorted_ids = np.array(keys, dtype=f"S{id_width}")
+    order = np.argsort(sorted_ids, kind="stable")
+    sections = [
+        ("offsets", offsets.tobytes()),
+        ("sorted_ids", sorted_ids[order].tobytes()),
+        ("sorted_positions", order.astype("<u4").tobytes()),
+        ("records", b",".join(records)),
+    ]
+
+    # Positions des sections relatives à la fin (alignée) de l'en-tête
+    positions, position = {}, 0
+    for name, data in sections:
+        positions[name] = position
+        position += len(data) + len(_pad(len(data)))
+    header = dict(header, version=version, count=len(records), id_width=id_width, sections=positions)
+    header_bytes = json.dumps(header).encode()
+    header_size = len(header_bytes)
+
+    temporary = path.with_name(f".{path.name}.tmp")
+    with open(temporary, "wb") as f:
+        f.write(PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, header_size))
+        f.write(header_bytes)
+        f.write(_pad(PREAMBLE.size + header_size))
+        for _, data in sections:
+            f.write(data)
+            f.write(_pad(len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class EmbeddingSnapshot:
+    """Un instantané ouvert en lecture seule ; les vecteurs et les sections sont des vues sur `mmap`."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Le répertoire de l'instantané.
+
+        Raises:
+            SnapshotError: Si le fichier annexe ou les vecteurs sont incohérents.
+        """
+        self.path = Path(path)
+        with open(self.path / RECORDS_FILE, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buffer) < PREAMBLE.size:
+            raise SnapshotError(f"Truncated snapshot records in {self.path}")
+        magic, format_version, header_size = PREAMBLE.unpack_from(self._buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"Not a snapshot records file: {self.path / RECORDS_FILE}")
+        if format_version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {format_version} in {self.path}")
+        self.header = json.loads(self._buffer[PREAMBLE.size:PREAMBLE.size + header_size])
+        self.version: str = self.header["version"]
+        count = self.header["count"]
+        data_start = PREAMBLE.size + header_size + len(_pad(PREAMBLE.size + header_size))
+        sections = {name: data_start + position for name, position in self.header["sections"].items()}
+        self._offsets = np.frombuffer(self._buffer, dtype="<u8", count=count + 1, offset=sections["offsets"])
+        self._sorted_ids = np.frombuffer(
+            self._buffer, dtype=f"S{self.header['id_width']}", count=count, offset=sections["sorted_ids"]
+        )
+        self._sorted_positions = np.frombuffer(
+            self._buffer, dtype="<u4", count=count, offset=sections["sorted_positions"]
+        )
+        self._records_start = sections["records"]
+
+        self.vectors: np.ndarray = np.load(self.path / VECTORS_FILE, mmap_mode="r")
+        if self.vectors.dtype != np.float32 or self.vectors.shape[0] != count:
+            raise SnapshotError(
+                f"Snapshot vectors {self.vectors.dtype}{self.vectors.shape} do not match {count} records in {self.path}"
+            )
+        if count and self.header.get("dimensions", self.dimensions) != self.dimensions:
+            raise SnapshotError(
+                f"Snapshot vectors have {self.dimensions} dimensions, header says {self.header['dimensions']}"
+            )
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def normalized(self) -> bool:
+        """Vrai si les vecteurs ont été normalisés à l'export (instantanés récents)."""
+        return bool(self.header.get("normalized", False))
+
+    def record(self, position: int) -> Tuple[str, dict]:
+        """L'id et les métadonnées d'une ligne, décodés à la demande."""
+        start = self._records_start + int(self._offsets[position])
+        end = self._records_start + int(self._offsets[position + 1]) - 1
+        row_id, metadata = json.loads(self._buffer[start:end])
+        return row_id, metadata
+
+    def records(self) -> Tuple[List[str], List[dict]]:
+        """Les ids et métadonnées de toutes les lignes, dans l'ordre des vecteurs, en un seul décodage JSON."""
+        if not len(self):
+            return [], []
+        end = self._records_start + int(self._offsets[-1]) - 1
+        rows = json.loads(b"[" + self._buffer[self._records_start:end] + b"]")
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def positions(self, ids: Sequence[Any]) -> np.ndarray:
+        """Les positions des ids donnés, -1 pour un id absent de l'instantané."""
+        keys = [str(row_id).encode() for row_id in ids]
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        if not keys or not len(self):
+            return positions
+        width = self._sorted_ids.dtype.itemsize
+        searched = np.array(keys, dtype=f"S{width}")
+        found = np.minimum(np.searchsorted(self._sorted_ids, searched), len(self) - 1)
+        matches = (self._sorted_ids[found] == searched) & np.array([len(key) <= width for key in keys])
+        positions[matches] = self._sorted_positions[found[matches]]
+        return positions
+
+    def normalized_embeddings(self, ids: Sequence[Any]) -> Tuple[Dict[str, np.ndarray], List[Any]]:
+        """
+        Les embeddings normalisés des ids présents dans l'instantané.
+
+        Returns:
+            Un dictionnaire id -> embedding et la liste des ids absents.
+        """
+        positions = self.positions(ids)
+        found = positions >= 0
+        matrix = normalize_rows(np.asarray(self.vectors[positions[found]], dtype=np.float32))
+        present = [row_id for row_id, is_found in zip(ids, found) if is_found]
+        missing = [row_id for row_id, is_found in zip(ids, found) if not is_found]
+        return {str(row_id): vector for row_id, vector in zip(present, matrix)}, missing
+
+
+class SnapshotReader:
+    """
+    Suit la version courante des instantanés d'un dossier (fichier `CURRENT`).
+
+    Le fichier `CURRENT` est relu au plus toutes les `check_interval` secondes ; une nouvelle version
+    est ouverte à la place de l'ancienne, dont les pages restent valides tant qu'une recherche en
+    cours les référence. Une version dont l'en-tête diffère de `expected` est écartée comme une
+    version illisible.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 5.0, expected: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            directory: Le dossier des instantanés.
+            check_interval: Le délai minimal en secondes entre deux lectures de `CURRENT`.
+            expected: Les valeurs attendues de champs de l'en-tête (niveau, table, dimension...).
+        """
+        self.directory = Path(directory)
+        self.check_interval = check_interval
+        self.expected = expected or {}
+        self._snapshot: Optional[EmbeddingSnapshot] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[EmbeddingSnapshot]:
+        """L'instantané courant, ou None s'il n'y en a pas encore (ou s'il est illisible)."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                version = (self.directory / CURRENT_FILE).read_text().strip()
+            except FileNotFoundError:
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.version != version:
+                try:
+                    snapshot = EmbeddingSnapshot(self.directory / version)
+                    mismatched = {
+                        key: snapshot.header.get(key)
+                        for key, value in self.expected.items()
+                        if snapshot.header.get(key) != value
+                    }
+                    if mismatched:
+                        raise SnapshotError(f"header {mismatched} does not match the expected {self.expected}")
+                    self._snapshot = snapshot
+                    logging.info(f"Opened embedding snapshot {version} ({len(self._snapshot)} rows)")
+                except (OSError, ValueError, KeyError) as e:
+                    logging.warning(f"Cannot open embedding snapshot {version}: {e}")
+            return self._snapshot
+
+
+def export_snapshot(store: "VectorStore", directory: str, keep: int = 2) -> str:
+    """
+    Exporte les embeddings de la table des volumes dans un nouvel instantané et en fait la version courante.
+
+    Les vecteurs sont décodés directement dans le fichier `.npy` projeté en mémoire puis normalisés
+    sur place ; l'instantané est écrit dans un répertoire temporaire puis renommé, et `CURRENT`
+    remplacé en dernier.
+
+    Args:
+        store: Le magasin de vecteurs lu.
+        directory: Le dossier des instantanés.
+        keep: Le nombre de versions conservées, courante comprise ; les plus anciennes sont supprimées.
+
+    Returns:
+        La version de l'instantané.
+    """
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    staging = root / f".{version}.tmp"
+    staging.mkdir()
+    level = "volume"
+    try:
+        def allocate(shape: Tuple[int, int]) -> np.ndarray:
+            return np.lib.format.open_memmap(staging / VECTORS_FILE, mode="w+", dtype=np.float32, shape=shape)
+
+        ids, metadata, matrix = store.read_embeddings(level, allocate=allocate)
+        # Normalisés une fois ici, les vecteurs sont indexés par les workers sans copie privée
+        for start in range(0, len(matrix), NORMALIZE_BATCH_SIZE):
+            block = matrix[start:start + NORMALIZE_BATCH_SIZE]
+            block[:] = normalize_rows(block)
+        matrix.flush()
+        del matrix
+        write_records(
+            staging / RECORDS_FILE,
+            version,
+            ids,
+            metadata,
+            {
+                "table": store._search_table(level),
+                "level": level,
+                "dimensions": store.vector_settings.embedding_dimensions,
+                "normalized": True,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+        staging.rename(root / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _write_atomically(root / CURRENT_FILE, f"{version}\n".encode())
+    logging.info(f"Exported {len(ids)} embeddings to snapshot {root / version}")
+
+    # Les workers qui projettent encore une version supprimée gardent leurs pages (POSIX)
+    versions = sorted(path.name for path in root.iterdir() if path.is_dir() and not path.name.startswith("."))
+    for old_version in versions[:-max(keep, 1)]:
+        shutil.rmtree(root / old_version, ignore_errors=True)
+    return version
+
+
+def main():
+    from app.database.vector_store import VectorStore
+
+    parser = argparse.ArgumentParser(description="Exporte les embeddings dans un instantané partagé par les workers")
+    parser.add_argument("--dir", help="Dossier des instantanés (défaut : VECTOR_SNAPSHOT_DIR)")
+    parser.add_argument("--keep", type=int, default=2, help="Nombre de versions conservées")
+    args = parser.parse_args()
+
+    vec = VectorStore()
+    directory = args.dir or vec.vector_settings.snapshot_dir
+    if not directory:
+        parser.error("--dir ou VECTOR_SNAPSHOT_DIR est requis")
+    version = export_snapshot(vec, directory, args.keep)
+    vec.close()
+    print(f"Instantané {version} écrit dans {directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""
+Index IVF (inverted file) en mémoire pour la recherche par similarité cosinus.
+
+Un quantificateur grossier (k-means sphérique) répartit les embeddings normalisés en `n_lists`
+listes inversées ; une requête n'est comparée qu'aux lignes des `nprobe` listes dont le centroïde
+lui est le plus proche. Les écritures sont appliquées au fil de l'eau : une ligne ajoutée ou
+modifiée rejoint la liste de son centroïde le plus proche, une ligne supprimée est marquée morte
+puis écartée au compactage.
+
+Avec une quantification (voir `app.database.quantization`), l'index ne conserve que les codes int8
+ou binaires des embeddings : ses similarités sont approchées et les candidats doivent être
+reclassés avec les vecteurs d'origine.
+
+Les filtres d'égalité sur les champs promus en colonnes (voir `METADATA_COLUMNS`) et l'exclusion de
+séries sont évalués sur des codes entiers, avec la sémantique des colonnes générées Postgres ; tout
+autre filtre lève `UnsupportedFilterError` et la recherche doit alors passer par Postgres.
+"""
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.database.quantization import make_quantizer
+from app.database.reranker import normalize_rows, to_float32_matrix, top_k_indices
+
+# Points d'entraînement du k-means par liste (échantillon aléatoire du catalogue)
+TRAINING_POINTS_PER_LIST = 64
+
+# Lignes comparées aux centroïdes par bloc, pour borner la mémoire de l'affectation
+ASSIGNMENT_BATCH_SIZE = 4096
+
+# Part de lignes mortes au-delà de laquelle les tableaux sont compactés
+MAX_DEAD_RATIO = 0.5
+
+# Même motif que la colonne générée INTEGER (voir `BaseVectorStore._generated_column_sql`)
+INTEGER_PATTERN = re.compile(r"-?[0-9]+")
+
+
+class UnsupportedFilterError(ValueError):
+    """Filtre que l'index ne sait pas évaluer : la recherche doit passer par Postgres."""
+
+
+def _json_text(value: Any) -> Optional[str]:
+    """Texte d'une valeur de métadonnée tel que rendu par `metadata ->> clé`."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _column_key(value: Any, sql_type: str) -> Any:
+    """Valeur d'une colonne générée pour une métadonnée (None pour NULL)."""
+    text = _json_text(value)
+    if sql_type == "INTEGER":
+        return int(text) if text is not None and INTEGER_PATTERN.fullmatch(text) else None
+    return text
+
+
+def _filter_key(value: Any, sql_type: str) -> Any:
+    """Valeur comparée à la colonne pour un filtre d'égalité (voir `PredicateCompiler.comparison`)."""
+    if sql_type != "INTEGER":
+        return str(value)
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return value if isinstance(value, int) else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class IVFIndex:
+    """Index IVF des embeddings d'une table, avec les métadonnées nécessaires au filtrage et aux résultats."""
+
+    def __init__(
+        self,
+        columns: Dict[str, Tuple[str, str]],
+        n_lists: int = 0,
+        iterations: int = 10,
+        seed: int = 0,
+        quantization: str = "none",
+    ):
+        """
+        Args:
+            columns: Les champs de métadonnées filtrables : clé -> (colonne, type SQL).
+            n_lists: Le nombre de listes inversées (0 : racine carrée du nombre de lignes).
+            iterations: Le nombre d'itérations du k-means.
+            seed: La graine de l'échantillonnage et de l'initialisation du k-means.
+            quantization: La représentation des embeddings conservés, "none" (float32), "int8" ou "binary".
+        """
+        self.columns = columns
+        self.n_lists = n_lists
+        self.iterations = iterations
+        self.seed = seed
+        self.quantization = quantization
+        self.quantizer = None
+        self.centroids: Optional[np.ndarray] = None
+        self.built_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Sérialise les entraînements : deux premiers upserts sur un index vide ne construisent qu'une fois
+        self._build_lock = threading.Lock()
+        self._reset(0)
+
+    def _reset(self, dimensions: int) -> None:
+        self._count = 0
+        self._dimensions = dimensions
+        self._vectors = self._encode(np.empty((0, dimensions), dtype=np.float32))
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._ids: List[Any] = []
+        self._metadata: List[dict] = []
+        self._positions: Dict[str, int] = {}
+        # Codes entiers des colonnes filtrables (0 pour NULL) et leur vocabulaire
+        self._codes = {key: np.empty(0, dtype=np.int32) for key in self.columns}
+        self._vocabulary: Dict[str, Dict[Any, int]] = {key: {} for key in self.columns}
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    @property
+    def quantized(self) -> bool:
+        """Vrai si les similarités rendues sont approchées (embeddings conservés en codes)."""
+        return self.quantizer is not None
+
+    def memory_usage(self) -> int:
+        """La taille en octets des embeddings conservés (codes ou float32)."""
+        return self._vectors[:self._count].nbytes
+
+    def _encode(self, matrix: np.ndarray) -> np.ndarray:
+        return self.quantizer.encode(matrix) if self.quantizer is not None else matrix
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Le temps écoulé depuis la construction de l'index, en secondes."""
+        if self.built_at is None:
+            return float("inf")
+        return (now if now is not None else time.monotonic()) - self.built_at
+
+    def build(
+        self, ids: Sequence[Any], metadata: Sequence[dict], vectors: Any, normalized: bool = False
+    ) -> "IVFIndex":
+        """
+        Entraîne le quantificateur sur les embeddings donnés puis les répartit dans les listes.
+
+        Args:
+            ids: Les ids des lignes.
+            metadata: Les métadonnées des lignes.
+            vectors: La matrice (n, d) des embeddings.
+            normalized: Vrai si les lignes de `vectors` sont déjà de norme unitaire (instantané). Sans
+                quantification, une matrice float32 contiguë est alors conservée sans copie : un index
+                construit depuis un instantané `mmap` partage ses pages avec les autres workers.
+
+        Returns:
+            L'index lui-même.
+        """
+        with self._build_lock:
+            return self._build(ids, metadata, vectors, normalized)
+
+    def _build(self, ids: Sequence[Any], metadata: Sequence[dict], vectors: Any, normalized: bool = False) -> "IVFIndex":
+        """Corps de `build`, appelé sous `_build_lock`."""
+        if len(ids):
+            matrix = to_float32_matrix(vectors)
+            if not normalized:
+                matrix = normalize_rows(matrix)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        centroids = self._train(matrix)
+        quantizer = make_quantizer(self.quantization)
+        if quantizer is not None and len(matrix):
+            quantizer.fit(matrix)
+        with self._lock:
+            self.centroids = centroids
+            self.quantizer = quantizer if len(matrix) else None
+            self._reset(matrix.shape[1])
+            self._append(list(ids), list(metadata), matrix, shared=normalized and self.quantizer is None)
+            self.built_at = time.monotonic()
+        return self
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """k-means sphérique sur un échantillon : centroïdes normalisés de forme (n_lists, d)."""
+        n = matrix.shape[0]
+        if not n:
+            return np.empty((0, matrix.shape[1]), dtype=np.float32)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, n_lists * TRAINING_POINTS_PER_LIST)
+        sample = matrix[np.sort(rng.choice(n, size=sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._nearest(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=n_lists)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            filled = counts > 0
+            sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+            centroids[filled] = normalize_rows(sums)
+            # Une liste vide est réamorcée sur un point tiré au hasard
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+        return centroids
+
+    @staticmethod
+    def _nearest(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Affecte chaque ligne au centroïde le plus proche, par blocs."""
+        assignments = np.empty(matrix.shape[0], dtype=np.int32)
+        for start in range(0, matrix.shape[0], ASSIGNMENT_BATCH_SIZE):
+            block = matrix[start:start + ASSIGNMENT_BATCH_SIZE]
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _reserve(self, extra: int, vectors: bool = True) -> None:
+        """Agrandit les tableaux (capacité doublée) pour `extra` lignes de plus, embeddings compris si `vectors`."""
+        needed = self._count + extra
+        capacity = self._alive.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self._count] = array[:self._count]
+            return grown
+
+        if vectors:
+            self._vectors = grow(self._vectors)
+        self._assignments = grow(self._assignments)
+        self._alive = grow(self._alive)
+        self._codes = {key: grow(codes) for key, codes in self._codes.items()}
+
+    def _code(self, key: str, value: Any) -> int:
+        if value is None:
+            return 0
+        vocabulary = self._vocabulary[key]
+        return vocabulary.setdefault(value, len(vocabulary) + 1)
+
+    def _append(self, ids: List[Any], metadata: List[dict], matrix: np.ndarray, shared: bool = False) -> None:
+        """
+        Ajoute des lignes normalisées ; un id déjà présent remplace la ligne existante.
+
+        Avec `shared` (index vide, sans quantification), `matrix` devient le tableau des embeddings
+        sans être copiée ; la prochaine écriture l'agrandit dans une copie privée.
+        """
+        if not ids:
+            return
+        self._mark_dead(ids)
+        self._reserve(len(ids), vectors=not shared)
+        start, end = self._count, self._count + len(ids)
+        if shared:
+            self._vectors = matrix
+        else:
+            self._vectors[start:end] = self._encode(matrix)
+        self._assignments[start:end] = self._nearest(matrix, self.centroids)
+        self._alive[start:end] = True
+        for key, (_, sql_type) in self.columns.items():
+            self._codes[key][start:end] = [
+                self._code(key, _column_key((row or {}).get(key), sql_type)) for row in metadata
+            ]
+        for offset, (row_id, row_metadata) in enumerate(zip(ids, metadata)):
+            # Un id répété dans le même lot : la dernière occurrence l'emporte
+            previous = self._positions.get(str(row_id))
+            if previous is not None:
+                self._alive[previous] = False
+            self._positions[str(row_id)] = start + offset
+            self._ids.append(row_id)
+            self._metadata.append(row_metadata or {})
+        self._count = end
+        self._lists = None
+
+    def _mark_dead(self, ids: Sequence[Any]) -> int:
+        removed = 0
+        for row_id in ids:
+            position = self._positions.pop(str(row_id), None)
+            if position is not None:
+                self._alive[position] = False
+                removed += 1
+        return removed
+
+    def _compact(self) -> None:
+        """Retire les lignes mortes des tableaux ; les centroïdes sont conservés."""
+        keep = np.flatnonzero(self._alive[:self._count])
+        self._vectors = self._vectors[keep]
+        self._assignments = self._assignments[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._codes = {key: codes[keep] for key, codes in self._codes.items()}
+        self._ids = [self._ids[i] for i in keep]
+        self._metadata = [self._metadata[i] for i in keep]
+        self._positions = {str(row_id): i for i, row_id in enumerate(self._ids)}
+        self._count = len(keep)
+        self._lists = None
+
+    def upsert(self, ids: Sequence[Any], metadata: Sequence[dict], vectors: Any) -> None:
+        """
+        Ajoute ou remplace des lignes, affectées aux listes existantes sans réentraînement.
+
+        Raises:
+            ValueError: Si l'index n'a pas été construit.
+        """
+        if self.centroids is None:
+            raise ValueError("IVF index must be built before upserts")
+        if not len(ids):
+            return
+        with self._build_lock:
+            if not len(self.centroids):
+                # Index construit sur une table vide : le premier lot sert à l'entraînement
+                self._build(ids, metadata, vectors)
+                return
+        matrix = normalize_rows(to_float32_matrix(vectors))
+        with self._lock:
+            self._append(list(ids), list(metadata), matrix)
+
+    def remove(self, ids: Sequence[Any]) -> int:
+        """Supprime des lignes de l'index ; retourne le nombre de lignes supprimées."""
+        with self._lock:
+            removed = self._mark_dead(ids)
+            if removed:
+                self._lists = None
+                if self._count - len(self._positions) > MAX_DEAD_RATIO * self._count:
+                    self._compact()
+            return removed
+
+    def ids(self) -> List[Any]:
+        """Les ids des lignes présentes dans l'index."""
+        with self._lock:
+            return [self._ids[position] for position in self._positions.values()]
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Les lignes triées par liste et les bornes de chaque liste, recalculées après une écriture."""
+        if self._lists is None:
+            assignments = self._assignments[:self._count]
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=len(self.centroids))
+            self._lists = order, np.concatenate(([0], np.cumsum(counts)))
+        return self._lists
+
+    def _filter_mask(
+        self,
+        metadata_filter: Union[dict, List[dict], None],
+        exclude_series_ids: Optional[Sequence[str]],
+    ) -> Optional[np.ndarray]:
+        """
+        Évalue les filtres d'égalité et l'exclusion de séries sur toutes les lignes.
+
+        Returns:
+            Le masque des lignes retenues, ou None sans filtre.
+
+        Raises:
+            UnsupportedFilterError: Si un champ filtré n'est pas promu en colonne.
+        """
+        filters = [metadata_filter] if isinstance(metadata_filter, dict) else list(metadata_filter or [])
+        filters = [conditions for conditions in filters if conditions]
+        mask = None
+        if filters:
+            mask = np.zeros(self._count, dtype=bool)
+            for conditions in filters:
+                matches = np.ones(self._count, dtype=bool)
+                for key, value in conditions.items():
+                    matches &= self._equals(key, value)
+                mask |= matches
+        if exclude_series_ids:
+            codes = self._filter_codes("serie_id")
+            vocabulary = self._vocabulary["serie_id"]
+            excluded = [vocabulary[str(value)] for value in exclude_series_ids if str(value) in vocabulary]
+            kept = (codes != 0) & ~np.isin(codes, excluded)
+            mask = kept if mask is None else mask & kept
+        return mask
+
+    def _filter_codes(self, key: str) -> np.ndarray:
+        if key not in self.columns:
+            raise UnsupportedFilterError(f"Field {key!r} is not indexed")
+        return self._codes[key][:self._count]
+
+    def _equals(self, key: str, value: Any) -> np.ndarray:
+        codes = self._filter_codes(key)
+        if isinstance(value, (list, tuple, set, dict)):
+            raise UnsupportedFilterError(f"Unsupported filter value for {key!r}")
+        code = self._vocabulary[key].get(_filter_key(value, self.columns[key][1]))
+        if code is None:
+            return np.zeros(self._count, dtype=bool)
+        return codes == code
+
+    def search(
+        self,
+        queries: Any,
+        k: int,
+        nprobe: int,
+        metadata_filter: Union[dict, List[dict], None] = None,
+        exclude_series_ids: Optional[Sequence[str]] = None,
+        one_per_series: bool = False,
+    ) -> List[List[Tuple[Any, dict, float]]]:
+        """
+        Recherche les k lignes les plus similaires à chaque requête parmi les `nprobe` listes les plus proches.
+
+        Avec un filtre, le nombre de listes sondées est divisé par la fraction des lignes retenues ;
+        tant qu'une requête rend moins de k résultats (filtres sélectifs, séries dédupliquées), il
+        est quadruplé, jusqu'à parcourir tout l'index.
+
+        Args:
+            queries: Un vecteur de requête ou une matrice (m, d) de requêtes.
+            k: Le nombre de résultats par requête.
+            nprobe: Le nombre de listes sondées.
+            metadata_filter: Un dictionnaire d'égalités, ou une liste de dictionnaires combinés par OU.
+            exclude_series_ids: Les `serie_id` à écarter ; une ligne sans `serie_id` est écartée, comme en SQL.
+            one_per_series: Ne garder que la ligne la plus proche de chaque `serie_id`.
+
+        Returns:
+            Pour chaque requête, les tuples (id, métadonnées, similarité) par similarité décroissante,
+            la similarité étant approchée si l'index est quantifié.
+
+        Raises:
+            UnsupportedFilterError: Si un champ filtré n'est pas promu en colonne.
+        """
+        query_matrix = normalize_rows(to_float32_matrix(queries))
+        with self._lock:
+            if not len(self._positions):
+                return [[] for _ in range(query_matrix.shape[0])]
+            alive = self._alive[:self._count]
+            mask = self._filter_mask(metadata_filter, exclude_series_ids)
+            n_lists = len(self.centroids)
+            if mask is not None:
+                alive = alive & mask
+                # Un filtre ne retenant qu'une fraction des lignes élargit d'autant le sondage
+                selectivity = max(np.count_nonzero(alive), 1) / len(self._positions)
+                nprobe = int(np.ceil(nprobe / selectivity))
+            order, bounds = self._inverted_lists()
+            centroid_scores = query_matrix @ self.centroids.T
+            results = []
+            for query, scores in zip(query_matrix, centroid_scores):
+                probes = max(1, min(nprobe, n_lists))
+                while True:
+                    lists = top_k_indices(scores[np.newaxis, :], probes)[0]
+                    rows = np.concatenate([order[bounds[i]:bounds[i + 1]] for i in lists])
+                    rows = rows[alive[rows]]
+                    ranked = self._rank(rows, query, k, one_per_series)
+                    if len(ranked) >= k or probes >= n_lists:
+                        break
+                    probes = min(probes * 4, n_lists)
+                results.append(ranked)
+            return results
+
+    def _rank(self, rows: np.ndarray, query: np.ndarray, k: int, one_per_series: bool) -> List[Tuple[Any, dict, float]]:
+        if self.quantizer is not None:
+            row_scores = self.quantizer.scores(self._vectors[rows], query)
+        else:
+            row_scores = self._vectors[rows] @ query
+        top = top_k_indices(row_scores[np.newaxis, :], len(rows) if one_per_series else k)[0]
+        ranked = []
+        seen = set()
+        for i in top:
+            row = rows[i]
+            if one_per_series:
+                serie_id = self._metadata[row].get("serie_id")
+                if serie_id in seen:
+                    continue
+                seen.add(serie_id)
+            ranked.append((self._ids[row], self._metadata[row], float(row_scores[i])))
+            if len(ranked) >= k:
+                break
+        return ranked
@@ -0,0 +1,43 @@
+"""
+Migration du stockage des embeddings vers le mode configuré puis construction de l'index HNSW.
+
+Le mode cible est lu depuis les paramètres (VECTOR_EMBEDDING_DIMENSIONS, VECTOR_STORAGE_TYPE),
+les options de la ligne de commande permettant de les surcharger :
+
+    python -m app.database.migrate_vectors --dimensions 1536 --vector-type halfvec
+
+La réduction de dimension utilise `subvector` et `l2_normalize`, disponibles à partir de pgvector 0.7.
+Les services doivent ensuite être redémarrés avec les mêmes paramètres.
+"""
+import argparse
+import logging
+
+from app.database.vector_store import VectorStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migre la colonne embedding et construit l'index HNSW")
+    parser.add_argument("--dimensions", type=int, help="Dimension cible des embeddings")
+    parser.add_argument("--vector-type", choices=["vector", "halfvec"], help="Type de colonne pgvector cible")
+    parser.add_argument("--no-index", action="store_true", help="Ne pas construire l'index HNSW")
+    args = parser.parse_args()
+
+    vec = VectorStore()
+    overrides = {}
+    if args.dimensions:
+        overrides["embedding_dimensions"] = args.dimensions
+    if args.vector_type:
+        overrides["vector_type"] = args.vector_type
+    vec.vector_settings = vec.vector_settings.model_copy(update=overrides)
+
+    logging.info(f"Stockage actuel : {vec.get_column_type()} -> cible : {vec.vector_column_type}")
+    vec.migrate_storage(build_index=not args.no_index)
+    print(
+        f"Migration terminée : {vec.vector_settings.table_name}.embedding est en {vec.vector_column_type}. "
+        f"Définir VECTOR_EMBEDDING_DIMENSIONS={vec.vector_settings.embedding_dimensions} "
+        f"et VECTOR_STORAGE_TYPE={vec.vector_settings.vector_type} pour les services."
+    )
+
+
+if __name__ == '__main__':
+    main()
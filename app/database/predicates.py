@@ -0,0 +1,197 @@
+"""
+Compilation des prédicats timescale-vector (`client.Predicates`) en SQL paramétré.
+
+Un arbre de prédicats est composé de nœuds AND/OR/NOT dont les clauses sont des sous-arbres ou
+des tuples `(champ, valeur)` / `(champ, opérateur, valeur)`. Les champs promus en colonnes
+(voir `METADATA_COLUMNS`) sont comparés à leur colonne typée et indexée ; les autres champs sont
+lus dans `metadata` avec un typage dépendant de la valeur, sans conversion pouvant échouer en base.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from psycopg.types.json import Jsonb
+
+# Opérateurs de comparaison acceptés -> opérateur SQL
+COMPARISON_OPERATORS = {
+    "=": "=",
+    "==": "=",
+    "!=": "<>",
+    "<>": "<>",
+    ">": ">",
+    ">=": ">=",
+    "<": "<",
+    "<=": "<=",
+}
+
+# Opérateurs de liste : appartenance ou non à une liste de valeurs
+LIST_OPERATORS = {"in": False, "not in": True}
+
+
+class PredicateCompiler:
+    """Compile les prédicats et les égalités de `metadata_filter` pour une table donnée."""
+
+    def __init__(self, columns: Dict[str, Tuple[str, str]]):
+        """
+        Args:
+            columns: Les champs de métadonnées promus en colonnes : clé -> (colonne, type SQL).
+        """
+        self.columns = columns
+
+    def compile(self, predicates: Any, params: list) -> str:
+        """
+        Compile un arbre de prédicats en condition SQL, les valeurs étant ajoutées à `params`.
+
+        Un NOT est vrai lorsqu'aucune de ses clauses n'est vraie, une clause inconnue (NULL)
+        comptant comme fausse, comme dans timescale-vector.
+
+        Returns:
+            La condition SQL, ou une chaîne vide pour un arbre sans clause.
+
+        Raises:
+            ValueError: Si un opérateur ou le format d'une clause n'est pas reconnu.
+        """
+        operator = getattr(predicates, "operator", "AND")
+        clauses = getattr(predicates, "clauses", None)
+        if clauses is None:
+            raise ValueError(f"Unsupported predicates: {predicates!r}")
+        if operator not in ("AND", "OR", "NOT"):
+            raise ValueError(f"Invalid logical operator: {operator}")
+
+        conditions = []
+        for clause in clauses:
+            if isinstance(clause, tuple):
+                conditions.append(self._clause(clause, params))
+            else:
+                # Un sous-arbre vide n'impose aucune condition
+                conditions.append(f"({self.compile(clause, params) or 'TRUE'})")
+        if not conditions:
+            return ""
+        if operator == "NOT":
+            return f"TRUE IS DISTINCT FROM ({' OR '.join(conditions)})"
+        return f" {operator} ".join(conditions)
+
+    def _clause(self, clause: tuple, params: list) -> str:
+        if len(clause) == 2:
+            field, value = clause
+            operator = "="
+        elif len(clause) == 3:
+            field, operator, value = clause
+        else:
+            raise ValueError(f"Invalid clause format: {clause!r}")
+
+        operator = str(operator).strip().lower()
+        if operator == "@>":
+            return self.contains(field, value, params)
+        if operator in LIST_OPERATORS:
+            return self.in_list(field, value, params, negate=LIST_OPERATORS[operator])
+        if operator not in COMPARISON_OPERATORS:
+            raise ValueError(f"Invalid operator: {operator}")
+        sql_operator = COMPARISON_OPERATORS[operator]
+        if isinstance(value, (list, tuple, set)) and sql_operator in ("=", "<>"):
+            return self.in_list(field, value, params, negate=sql_operator == "<>")
+        return self.comparison(field, sql_operator, value, params)
+
+    def _column_operand(self, column: Tuple[str, str], values: List[Any]) -> Tuple[str, List[Any]]:
+        """
+        Retourne l'opérande SQL d'une colonne promue et les valeurs converties à son type.
+
+        Une valeur non entière comparée à une colonne entière est comparée à son texte.
+        """
+        name, sql_type = column
+        if sql_type == "INTEGER":
+            try:
+                return name, [value if isinstance(value, (int, float)) else int(value) for value in values]
+            except (TypeError, ValueError):
+                return f"{name}::text", [str(value) for value in values]
+        return name, [str(value) for value in values]
+
+    def comparison(self, field: str, sql_operator: str, value: Any, params: list) -> str:
+        """
+        Compare un champ de métadonnées à une valeur.
+
+        Pour un champ non promu : l'égalité compare le texte du champ à celui de la valeur ("3"
+        égale 3, comme dans timescale-vector), précédée d'une inclusion JSON de chaque écriture
+        possible de la valeur qui permet l'usage de l'index GIN ; une comparaison d'ordre avec un
+        nombre ne porte que sur les valeurs JSON numériques, avec une date sur le texte converti en
+        timestamptz et avec toute autre valeur sur le texte du champ.
+        """
+        column = self.columns.get(field)
+        if column is not None:
+            operand, (converted,) = self._column_operand(column, [value])
+            params.append(converted)
+            return f"{operand} {sql_operator} %s"
+        if sql_operator == "=":
+            containment = self._containment(field, [value], params)
+            params.extend([field, self._text(value)])
+            return f"({containment} AND metadata ->> %s = %s)"
+        if sql_operator == "<>":
+            params.extend([field, self._text(value)])
+            return f"metadata ->> %s <> %s"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            params.extend([field, field, Jsonb(value)])
+            return f"(jsonb_typeof(metadata -> %s) = 'number' AND metadata -> %s {sql_operator} %s)"
+        if isinstance(value, datetime):
+            params.extend([field, value])
+            return f"(metadata ->> %s)::timestamptz {sql_operator} %s"
+        params.extend([field, str(value)])
+        return f"metadata ->> %s {sql_operator} %s"
+
+    @staticmethod
+    def _text(value: Any) -> str:
+        """Texte d'une valeur tel que le rend `metadata ->> champ` (booléens JSON en minuscules)."""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return str(value)
+
+    @classmethod
+    def _json_values(cls, value: Any) -> List[Any]:
+        """
+        Les valeurs JSON dont le texte (`->>`) est celui de la valeur : la chaîne elle-même, plus le
+        nombre ou le booléen qu'elle écrit ("3" et 3, "true" et true).
+        """
+        text = cls._text(value)
+        values = [text]
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return values
+        if isinstance(parsed, (bool, int, float)) and json.dumps(parsed) == text:
+            values.append(parsed)
+        return values
+
+    def _containment(self, field: str, values: List[Any], params: list) -> str:
+        """Inclusion JSON de l'une des écritures des valeurs, servie par l'index GIN `jsonb_path_ops`."""
+        documents = [Jsonb({field: json_value}) for value in values for json_value in self._json_values(value)]
+        params.extend(documents)
+        return f"({' OR '.join(['metadata @> %s'] * len(documents))})"
+
+    def in_list(self, field: str, values: Any, params: list, negate: bool = False) -> str:
+        """Teste l'appartenance (ou non) d'un champ à une liste de valeurs."""
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        if not values:
+            return "TRUE" if negate else "FALSE"
+        column = self.columns.get(field)
+        if column is not None:
+            operand, converted = self._column_operand(column, values)
+            params.append(converted)
+        elif negate:
+            operand = "metadata ->> %s"
+            params.extend([field, [self._text(value) for value in values]])
+        else:
+            # Comme pour l'égalité, l'inclusion JSON permet l'usage de l'index GIN
+            containment = self._containment(field, values, params)
+            params.extend([field, [self._text(value) for value in values]])
+            return f"({containment} AND metadata ->> %s = ANY(%s))"
+        if negate:
+            return f"{operand} <> ALL(%s)"
+        return f"{operand} = ANY(%s)"
+
+    def contains(self, field: str, value: Any, params: list) -> str:
+        """Teste qu'un champ tableau des métadonnées contient toutes les valeurs données."""
+        if isinstance(value, (list, tuple)):
+            if not value:
+                raise ValueError("Empty lists are not supported with @>")
+            value = list(value)
+        params.append(Jsonb({field: value}))
+        return "metadata @> %s"
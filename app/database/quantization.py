@@ -0,0 +1,212 @@
+"""
+Quantification des embeddings pour un premier tri rapide : codes int8 par dimension (4 fois plus
+petits que les float32) ou codes binaires de signe (32 fois plus petits).
+
+Les scores calculés sur les codes ne servent qu'à choisir des candidats, `rescore_factor` fois plus
+nombreux que les résultats demandés, reclassés ensuite avec les vecteurs d'origine. Le rapport de
+rappel et de vitesse aide à choisir le mode et le facteur sur les embeddings du catalogue :
+
+    python -m app.database.quantization --level volume --queries 200 --k 10
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.database.reranker import normalize_rows, top_k_indices
+
+# Modes de quantification ; "none" conserve les float32
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Lignes de codes int8 converties par bloc en float32 : un bloc réutilisé qui reste dans le cache
+# coûte moins que la conversion de toute la matrice
+INT8_BATCH_SIZE = 64
+
+# Lignes de codes binaires comparées par bloc
+BINARY_BATCH_SIZE = 1024
+
+# Nombre de bits à 1 de chaque octet (repli si `np.bitwise_count` n'existe pas, NumPy < 2.0)
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Distances de Hamming entre des codes binaires (n, octets) et un code de requête."""
+    bitwise_count = getattr(np, "bitwise_count", None)
+    if bitwise_count is None:
+        return _POPCOUNT_TABLE[codes ^ query_code].sum(axis=1, dtype=np.int32)
+    if codes.shape[1] % 8 == 0:
+        # Comptage par mots de 64 bits, 8 fois moins d'éléments que par octet
+        codes = np.ascontiguousarray(codes).view(np.uint64)
+        query_code = np.ascontiguousarray(query_code).view(np.uint64)
+    return bitwise_count(codes ^ query_code).sum(axis=1, dtype=np.int32)
+
+
+class ScalarQuantizer:
+    """Codes int8 : chaque dimension est ramenée linéairement de son intervalle [min, max] à [-127, 127]."""
+
+    def __init__(self):
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    def fit(self, matrix: np.ndarray) -> "ScalarQuantizer":
+        """Apprend l'intervalle de chaque dimension ; les valeurs hors intervalle seront saturées."""
+        low, high = matrix.min(axis=0), matrix.max(axis=0)
+        self.offset = ((high + low) / 2).astype(np.float32)
+        self.scale = np.maximum((high - low) / 254, np.finfo(np.float32).tiny).astype(np.float32)
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        codes = np.rint((matrix - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Produits scalaires approchés avec la requête, chaque composante valant `offset + scale * code`."""
+        weights = (query * self.scale).astype(np.float32)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        buffer = np.empty((min(INT8_BATCH_SIZE, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+        for start in range(0, codes.shape[0], INT8_BATCH_SIZE):
+            block = codes[start:start + INT8_BATCH_SIZE]
+            converted = buffer[:len(block)]
+            np.copyto(converted, block, casting="unsafe")
+            scores[start:start + len(block)] = converted @ weights
+        return scores + np.float32(query @ self.offset)
+
+
+class BinaryQuantizer:
+    """Codes binaires : le signe de chaque dimension par rapport à sa moyenne, 8 dimensions par octet."""
+
+    def __init__(self):
+        self.center: Optional[np.ndarray] = None
+
+    def fit(self, matrix: np.ndarray) -> "BinaryQuantizer":
+        """Apprend la moyenne de chaque dimension, qui sert de seuil au signe."""
+        self.center = matrix.mean(axis=0).astype(np.float32)
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        return np.packbits(matrix > self.center, axis=-1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Similarité des signes, 1 - 2 * distance de Hamming / d : l'ordre suit la distance de Hamming."""
+        query_code = self.encode(query)
+        distances = np.empty(codes.shape[0], dtype=np.int32)
+        for start in range(0, codes.shape[0], BINARY_BATCH_SIZE):
+            block = codes[start:start + BINARY_BATCH_SIZE]
+            distances[start:start + len(block)] = _hamming_distances(block, query_code)
+        return 1 - 2 * distances.astype(np.float32) / self.center.shape[0]
+
+
+def make_quantizer(mode: str):
+    """
+    Retourne le quantificateur (non entraîné) d'un mode, ou None pour "none".
+
+    Raises:
+        ValueError: Si le mode est inconnu.
+    """
+    if mode == "int8":
+        return ScalarQuantizer()
+    if mode == "binary":
+        return BinaryQuantizer()
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def code_size(mode: str, dimensions: int) -> int:
+    """Taille en octets du code d'un vecteur de `dimensions` composantes."""
+    if mode == "int8":
+        return dimensions
+    if mode == "binary":
+        return (dimensions + 7) // 8
+    return 4 * dimensions
+
+
+def quantization_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    modes: Sequence[str] = QUANTIZATION_MODES,
+    rescore_factors: Sequence[int] = (1, 2, 4, 10),
+) -> List[Dict[str, float]]:
+    """
+    Mesure, par recherche exhaustive, le rappel@k et le temps de chaque mode de quantification.
+
+    Pour chaque mode et facteur, les `k * facteur` meilleurs candidats selon les codes sont
+    reclassés avec les vecteurs d'origine ; le rappel est la part des k plus proches voisins exacts
+    retrouvés.
+
+    Args:
+        vectors: La matrice (n, d) des embeddings du catalogue.
+        queries: La matrice (m, d) des requêtes (de préférence hors catalogue).
+        k: Le nombre de résultats par requête.
+        modes: Les modes comparés.
+        rescore_factors: Les facteurs de sur-échantillonnage comparés.
+
+    Returns:
+        Une ligne par mode et facteur : mode, facteur, octets par vecteur, compression, rappel,
+        temps moyen du premier tri et temps total par requête en millisecondes.
+    """
+    vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    queries = normalize_rows(np.asarray(queries, dtype=np.float32))
+    exact = top_k_indices(queries @ vectors.T, k)
+    dimensions = vectors.shape[1]
+
+    report = []
+    for mode in modes:
+        quantizer = make_quantizer(mode)
+        codes = quantizer.fit(vectors).encode(vectors) if quantizer is not None else vectors
+        for factor in rescore_factors if quantizer is not None else (1,):
+            found = 0
+            scan_time = total_time = 0.0
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                scores = quantizer.scores(codes, query) if quantizer is not None else codes @ query
+                candidates = top_k_indices(scores[np.newaxis, :], k * factor)[0]
+                scanned = time.perf_counter()
+                if quantizer is not None:
+                    candidates = candidates[top_k_indices((vectors[candidates] @ query)[np.newaxis, :], k)[0]]
+                total_time += time.perf_counter() - start
+                scan_time += scanned - start
+                found += len(np.intersect1d(candidates[:k], expected))
+            report.append({
+                "mode": mode,
+                "rescore_factor": factor,
+                "bytes_per_vector": code_size(mode, dimensions),
+                "compression": code_size("none", dimensions) / code_size(mode, dimensions),
+                "recall": found / (len(queries) * min(k, len(vectors))),
+                "scan_ms": 1000 * scan_time / len(queries),
+                "total_ms": 1000 * total_time / len(queries),
+            })
+    return report
+
+
+def main():
+    from app.database.vector_store import VectorStore
+
+    parser = argparse.ArgumentParser(description="Rapport rappel / vitesse des modes de quantification")
+    parser.add_argument("--level", choices=["volume", "series"], default="volume", help="Table mesurée")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre d'embeddings du catalogue pris comme requêtes")
+    parser.add_argument("--k", type=int, default=10, help="Nombre de résultats par requête")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage des requêtes")
+    args = parser.parse_args()
+
+    vec = VectorStore()
+    _, _, matrix = vec.read_embeddings(args.level)
+    vec.close()
+    # Les requêtes sont retirées du catalogue : une requête ne se retrouve pas elle-même
+    rng = np.random.default_rng(args.seed)
+    held_out = rng.choice(matrix.shape[0], size=min(args.queries, matrix.shape[0] // 2), replace=False)
+    catalog = np.delete(matrix, held_out, axis=0)
+
+    print(f"{catalog.shape[0]} embeddings de dimension {catalog.shape[1]}, {len(held_out)} requêtes, k={args.k}")
+    print(f"{'mode':<8}{'facteur':>8}{'octets':>8}{'gain':>7}{'rappel':>8}{'tri (ms)':>10}{'total (ms)':>12}")
+    for row in quantization_report(catalog, matrix[held_out], k=args.k):
+        print(
+            f"{row['mode']:<8}{row['rescore_factor']:>8}{row['bytes_per_vector']:>8}{row['compression']:>6.0f}x"
+            f"{row['recall']:>8.3f}{row['scan_ms']:>10.2f}{row['total_ms']:>12.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
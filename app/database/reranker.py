@@ -0,0 +1,108 @@
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+
+def to_float32_matrix(vectors: Any) -> np.ndarray:
+    """
+    Empile des vecteurs (listes, ndarray ou objets pgvector) dans une matrice float32 contiguë.
+
+    Args:
+        vectors: Un vecteur unique ou une séquence de vecteurs de même dimension.
+
+    Returns:
+        Une matrice de forme (n, d), un vecteur unique donnant n = 1.
+    """
+    if hasattr(vectors, "to_numpy"):
+        matrix = vectors.to_numpy()
+    elif isinstance(vectors, np.ndarray):
+        matrix = vectors
+    else:
+        matrix = np.asarray(
+            [v.to_numpy() if hasattr(v, "to_numpy") else v for v in vectors],
+            dtype=np.float32,
+        )
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalise chaque ligne à une norme L2 unitaire ; les lignes nulles restent nulles."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Sélectionne les indices des k meilleurs scores de chaque ligne, triés par score décroissant.
+
+    `argpartition` isole les k meilleurs en temps linéaire, seul ce sous-ensemble est ensuite trié.
+    """
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class EmbeddingMatrix:
+    """Matrice d'embeddings pré-normalisés pour le classement en mémoire par similarité cosinus."""
+
+    def __init__(self, embeddings: Any):
+        """
+        Args:
+            embeddings: Les embeddings candidats, une ligne par candidat.
+        """
+        self.matrix = normalize_rows(to_float32_matrix(embeddings))
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple[Any, ...]], embedding_index: int = 3) -> "EmbeddingMatrix":
+        """Construit la matrice à partir de lignes de résultats SQL (colonne embedding à `embedding_index`)."""
+        return cls([row[embedding_index] for row in rows])
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0] if self.matrix.size else 0
+
+    def scores(self, queries: Any) -> np.ndarray:
+        """Calcule la similarité cosinus de chaque requête avec chaque candidat, forme (m, n)."""
+        query_matrix = normalize_rows(to_float32_matrix(queries))
+        return query_matrix @ self.matrix.T
+
+    def top_k(self, queries: Any, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retourne les k candidats les plus similaires pour chaque requête.
+
+        Args:
+            queries: Un vecteur de requête ou une matrice (m, d) de requêtes.
+            k: Le nombre de candidats à retenir par requête.
+
+        Returns:
+            Un tuple (indices, scores) de formes (m, k'), avec k' = min(k, n).
+        """
+        if not len(self):
+            m = to_float32_matrix(queries).shape[0]
+            return np.empty((m, 0), dtype=np.intp), np.empty((m, 0), dtype=np.float32)
+        scores = self.scores(queries)
+        indices = top_k_indices(scores, k)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+    def rank(self, rows: Sequence[Tuple[Any, ...]], queries: Any, k: int) -> List[List[Tuple[Any, ...]]]:
+        """
+        Classe les lignes associées à la matrice pour chaque requête.
+
+        Returns:
+            Pour chaque requête, la liste des lignes retenues suivies de leur similarité.
+        """
+        indices, scores = self.top_k(queries, k)
+        return [
+            [rows[i] + (float(score),) for i, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
@@ -0,0 +1,47 @@
+"""
+Résultats de recherche vectorielle, sans dépendance à pandas.
+
+Chaque résultat est un tuple nommé (id, metadata, contents, embedding, similarity) : il reste
+indexable comme les lignes SQL d'origine, sans dictionnaire par instance. Les colonnes
+volumineuses (`contents`, `embedding`) ne sont lues en base que si elles sont demandées via
+`columns=`, et valent None sinon.
+"""
+from typing import Any, NamedTuple, Optional, Sequence, Tuple
+
+# Colonnes facultatives d'un résultat ; id, metadata et similarity sont toujours présents
+OPTIONAL_RESULT_COLUMNS = ("contents", "embedding")
+
+
+class SearchResult(NamedTuple):
+    """Un résultat de recherche : l'enregistrement trouvé et sa similarité cosinus avec la requête."""
+
+    id: Any
+    metadata: dict
+    contents: Optional[str]
+    embedding: Any
+    similarity: float
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Retourne un champ des métadonnées."""
+        return (self.metadata or {}).get(key, default)
+
+
+def result_columns(columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    """
+    Valide une projection `columns=` et retourne les colonnes facultatives demandées.
+
+    Args:
+        columns: Les colonnes à lire, ou None pour toutes ; id, metadata et similarity sont
+            toujours lues.
+
+    Raises:
+        ValueError: Si une colonne n'est pas une colonne de `SearchResult`.
+    """
+    if columns is None:
+        return OPTIONAL_RESULT_COLUMNS
+    if isinstance(columns, str):
+        columns = [columns]
+    unknown = set(columns) - set(SearchResult._fields)
+    if unknown:
+        raise ValueError(f"Unknown result columns: {sorted(unknown)}")
+    return tuple(name for name in OPTIONAL_RESULT_COLUMNS if name in columns)
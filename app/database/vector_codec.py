@@ -0,0 +1,115 @@
+"""
+Transfert binaire des vecteurs pgvector depuis et vers NumPy.
+
+Au format binaire, un vecteur pgvector est un en-tête de 4 octets (dimension et champ réservé, en
+uint16 big-endian) suivi de ses composantes big-endian : float32 pour `vector`, float16 pour
+`halfvec`. Les lectures de masse récupèrent ces octets bruts (`RawVectorLoader`) puis les décodent
+en une seule conversion NumPy dans une matrice float32 ; les paramètres et les lignes COPY sont
+encodés directement depuis les tableaux NumPy. Aucun flottant Python n'est créé en chemin.
+"""
+import struct
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector, register_vector_async
+from psycopg.adapt import Dumper, Loader
+from psycopg.pq import Format
+
+# En-tête binaire d'un vecteur pgvector : dimension, champ réservé
+VECTOR_HEADER = struct.Struct(">HH")
+
+# Type des composantes au format binaire selon le type de colonne pgvector
+BINARY_COMPONENT_TYPES = {"vector": ">f4", "halfvec": ">f2"}
+
+
+class RawVectorLoader(Loader):
+    """Charge un vecteur binaire sous forme d'octets bruts, décodés ensuite par lot (`decode_vectors`)."""
+
+    format = Format.BINARY
+
+    def load(self, data) -> bytes:
+        return bytes(data)
+
+
+class NumpyVectorDumper(Dumper):
+    """Encode un tableau NumPy (ou tout vecteur convertible) au format binaire `vector`, sans liste Python."""
+
+    format = Format.BINARY
+
+    def dump(self, obj: Any) -> bytes:
+        if hasattr(obj, "to_numpy"):
+            obj = obj.to_numpy()
+        values = np.asarray(obj).astype(">f4", copy=False)
+        if values.ndim != 1:
+            raise ValueError("expected ndim to be 1")
+        return VECTOR_HEADER.pack(values.shape[0], 0) + values.tobytes()
+
+
+def register_numpy_dumper(context: Any) -> None:
+    """Envoie les tableaux NumPy (paramètres et lignes COPY `vector`) au format binaire."""
+    info = context.adapters.types.get("vector")
+    if info is None:
+        raise psycopg.ProgrammingError("vector type not found in the database")
+    dumper = type("NumpyVectorBinaryDumper", (NumpyVectorDumper,), {"oid": info.oid})
+    context.adapters.register_dumper("numpy.ndarray", dumper)
+
+
+def register_raw_vector_loader(context: Any, vector_type: str = "vector") -> None:
+    """
+    Fait lire les colonnes `vector_type` en octets bruts sur `context` (typiquement un curseur binaire).
+
+    Raises:
+        psycopg.ProgrammingError: Si le type n'existe pas dans la base.
+    """
+    info = context.adapters.types.get(vector_type)
+    if info is None:
+        raise psycopg.ProgrammingError(f"{vector_type} type not found in the database")
+    context.adapters.register_loader(info.oid, RawVectorLoader)
+
+
+def configure_connection(conn: psycopg.Connection) -> None:
+    """`configure` des pools synchrones : adaptateurs pgvector et envoi binaire des tableaux NumPy."""
+    register_vector(conn)
+    register_numpy_dumper(conn)
+
+
+async def configure_async_connection(conn: psycopg.AsyncConnection) -> None:
+    """Variante asynchrone de `configure_connection`."""
+    await register_vector_async(conn)
+    register_numpy_dumper(conn)
+
+
+def decode_vectors(
+    values: Sequence[bytes], vector_type: str = "vector", out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Décode des vecteurs binaires pgvector de même dimension en une matrice float32.
+
+    Les octets sont juxtaposés puis lus comme un tableau d'enregistrements (en-tête, composantes) :
+    la conversion big-endian -> float32 natif se fait en une opération vectorisée.
+
+    Args:
+        values: Les vecteurs au format binaire, tels que rendus par `RawVectorLoader`.
+        vector_type: Le type de la colonne lue, "vector" ou "halfvec".
+        out: Une matrice float32 (n, d) préallouée à remplir ; créée si None.
+
+    Returns:
+        La matrice (n, d) des vecteurs (`out` si fournie).
+
+    Raises:
+        ValueError: Si les vecteurs n'ont pas tous la même dimension ou ne tiennent pas dans `out`.
+    """
+    if not len(values):
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+    dimensions, _ = VECTOR_HEADER.unpack_from(values[0])
+    record = np.dtype([("header", "V4"), ("values", BINARY_COMPONENT_TYPES[vector_type], (dimensions,))])
+    buffer = b"".join(values)
+    if len(buffer) != len(values) * record.itemsize:
+        raise ValueError("vectors must have the same dimensions")
+    if out is None:
+        out = np.empty((len(values), dimensions), dtype=np.float32)
+    elif out.shape != (len(values), dimensions):
+        raise ValueError(f"expected an output of shape {(len(values), dimensions)}, got {out.shape}")
+    out[...] = np.frombuffer(buffer, dtype=record)["values"]
+    return out
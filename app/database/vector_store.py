@@ -1,47 +1,829 @@
+import hashlib
+import json
 import logging
+import re
+import sys
 import time
-from typing import Any, List, Optional, Tuple, Union
+import uuid
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from datetime import datetime
-import os
 
-import pandas as pd
 import numpy as np
+from app.config.llm_clients import get_llm_clients
 from app.config.settings import get_settings
-from openai import OpenAI, AzureOpenAI
-import psycopg2
-from pgvector.psycopg2 import register_vector
+from app.database import catalog_events
+from app.database.embedding_cache import EmbeddingCache
+from app.database.embedding_snapshot import EmbeddingSnapshot, SnapshotReader
+from app.database.ivf_index import IVFIndex, UnsupportedFilterError
+from app.database.predicates import PredicateCompiler
+from app.database.reranker import EmbeddingMatrix, normalize_rows, to_float32_matrix
+from app.database.search_results import OPTIONAL_RESULT_COLUMNS, SearchResult, result_columns
+from app.database.vector_codec import (
+    VECTOR_HEADER,
+    configure_connection,
+    decode_vectors,
+    register_raw_vector_loader,
+)
+import psycopg
+from psycopg_pool import ConnectionPool
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Nombre maximal de dimensions indexables par HNSW selon le type de colonne pgvector
+HNSW_MAX_DIMENSIONS = {"vector": 2000, "halfvec": 4000}
+
+# Valeur par défaut de hnsw.ef_search : un parcours HNSW ne rend pas plus de candidats
+HNSW_DEFAULT_EF_SEARCH = 40
+
+# Colonnes attendues par VectorStore.upsert
+UPSERT_COLUMNS = ("id", "metadata", "contents", "embedding")
+
+# Champs de métadonnées promus en colonnes générées indexées : clé -> (colonne, type SQL)
+METADATA_COLUMNS = {
+    "serie_id": ("serie_id", "TEXT"),
+    "serie_title": ("serie_title", "TEXT"),
+    "volume_id": ("volume_id", "TEXT"),
+    "genre": ("genre", "TEXT"),
+    "categorie": ("categorie", "TEXT"),
+    "volume_number": ("volume_number", "INTEGER"),
+}
+# Dans la table des séries, `serie_id` est la clé primaire
+SERIES_METADATA_COLUMNS = {
+    "serie_id": ("id", "TEXT"),
+    "serie_title": ("serie_title", "TEXT"),
+    "genre": ("genre", "TEXT"),
+    "categorie": ("categorie", "TEXT"),
+}
+
+
+def _is_pandas(value: Any, type_name: str) -> bool:
+    """Teste si une valeur est du type pandas donné, sans importer pandas s'il ne l'est pas déjà."""
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(value, getattr(pd, type_name))
 
-class VectorStore:
-    """Une classe pour gérer les opérations vectorielles et les interactions avec la base de données."""
+
+def content_hash(contents: str) -> str:
+    """Empreinte du texte embeddé, stockée avec chaque enregistrement pour détecter les modifications."""
+    return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+
+class BaseVectorStore:
+    """
+    Socle commun des magasins de vecteurs synchrone et asynchrone.
+
+    Regroupe les paramètres et la construction des requêtes SQL, sans aucune entrée/sortie.
+    """
 
     def __init__(self):
-        """Initialise le VectorStore avec les paramètres, le client OpenAI/Azure OpenAI et le client Timescale Vector."""
+        """Initialise les paramètres et le modèle d'embedding (OpenAI ou Azure OpenAI)."""
         self.settings = get_settings()
-        
-        # Vérifier si Azure OpenAI doit être utilisé
-        use_azure = os.getenv("USE_AZURE_OPENAI", "false").lower() == "true"
-        
-        if use_azure:
-            self.openai_client = AzureOpenAI(
-                api_key=self.settings.azure_openai.api_key,
-                api_version=self.settings.azure_openai.api_version,
-                azure_endpoint=self.settings.azure_openai.azure_endpoint
+
+        # Clients OpenAI ou Azure OpenAI partagés avec le Synthesizer
+        self.llm_clients = get_llm_clients()
+        self.use_azure = self.llm_clients.use_azure
+        self.embedding_model = self.llm_clients.embedding_model
+
+        self.vector_settings = self.settings.vector_store
+        # Nombre total de tokens consommés par les appels d'embedding de cette instance
+        self.embedding_tokens = 0
+        # Index IVF en mémoire par niveau de recherche (moteur "ivf"), et version de l'instantané
+        # dont chacun a été construit (None : construit depuis Postgres)
+        self._ivf_indexes: Dict[str, IVFIndex] = {}
+        self._ivf_snapshot_versions: Dict[str, Optional[str]] = {}
+        self._snapshot_reader: Optional[SnapshotReader] = None
+        # Présence d'un index HNSW par table, vérifiée à la première recherche filtrée ou dédupliquée
+        self._hnsw_indexes: Dict[str, bool] = {}
+
+    def _batch_texts(self, texts: List[str]) -> Iterator[List[str]]:
+        """
+        Découpe les textes en lots respectant la taille maximale et le budget de tokens par requête.
+
+        Les tokens sont estimés de façon prudente à partir du nombre de caractères.
+        """
+        max_size = self.vector_settings.embedding_batch_size
+        max_tokens = self.vector_settings.embedding_batch_max_tokens
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = len(text) // 3 + 1
+            if batch and (len(batch) >= max_size or batch_tokens + tokens > max_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _embedding_request_options(self) -> dict:
+        """Options supplémentaires de l'appel d'embedding (dimensions raccourcies si configurées)."""
+        if self.vector_settings.request_dimensions:
+            return {"dimensions": self.vector_settings.embedding_dimensions}
+        return {}
+
+    @property
+    def vector_column_type(self) -> str:
+        """Le type SQL de la colonne embedding, par exemple `halfvec(1536)`."""
+        return f"{self.vector_settings.vector_type}({self.vector_settings.embedding_dimensions})"
+
+    def _pool_options(self) -> dict:
+        """
+        Options communes des pools de connexions synchrone et asynchrone.
+
+        Les connexions sont en autocommit : une recherche ne coûte qu'un aller-retour, les écritures
+        groupées ouvrent explicitement une transaction.
+        """
+        database = self.settings.database
+        return {
+            "min_size": database.pool_min_size,
+            "max_size": database.pool_max_size,
+            "timeout": database.pool_timeout,
+            "max_idle": database.pool_max_idle,
+            "kwargs": {
+                "autocommit": True,
+                "prepare_threshold": 5 if database.prepare_statements else None,
+            },
+        }
+
+    @staticmethod
+    def _pool_stats(pool) -> Optional[dict]:
+        """Retourne les métriques du pool, dont le temps d'attente moyen d'une connexion."""
+        if pool is None:
+            return None
+        stats = pool.get_stats()
+        queued = stats.get("requests_queued", 0)
+        stats["requests_wait_avg_ms"] = stats.get("requests_wait_ms", 0) / queued if queued else 0.0
+        return stats
+
+    def _embedding_cache_keys(self, texts: List[str], dimensions: Optional[int]) -> dict:
+        """Associe chaque texte normalisé à sa clé dans le cache d'embeddings."""
+        return {
+            text: EmbeddingCache.make_key(self.embedding_model, dimensions, text)
+            for text in texts
+        }
+
+    def supports_index(self) -> bool:
+        """Indique si le stockage configuré permet de construire l'index HNSW."""
+        return self.vector_settings.embedding_dimensions <= HNSW_MAX_DIMENSIONS[self.vector_settings.vector_type]
+
+    @staticmethod
+    def _metadata_columns(level: str = "volume") -> dict:
+        """Retourne les champs de métadonnées promus en colonnes pour un niveau de recherche."""
+        return SERIES_METADATA_COLUMNS if level == "series" else METADATA_COLUMNS
+
+    @staticmethod
+    def _generated_column_sql(key: str, sql_type: str) -> str:
+        """Expression d'une colonne générée à partir de `metadata` ; une valeur non entière donne NULL."""
+        if sql_type == "INTEGER":
+            return f"CASE WHEN metadata ->> '{key}' ~ '^-?[0-9]+$' THEN (metadata ->> '{key}')::INTEGER END"
+        return f"metadata ->> '{key}'"
+
+    def _metadata_columns_ddl(self, table: str, level: str = "volume") -> List[str]:
+        """
+        Construit les instructions ajoutant les colonnes générées et leurs index B-tree, plus
+        l'index GIN des métadonnées restantes. Idempotentes, elles complètent les tables existantes.
+        """
+        statements = []
+        for key, (column, sql_type) in self._metadata_columns(level).items():
+            if column != "id":
+                statements.append(
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {sql_type} "
+                    f"GENERATED ALWAYS AS ({self._generated_column_sql(key, sql_type)}) STORED"
+                )
+                statements.append(f"CREATE INDEX IF NOT EXISTS {table}_{column}_idx ON {table} ({column})")
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {table}_metadata_idx ON {table} USING gin (metadata jsonb_path_ops)"
+        )
+        return statements
+
+    def _build_where_clause(
+        self,
+        metadata_filter: Union[dict, List[dict]] = None,
+        predicates=None,
+        time_range: Optional[Tuple[datetime, datetime]] = None,
+        level: str = "volume",
+        exclude_series_ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[str, list]:
+        """
+        Construit la clause WHERE commune aux moteurs de recherche et à la suppression.
+
+        Les champs promus sont comparés à leurs colonnes indexées (voir `PredicateCompiler`).
+
+        Returns:
+            Un tuple (clause, paramètres) ; la clause est vide si aucun filtre n'est fourni.
+        """
+        conditions = []
+        params = []
+        compiler = PredicateCompiler(self._metadata_columns(level))
+
+        if metadata_filter:
+            filters = [metadata_filter] if isinstance(metadata_filter, dict) else metadata_filter
+            alternatives = []
+            for single_filter in filters:
+                equalities = [
+                    compiler.comparison(key, "=", value, params)
+                    for key, value in single_filter.items()
+                ]
+                if equalities:
+                    alternatives.append("(" + " AND ".join(equalities) + ")")
+            if alternatives:
+                conditions.append("(" + " OR ".join(alternatives) + ")")
+
+        # Prédicats timescale-vector (arbres AND/OR/NOT), évalués en base avec le classement
+        if predicates:
+            predicate_sql = compiler.compile(predicates, params)
+            if predicate_sql:
+                conditions.append(f"({predicate_sql})")
+
+        if time_range:
+            start_date, end_date = time_range
+            conditions.append("created_at BETWEEN %s AND %s")
+            params.extend([start_date, end_date])
+
+        if exclude_series_ids:
+            serie_column = self._metadata_columns(level)["serie_id"][0]
+            conditions.append(f"{serie_column} <> ALL(%s)")
+            params.append([str(serie_id) for serie_id in exclude_series_ids])
+
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def _search_table(self, level: str) -> str:
+        """
+        Retourne la table classée pour un niveau de recherche.
+
+        Raises:
+            ValueError: Si le niveau n'est ni "volume" ni "series".
+        """
+        if level == "volume":
+            return self.vector_settings.table_name
+        if level == "series":
+            return self.vector_settings.series_table_name
+        raise ValueError(f"Unknown search level: {level}")
+
+    def _search_many_sql(
+        self,
+        query_count: int,
+        where_clause: str,
+        level: str = "volume",
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> str:
+        """
+        Construit la requête classant les embeddings pour plusieurs requêtes en un seul aller-retour.
+
+        Chaque vecteur de requête alimente une sous-requête LATERAL triée par distance cosinus.
+        Avec `one_per_series`, seul le volume le plus proche de chaque série est gardé parmi les
+        candidats (`DISTINCT ON (serie_id)`) et chaque ligne porte en dernière colonne le nombre de
+        candidats classés. Les colonnes absentes de `columns` ne sont pas lues.
+        Paramètres attendus : les vecteurs de requête, ceux de `where_clause` puis ceux de `_search_limits`.
+        """
+        vector_type = self.vector_settings.vector_type
+        values = ", ".join(f"({i}, %s::{vector_type})" for i in range(query_count))
+        projection = self._projection_sql(columns)
+        candidates = f"""
+            SELECT {projection}, embedding <=> q.query_embedding AS distance
+            FROM {self._search_table(level)}{where_clause}
+            ORDER BY distance
+            LIMIT %s
+        """
+        ranked_count = ""
+        if self._dedupes_series(one_per_series, level):
+            candidates = f"""
+                SELECT id, metadata, contents, embedding, distance, ranked_count
+                FROM (
+                    SELECT DISTINCT ON (serie_id) id, metadata, contents, embedding, distance, ranked_count
+                    FROM (
+                        SELECT ranked.*, count(*) OVER () AS ranked_count
+                        FROM (
+                            SELECT {projection}, serie_id,
+                                embedding <=> q.query_embedding AS distance
+                            FROM {self._search_table(level)}{where_clause}
+                            ORDER BY distance
+                            LIMIT %s
+                        ) ranked
+                    ) counted
+                    ORDER BY serie_id, distance
+                ) per_series
+                ORDER BY distance
+                LIMIT %s
+            """
+            ranked_count = ", r.ranked_count"
+        return f"""
+            SELECT q.query_index, r.id, r.metadata, r.contents, r.embedding, r.distance{ranked_count}
+            FROM (VALUES {values}) AS q(query_index, query_embedding)
+            CROSS JOIN LATERAL ({candidates}) r
+            ORDER BY q.query_index, r.distance
+        """
+
+    @staticmethod
+    def _projection_sql(columns: Optional[Sequence[str]] = None, always: Sequence[str] = ()) -> str:
+        """
+        Liste SELECT des colonnes d'un résultat (id, metadata, contents, embedding) ; les colonnes
+        facultatives non demandées (ni dans `always`) valent NULL et ne sont pas lues.
+        """
+        wanted = set(result_columns(columns)) | set(always)
+        optional = [name if name in wanted else f"NULL AS {name}" for name in OPTIONAL_RESULT_COLUMNS]
+        return ", ".join(["id", "metadata", *optional])
+
+    @staticmethod
+    def _dedupes_series(one_per_series: bool, level: str) -> bool:
+        """Au niveau "series", chaque résultat est déjà une série distincte."""
+        return one_per_series and level == "volume"
+
+    def _search_limits(self, limit: int, candidates: int, one_per_series: bool, level: str) -> list:
+        """
+        Paramètres de limite de `_search_many_sql` : les candidats classés puis les résultats si les
+        séries sont dédupliquées, sinon les seuls résultats (les candidats ne relevant que `hnsw.ef_search`).
+        """
+        if self._dedupes_series(one_per_series, level):
+            return [candidates, limit]
+        return [limit]
+
+    def _initial_candidates(self, limit: int, one_per_series: bool, level: str) -> int:
+        """Nombre de candidats du premier tour : sur-échantillonné d'emblée si les séries sont dédupliquées."""
+        if self._dedupes_series(one_per_series, level):
+            overfetch = limit * self.vector_settings.search_overfetch_factor
+            return max(limit, min(overfetch, self.vector_settings.search_max_candidates))
+        return limit
+
+    def _next_candidates(
+        self,
+        grouped: List[List[Tuple[Any, ...]]],
+        limit: int,
+        candidates: int,
+        adaptive: bool,
+        ranked_counts: Optional[List[int]] = None,
+    ) -> Optional[int]:
+        """
+        Retourne le nombre de candidats du tour suivant, ou None si la recherche est terminée.
+
+        Un nouveau tour n'a lieu que pour une recherche adaptative (voir `_adaptive_search`) dont une
+        requête a rendu moins de `limit` résultats, tant que le plafond `search_max_candidates` n'est
+        pas atteint. Avec `ranked_counts`, seule une requête dont les `candidates` candidats ont tous
+        été classés justifie un nouveau tour : moins de candidats signifie que la table est épuisée.
+        """
+        max_candidates = self.vector_settings.search_max_candidates
+        if not adaptive or candidates >= max_candidates:
+            return None
+        short = [index for index, results in enumerate(grouped) if len(results) < limit]
+        if ranked_counts is not None:
+            short = [index for index in short if ranked_counts[index] >= candidates]
+        if not short:
+            return None
+        # En deçà de la valeur par défaut de hnsw.ef_search, un tour de plus ne rendrait rien de nouveau
+        widened = max(candidates, HNSW_DEFAULT_EF_SEARCH) * self.vector_settings.search_overfetch_factor
+        return min(widened, max_candidates)
+
+    def _adaptive_search(self, where_clause: str, one_per_series: bool, level: str) -> bool:
+        """
+        Indique si une recherche peut être tronquée par l'index HNSW et mériter d'être relancée avec
+        plus de candidats : seul un parcours d'index filtré ou dédupliqué s'arrête à `hnsw.ef_search`
+        lignes, un parcours exact rend toujours tout ce qui existe.
+        """
+        return (bool(where_clause) or self._dedupes_series(one_per_series, level)) and self.supports_index()
+
+    @staticmethod
+    def _hnsw_index_sql() -> str:
+        """Requête indiquant si la table passée en paramètre porte un index HNSW."""
+        return """
+            SELECT EXISTS (
+                SELECT 1
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_am am ON am.oid = c.relam
+                WHERE i.indrelid = to_regclass(%s) AND am.amname = 'hnsw'
             )
-            self.embedding_model = self.settings.azure_openai.embedding_model
+        """
+
+    def _ranked_counts(
+        self, rows: List[Tuple[Any, ...]], query_count: int, where_clause: str, one_per_series: bool, level: str
+    ) -> Optional[List[int]]:
+        """
+        Nombre de candidats classés par requête, lu dans la dernière colonne des lignes dédupliquées.
+
+        None pour une recherche filtrée ou non dédupliquée : le filtre appliqué après le parcours de
+        l'index peut écarter des candidats sans que la table soit épuisée.
+        """
+        if where_clause or not self._dedupes_series(one_per_series, level):
+            return None
+        counts = [0] * query_count
+        for row in rows:
+            counts[row[0]] = row[-1]
+        return counts
+
+    @staticmethod
+    def _one_per_series(results: List[Tuple[Any, ...]], limit: int) -> List[Tuple[Any, ...]]:
+        """Garde le premier résultat de chaque série (résultats triés par similarité décroissante)."""
+        seen = set()
+        kept = []
+        for row in results:
+            metadata = row[1] if isinstance(row[1], dict) else {}
+            serie_id = metadata.get("serie_id")
+            if serie_id in seen:
+                continue
+            seen.add(serie_id)
+            kept.append(row)
+            if len(kept) >= limit:
+                break
+        return kept
+
+    def _rank_candidates(
+        self,
+        rows: List[Tuple[Any, ...]],
+        queries: Any,
+        limit: int,
+        one_per_series: bool = False,
+        level: str = "volume",
+        columns: Optional[Sequence[str]] = None,
+        embeddings: Optional[np.ndarray] = None,
+    ) -> List[List[SearchResult]]:
+        """
+        Classe en mémoire les candidats filtrés pour chaque requête (moteur "python").
+
+        L'embedding, nécessaire au classement, n'est conservé dans les résultats que s'il est demandé.
+        `embeddings` est la matrice déjà décodée des candidats (voir `_decode_candidates`), à défaut
+        les embeddings sont lus dans les lignes.
+        """
+        matrix = EmbeddingMatrix(embeddings) if embeddings is not None else EmbeddingMatrix.from_rows(rows)
+        if self._dedupes_series(one_per_series, level):
+            ranked = [self._one_per_series(results, limit) for results in matrix.rank(rows, queries, len(rows))]
         else:
-            self.openai_client = OpenAI(api_key=self.settings.openai.api_key)
-            self.embedding_model = self.settings.openai.embedding_model
-        
-        self.vector_settings = self.settings.vector_store
-        self.conn = psycopg2.connect(self.settings.database.service_url)
-        
-        # Créer l'extension vector avant d'enregistrer le type
-        with self.conn.cursor() as cur:
-            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
-            self.conn.commit()
-        
-        register_vector(self.conn)
+            ranked = matrix.rank(rows, queries, limit)
+        keep_embedding = "embedding" in result_columns(columns)
+        return [
+            [
+                SearchResult(row[0], row[1], row[2], row[3] if keep_embedding else None, row[4])
+                for row in results
+            ]
+            for results in ranked
+        ]
+
+    @staticmethod
+    def _group_search_rows(rows: List[Tuple[Any, ...]], query_count: int) -> List[List[SearchResult]]:
+        """Regroupe les lignes de `_search_many_sql` par requête, la distance devenant une similarité."""
+        grouped = [[] for _ in range(query_count)]
+        for query_index, row_id, metadata, contents, embedding, distance, *_ in rows:
+            grouped[query_index].append(SearchResult(row_id, metadata, contents, embedding, 1.0 - distance))
+        return grouped
+
+    def _new_ivf_index(self, level: str = "volume") -> IVFIndex:
+        """Crée un index IVF vide pour un niveau, filtrable sur les champs promus en colonnes."""
+        return IVFIndex(
+            self._metadata_columns(level),
+            n_lists=self.vector_settings.ivf_lists,
+            quantization=self.vector_settings.ivf_quantization,
+        )
+
+    def _current_snapshot(self, level: str) -> Optional[EmbeddingSnapshot]:
+        """
+        Retourne l'instantané courant de la table des volumes (voir `embedding_snapshot`), ou None
+        sans `snapshot_dir` ou pour le niveau "series", qui n'est lu qu'en base.
+        """
+        directory = self.vector_settings.snapshot_dir
+        if not directory or level != "volume":
+            return None
+        # Un instantané d'une autre table ou d'une autre dimension est écarté par le lecteur
+        expected = {
+            "level": level,
+            "table": self._search_table(level),
+            "dimensions": self.vector_settings.embedding_dimensions,
+        }
+        reader = self._snapshot_reader
+        if reader is None or str(reader.directory) != directory or reader.expected != expected:
+            self._snapshot_reader = SnapshotReader(directory, self.vector_settings.snapshot_check_interval, expected)
+        return self._snapshot_reader.current()
+
+    def _set_ivf_index(self, level: str, index: IVFIndex, snapshot_version: Optional[str]) -> None:
+        self._ivf_snapshot_versions[level] = snapshot_version
+        self._ivf_indexes[level] = index
+
+    def _fresh_ivf_index(self, level: str) -> Optional[IVFIndex]:
+        """
+        Retourne l'index IVF d'un niveau, ou None s'il manque ou est périmé : construit depuis un
+        instantané qui n'est plus le courant, ou depuis Postgres il y a plus de `ivf_max_age` secondes.
+        """
+        index = self._ivf_indexes.get(level)
+        if index is None:
+            return None
+        snapshot_version = self._ivf_snapshot_versions.get(level)
+        if snapshot_version is not None:
+            snapshot = self._current_snapshot(level)
+            return index if snapshot is not None and snapshot.version == snapshot_version else None
+        if index.age() > self.vector_settings.ivf_max_age:
+            return None
+        return index
+
+    @staticmethod
+    def _snapshot_rows(snapshot: EmbeddingSnapshot) -> Tuple[List[Any], List[dict], np.ndarray]:
+        """Les ids, métadonnées et embeddings d'un instantané, pour construire un index IVF."""
+        ids, metadata = snapshot.records()
+        return ids, metadata, snapshot.vectors
+
+    def _rescore_embeddings(self, level: str, ids: List[Any]) -> Tuple[Dict[str, np.ndarray], List[Any]]:
+        """
+        Lit dans l'instantané courant (pages partagées entre workers) les embeddings normalisés des
+        candidats à reclasser.
+
+        Returns:
+            Les embeddings trouvés par id et les ids à relire en base (absents de l'instantané).
+        """
+        snapshot = self._current_snapshot(level)
+        if snapshot is None:
+            return {}, ids
+        return snapshot.normalized_embeddings(ids)
+
+    def _ivf_candidates(
+        self,
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        metadata_filter: Union[dict, List[dict], None],
+        predicates: Any,
+        time_range: Optional[Tuple[datetime, datetime]],
+        level: str,
+        exclude_series_ids: Optional[Sequence[str]],
+        one_per_series: bool,
+        columns: Optional[Sequence[str]],
+    ) -> Optional[Tuple[List[List[Tuple[Any, dict, float]]], bool]]:
+        """
+        Classe les requêtes avec l'index IVF en mémoire (moteur "ivf").
+
+        Un index quantifié rend `ivf_rescore_factor` fois plus de candidats que demandé, classés par
+        similarité approchée : ils doivent être reclassés avec leurs embeddings (voir `_ivf_results`).
+
+        Returns:
+            Les candidats (id, métadonnées, similarité) par requête et s'ils doivent être reclassés,
+            ou None si la recherche doit passer par Postgres : index absent ou périmé, prédicats,
+            plage temporelle, filtre sur un champ non promu, ou colonnes `contents`/`embedding`
+            demandées (l'index ne conserve que les métadonnées).
+        """
+        index = self._fresh_ivf_index(level)
+        if index is None:
+            logging.info(f"IVF index for {self._search_table(level)} is missing or stale, searching in Postgres")
+            return None
+        if predicates is not None or time_range is not None or result_columns(columns):
+            return None
+        rescore = index.quantized
+        try:
+            ranked = index.search(
+                query_vectors,
+                limit * self.vector_settings.ivf_rescore_factor if rescore else limit,
+                self.vector_settings.ivf_nprobe,
+                metadata_filter,
+                exclude_series_ids,
+                self._dedupes_series(one_per_series, level),
+            )
+        except UnsupportedFilterError:
+            return None
+        return ranked, rescore
+
+    @staticmethod
+    def _ivf_results(
+        candidates: List[List[Tuple[Any, dict, float]]],
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[List[SearchResult]]:
+        """
+        Convertit les candidats de l'index IVF en résultats.
+
+        Avec `embeddings` (id -> embedding normalisé, voir `_normalized_embeddings_by_id`), les
+        similarités sont recalculées en pleine précision et les `limit` meilleurs candidats gardés ;
+        un candidat sans embedding (supprimé entre-temps) est écarté.
+        """
+        if embeddings is None:
+            return [
+                [SearchResult(row_id, metadata, None, None, similarity) for row_id, metadata, similarity in results]
+                for results in candidates
+            ]
+        queries = normalize_rows(to_float32_matrix(query_vectors))
+        grouped = []
+        for query, results in zip(queries, candidates):
+            rescored = [
+                SearchResult(row_id, metadata, None, None, float(embeddings[str(row_id)] @ query))
+                for row_id, metadata, _ in results
+                if str(row_id) in embeddings
+            ]
+            rescored.sort(key=lambda result: result.similarity, reverse=True)
+            grouped.append(rescored[:limit])
+        return grouped
+
+    def _rows_by_id_sql(self, level: str, projection: str) -> str:
+        """Construit la requête relisant des lignes d'un niveau par id (lignes avec embedding seulement)."""
+        return f"""
+            SELECT {projection} FROM {self._search_table(level)}
+            WHERE id = ANY(%s) AND embedding IS NOT NULL
+        """
+
+    def _normalized_embeddings_by_id(self, rows: List[Tuple[Any, ...]]) -> Dict[str, np.ndarray]:
+        """Associe chaque id à son embedding normalisé (lignes (id, embedding binaire brut))."""
+        if not rows:
+            return {}
+        matrix = normalize_rows(decode_vectors([row[1] for row in rows], self.vector_settings.vector_type))
+        return {str(row[0]): vector for row, vector in zip(rows, matrix)}
+
+    def _decode_candidates(
+        self, rows: List[Tuple[Any, ...]]
+    ) -> Tuple[List[Tuple[Any, ...]], np.ndarray]:
+        """
+        Décode les embeddings binaires des candidats (colonne 3) en une seule matrice float32.
+
+        Les candidats sans embedding sont écartés ; dans les lignes retournées, l'embedding est la
+        ligne correspondante de la matrice (une vue, sans copie).
+        """
+        rows = [row for row in rows if row[3] is not None]
+        matrix = decode_vectors([row[3] for row in rows], self.vector_settings.vector_type)
+        return [row[:3] + (vector,) + row[4:] for row, vector in zip(rows, matrix)], matrix
+
+    def _candidates_sql(
+        self, where_clause: str, level: str = "volume", columns: Optional[Sequence[str]] = None
+    ) -> str:
+        """Construit la requête récupérant les candidats filtrés (avec leur embedding), sans opération vectorielle."""
+        projection = self._projection_sql(columns, always=("embedding",))
+        return f"SELECT {projection} FROM {self._search_table(level)}{where_clause}"
+
+    def _volume_embeddings_sql(self) -> str:
+        """Construit la requête récupérant les embeddings stockés d'une liste de `volume_id`."""
+        return f"""
+            SELECT volume_id, embedding
+            FROM {self.vector_settings.table_name}
+            WHERE volume_id = ANY(%s) AND embedding IS NOT NULL
+        """
+
+    def _volume_embeddings_by_id(self, rows: List[Tuple[Any, ...]]) -> Dict[str, np.ndarray]:
+        """Associe chaque `volume_id` à son embedding float32 (embeddings lus au format binaire brut)."""
+        if not rows:
+            return {}
+        matrix = decode_vectors([row[1] for row in rows], self.vector_settings.vector_type)
+        return {row[0]: vector for row, vector in zip(rows, matrix)}
+
+    @staticmethod
+    def _upsert_columns(records: Any) -> Tuple[list, list, list, np.ndarray]:
+        """
+        Extrait les colonnes id, metadata, contents et embedding des enregistrements à écrire.
+
+        Accepte un DataFrame pandas, une table Arrow (pyarrow.Table ou RecordBatch) ou un
+        dictionnaire de colonnes (listes ou tableaux NumPy, l'embedding pouvant être une matrice (n, d)).
+
+        Returns:
+            Les ids, métadonnées et contenus sous forme de listes et les embeddings en matrice float32.
+        """
+        if hasattr(records, "column_names"):
+            # Table Arrow : l'embedding (liste de taille fixe) est aplati sans passer par Python
+            columns = {name: records.column(name) for name in UPSERT_COLUMNS}
+            embedding = columns["embedding"]
+            if hasattr(embedding, "combine_chunks"):
+                embedding = embedding.combine_chunks()
+            flat = embedding.flatten().to_numpy(zero_copy_only=False)
+            columns["embedding"] = flat.reshape(len(embedding), -1) if len(embedding) else flat
+            for name in ("id", "metadata", "contents"):
+                columns[name] = columns[name].to_pylist()
+        else:
+            columns = {name: records[name] for name in UPSERT_COLUMNS}
+
+        ids = [value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)) for value in columns["id"]]
+        metadata = [json.loads(value) if isinstance(value, str) else value for value in columns["metadata"]]
+        contents = list(columns["contents"])
+        embedding = columns["embedding"]
+        if _is_pandas(embedding, "Series"):
+            embedding = embedding.tolist()
+        embeddings = to_float32_matrix(embedding) if len(ids) else np.empty((0, 0), dtype=np.float32)
+        if not len(ids) == len(metadata) == len(contents) == len(embeddings):
+            raise ValueError("id, metadata, contents and embedding columns must have the same length")
+        return ids, metadata, contents, embeddings
+
+    def _merge_staging_sql(self, staging_table: str) -> str:
+        """Fusionne la table de transit dans la table des embeddings ; le dernier doublon d'un id l'emporte."""
+        return f"""
+            INSERT INTO {self.vector_settings.table_name} (id, metadata, contents, embedding, content_hash)
+            SELECT DISTINCT ON (id) id, metadata, contents, embedding, content_hash
+            FROM {staging_table}
+            ORDER BY id, ord DESC
+            ON CONFLICT (id) DO UPDATE SET
+                metadata = EXCLUDED.metadata,
+                contents = EXCLUDED.contents,
+                embedding = EXCLUDED.embedding,
+                content_hash = EXCLUDED.content_hash
+        """
+
+    def _refresh_series_sql(self, all_series: bool = False) -> Tuple[str, str]:
+        """
+        Construit les requêtes recalculant les centroïdes des séries.
+
+        Le centroïde d'une série est la moyenne des embeddings de ses volumes ; ses métadonnées sont
+        celles d'un de ses volumes, sans les champs propres au volume, plus `volume_count`. Les
+        séries sans volume sont supprimées. Sans `all_series`, les deux requêtes attendent en
+        paramètre la liste des `serie_id` à recalculer.
+
+        Returns:
+            Un tuple (suppression des séries vides, insertion ou mise à jour des centroïdes).
+        """
+        table = self.vector_settings.table_name
+        series_table = self.vector_settings.series_table_name
+        scope = "" if all_series else "id = ANY(%s) AND "
+        volume_scope = "" if all_series else "serie_id = ANY(%s) AND "
+        delete_sql = f"""
+            DELETE FROM {series_table} s
+            WHERE {scope}NOT EXISTS (
+                SELECT 1 FROM {table} e
+                WHERE e.serie_id = s.id AND e.embedding IS NOT NULL
+            )
+        """
+        upsert_sql = f"""
+            INSERT INTO {series_table} (id, metadata, contents, embedding, volume_count, created_at, updated_at)
+            SELECT
+                serie_id,
+                ((array_agg(metadata ORDER BY id))[1] - 'volume_id' - 'volume_number' - 'created_at')
+                    || jsonb_build_object('volume_count', count(*)),
+                (array_agg(serie_title ORDER BY id))[1],
+                avg(embedding),
+                count(*),
+                max(created_at),
+                CURRENT_TIMESTAMP
+            FROM {table}
+            WHERE {volume_scope}serie_id IS NOT NULL AND embedding IS NOT NULL
+            GROUP BY serie_id
+            ON CONFLICT (id) DO UPDATE SET
+                metadata = EXCLUDED.metadata,
+                contents = EXCLUDED.contents,
+                embedding = EXCLUDED.embedding,
+                volume_count = EXCLUDED.volume_count,
+                created_at = EXCLUDED.created_at,
+                updated_at = EXCLUDED.updated_at
+        """
+        return delete_sql, upsert_sql
+
+    def _create_dataframe_from_results(
+        self,
+        results: List[Tuple[Any, ...]],
+    ) -> "pd.DataFrame":
+        """
+        Crée un DataFrame pandas à partir des résultats de recherche.
+
+        pandas n'est importé qu'ici : le chemin de recherche par défaut n'en dépend pas.
+
+        Args:
+            results: Une liste de tuples contenant les résultats de recherche.
+
+        Returns:
+            Un DataFrame pandas contenant les résultats de recherche formatés.
+        """
+        import pandas as pd
+
+        if not results:
+            return pd.DataFrame()
+            
+        # Convertir les résultats en DataFrame
+        df = pd.DataFrame(
+            results, columns=["id", "metadata", "content", "embedding", "similarity"]
+        )
+
+        # Étendre la colonne metadata
+        metadata_df = pd.json_normalize(df['metadata'])
+        df = pd.concat([df.drop(['metadata'], axis=1), metadata_df], axis=1)
+
+        # Convertir l'id en chaîne pour une meilleure lisibilité
+        df["id"] = df["id"].astype(str)
+
+        return df
+
+
+class VectorStore(BaseVectorStore):
+    """Une classe pour gérer les opérations vectorielles et les interactions avec la base de données."""
+
+    def __init__(self):
+        """Initialise le VectorStore avec les paramètres, le client OpenAI/Azure OpenAI et le client Timescale Vector."""
+        super().__init__()
+
+        self.openai_client = self.llm_clients.client
+
+        # Créer l'extension vector avant d'enregistrer le type sur les connexions du pool
+        with psycopg.connect(self.settings.database.service_url, autocommit=True) as conn:
+            conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+        # Chaque opération emprunte une connexion ; les connexions rompues sont détectées et remplacées
+        self.pool = ConnectionPool(
+            self.settings.database.service_url,
+            configure=configure_connection,
+            check=ConnectionPool.check_connection,
+            open=True,
+            **self._pool_options(),
+        )
+
+        self.embedding_cache = (
+            EmbeddingCache(self.settings.embedding_cache, pool=self.pool)
+            if self.settings.embedding_cache.enabled
+            else None
+        )
+
+    def close(self) -> None:
+        """Ferme le pool de connexions."""
+        self.pool.close()
+
+    def pool_stats(self) -> Optional[dict]:
+        """Retourne les métriques du pool de connexions (taille, attentes, connexions perdues)."""
+        return self._pool_stats(self.pool)
 
     def get_embedding(self, text: str) -> List[float]:
         """
@@ -53,79 +835,516 @@ class VectorStore:
         Returns:
             Une liste de flottants représentant l'embedding.
         """
-        text = text.replace("\n", " ")
-        start_time = time.time()
-        embedding = (
-            self.openai_client.embeddings.create(
-                input=[text],
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        """
+        Génère les embeddings de plusieurs textes avec le moins d'appels API possible.
+
+        Les textes sont normalisés et dédupliqués, les embeddings en cache sont réutilisés et les
+        textes restants sont envoyés par lots respectant `embedding_batch_size` et
+        `embedding_batch_max_tokens`.
+
+        Args:
+            texts: Les textes d'entrée.
+            use_cache: Si le cache d'embeddings doit être consulté et alimenté
+                (à désactiver pour l'ingestion du catalogue).
+
+        Returns:
+            Les embeddings, dans l'ordre des textes fournis.
+        """
+        normalized = [EmbeddingCache.normalize_text(text) for text in texts]
+        unique_texts = list(dict.fromkeys(normalized))
+        request_options = self._embedding_request_options()
+        dimensions = request_options.get("dimensions")
+
+        cache = self.embedding_cache if use_cache else None
+        embeddings = {}
+        cache_keys = {}
+        if cache is not None:
+            cache_keys = self._embedding_cache_keys(unique_texts, dimensions)
+            cached = cache.get_many(list(cache_keys.values()))
+            embeddings = {text: cached[key] for text, key in cache_keys.items() if key in cached}
+
+        missing = [text for text in unique_texts if text not in embeddings]
+        for batch in self._batch_texts(missing):
+            start_time = time.time()
+            response = self.openai_client.embeddings.create(
+                input=batch,
                 model=self.embedding_model,
+                **request_options,
             )
-            .data[0]
-            .embedding
-        )
-        elapsed_time = time.time() - start_time
-        logging.info(f"Embedding generated in {elapsed_time:.3f} seconds")
-        return embedding
+            for item in response.data:
+                embeddings[batch[item.index]] = item.embedding
+            if response.usage is not None:
+                self.embedding_tokens += response.usage.total_tokens
+            elapsed_time = time.time() - start_time
+            logging.info(f"{len(batch)} embeddings generated in {elapsed_time:.3f} seconds")
+
+            if cache is not None:
+                cache.put_many(
+                    {cache_keys[text]: embeddings[text] for text in batch},
+                    self.embedding_model,
+                    dimensions,
+                )
+
+        return [embeddings[text] for text in normalized]
 
     def create_tables(self) -> None:
         """Crée les tables nécessaires dans la base de données"""
-        with self.conn.cursor() as cur:
-            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
-            cur.execute(f"""
+        with self.pool.connection() as conn:
+            conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            conn.execute(f"""
                 CREATE TABLE IF NOT EXISTS {self.vector_settings.table_name} (
                     id UUID PRIMARY KEY,
                     metadata JSONB,
                     contents TEXT,
-                    embedding vector({self.vector_settings.embedding_dimensions}),
+                    embedding {self.vector_column_type},
+                    content_hash TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            self.conn.commit()
+            # Tables créées avant l'ingestion incrémentale
+            conn.execute(f"ALTER TABLE {self.vector_settings.table_name} ADD COLUMN IF NOT EXISTS content_hash TEXT")
+            # Champs de métadonnées filtrés fréquemment, en colonnes générées indexées
+            for statement in self._metadata_columns_ddl(self.vector_settings.table_name):
+                conn.execute(statement)
+            series_exists = conn.execute(
+                "SELECT to_regclass(%s) IS NOT NULL", (self.vector_settings.series_table_name,)
+            ).fetchone()[0]
+            self._create_series_table(conn)
+        # Les centroïdes d'un catalogue existant sont calculés à la création de la table des séries
+        if not series_exists:
+            self.refresh_series()
+
+    def _create_series_table(self, conn) -> None:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.vector_settings.series_table_name} (
+                id TEXT PRIMARY KEY,
+                metadata JSONB,
+                contents TEXT,
+                embedding {self.vector_column_type},
+                volume_count INTEGER,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for statement in self._metadata_columns_ddl(self.vector_settings.series_table_name, level="series"):
+            conn.execute(statement)
+
+    def refresh_series(self, serie_ids: Optional[Sequence[str]] = None) -> None:
+        """
+        Recalcule les centroïdes des séries à partir des embeddings des volumes.
+
+        `upsert` et `delete` tiennent la table à jour ; cette méthode sert à la reconstruire.
+
+        Args:
+            serie_ids: Les séries à recalculer ; toutes par défaut.
+        """
+        start_time = time.time()
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            self._refresh_series(cur, serie_ids)
+        self._sync_ivf_index("series", serie_ids)
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Refreshed {self.vector_settings.series_table_name} in {elapsed_time:.3f} seconds"
+        )
+
+    def _refresh_series(self, cur, serie_ids: Optional[Sequence[str]]) -> None:
+        """Recalcule les centroïdes des séries données (toutes si None) dans la transaction courante."""
+        if serie_ids is None:
+            for sql in self._refresh_series_sql(all_series=True):
+                cur.execute(sql)
+            return
+        serie_ids = sorted({serie_id for serie_id in serie_ids if serie_id is not None})
+        if serie_ids:
+            for sql in self._refresh_series_sql():
+                cur.execute(sql, (serie_ids,))
 
     def create_index(self) -> None:
-        """Crée un index HNSW pour accélérer la recherche de similarité"""
-        with self.conn.cursor() as cur:
-            cur.execute(f"""
-                CREATE INDEX IF NOT EXISTS {self.vector_settings.table_name}_embedding_idx 
-                ON {self.vector_settings.table_name} 
-                USING hnsw (embedding vector_cosine_ops)
-            """)
-            self.conn.commit()
+        """
+        Crée un index HNSW pour accélérer la recherche de similarité.
+
+        Raises:
+            ValueError: Si la dimension dépasse la limite HNSW du type de colonne configuré.
+        """
+        vector_type = self.vector_settings.vector_type
+        dimensions = self.vector_settings.embedding_dimensions
+        if dimensions > HNSW_MAX_DIMENSIONS[vector_type]:
+            raise ValueError(
+                f"HNSW index is limited to {HNSW_MAX_DIMENSIONS[vector_type]} dimensions for {vector_type} "
+                f"columns (got {dimensions}); reduce embedding_dimensions or use halfvec storage"
+            )
+        with self.pool.connection() as conn:
+            for table in (self.vector_settings.table_name, self.vector_settings.series_table_name):
+                conn.execute(f"""
+                    CREATE INDEX IF NOT EXISTS {table}_embedding_idx
+                    ON {table}
+                    USING hnsw (embedding {vector_type}_cosine_ops)
+                """)
+        self._hnsw_indexes.clear()
+
+    def _has_hnsw_index(self, conn: psycopg.Connection, level: str) -> bool:
+        """Indique si la table d'un niveau porte un index HNSW (vérifié une fois par table)."""
+        table = self._search_table(level)
+        if table not in self._hnsw_indexes:
+            self._hnsw_indexes[table] = conn.execute(self._hnsw_index_sql(), (table,)).fetchone()[0]
+        return self._hnsw_indexes[table]
+
+    def get_column_type(self) -> Optional[str]:
+        """Retourne le type actuel de la colonne embedding en base, par exemple `vector(3072)`."""
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT format_type(atttypid, atttypmod)
+                FROM pg_attribute
+                WHERE attrelid = to_regclass(%s) AND attname = 'embedding' AND NOT attisdropped
+            """, (self.vector_settings.table_name,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_storage(self, build_index: bool = True) -> None:
+        """
+        Réécrit la colonne embedding existante vers le stockage configuré puis construit l'index HNSW.
+
+        Les embeddings text-embedding-3 raccourcis équivalent aux premières composantes renormalisées
+        de l'embedding complet : une réduction de dimension est donc faite en SQL, sans nouvel appel API.
+
+        Args:
+            build_index: Si l'index HNSW doit être (re)construit après la réécriture.
+
+        Raises:
+            ValueError: Si la table n'existe pas, si la colonne n'est pas un type vecteur pgvector ou
+                si la dimension cible dépasse la dimension stockée.
+        """
+        current_type = self.get_column_type()
+        if current_type is None:
+            raise ValueError(f"Table {self.vector_settings.table_name} has no embedding column")
+
+        _, current_dimensions = self._parse_column_type(current_type)
+        if current_dimensions is None:
+            # Colonne sans dimension déclarée : la dimension est celle des vecteurs stockés
+            current_dimensions = self._stored_dimensions()
+        target_type = self.vector_column_type
+        using = self._migration_using(current_dimensions, self.vector_settings.embedding_dimensions, target_type)
+
+        start_time = time.time()
+        if current_type != target_type:
+            # L'index et la colonne sont réécrits dans la même transaction
+            with self.pool.connection() as conn, conn.transaction():
+                conn.execute(f"DROP INDEX IF EXISTS {self.vector_settings.table_name}_embedding_idx")
+                conn.execute(f"""
+                    ALTER TABLE {self.vector_settings.table_name}
+                    ALTER COLUMN embedding TYPE {target_type} USING {using}
+                """)
+                # Les centroïdes sont recalculés à partir des embeddings migrés
+                conn.execute(f"DROP TABLE IF EXISTS {self.vector_settings.series_table_name}")
+                self._create_series_table(conn)
+                with conn.cursor() as cur:
+                    self._refresh_series(cur, None)
+            self._ivf_indexes.clear()
+            self._ivf_snapshot_versions.clear()
+            logging.info(f"Migrated {self.vector_settings.table_name}.embedding from {current_type} to {target_type}")
+
+        if build_index:
+            self.create_index()
+        elapsed_time = time.time() - start_time
+        logging.info(f"Storage migration completed in {elapsed_time:.3f} seconds")
+
+    @staticmethod
+    def _parse_column_type(column_type: str) -> Tuple[str, Optional[int]]:
+        """
+        Sépare un type pgvector (`vector(3072)`, `halfvec(1536)` ou `vector`) en type de base et
+        dimension, None si la colonne n'en déclare pas.
+
+        Raises:
+            ValueError: Si le type n'est pas un type vecteur pgvector.
+        """
+        match = re.fullmatch(r"(vector|halfvec)(?:\((\d+)\))?", column_type.strip())
+        if match is None:
+            raise ValueError(f"Unsupported embedding column type: {column_type}")
+        base_type, dimensions = match.groups()
+        return base_type, int(dimensions) if dimensions else None
+
+    def _stored_dimensions(self) -> Optional[int]:
+        """Dimension des embeddings stockés dans une colonne sans dimension déclarée (None si la table est vide)."""
+        with self.pool.connection() as conn:
+            row = conn.execute(f"""
+                SELECT vector_dims(embedding) FROM {self.vector_settings.table_name}
+                WHERE embedding IS NOT NULL
+                LIMIT 1
+            """).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _migration_using(current_dimensions: Optional[int], target_dimensions: int, target_type: str) -> str:
+        """
+        Expression `USING` convertissant la colonne embedding vers `target_type`, en ne gardant que
+        les premières composantes renormalisées si la dimension diminue.
+
+        Raises:
+            ValueError: Si la dimension cible dépasse la dimension stockée.
+        """
+        if current_dimensions is None or target_dimensions == current_dimensions:
+            return f"embedding::{target_type}"
+        if target_dimensions > current_dimensions:
+            raise ValueError(
+                f"Cannot migrate {current_dimensions}-dimension embeddings to {target_type}: "
+                f"stored vectors must be re-embedded"
+            )
+        return f"l2_normalize(subvector(embedding, 1, {target_dimensions}))::{target_type}"
 
     def drop_index(self) -> None:
         """Supprime l'index de la base de données"""
-        with self.conn.cursor() as cur:
-            cur.execute(f"DROP INDEX IF EXISTS {self.vector_settings.table_name}_embedding_idx")
-            self.conn.commit()
+        with self.pool.connection() as conn:
+            for table in (self.vector_settings.table_name, self.vector_settings.series_table_name):
+                conn.execute(f"DROP INDEX IF EXISTS {table}_embedding_idx")
 
-    def upsert(self, df: pd.DataFrame) -> None:
+    def upsert(self, records: Any) -> None:
         """
-        Insère ou met à jour les enregistrements dans la base de données à partir d'un DataFrame pandas.
+        Insère ou met à jour des enregistrements en un seul aller-retour de données.
+
+        Les lignes sont transmises par `COPY` en format binaire (embeddings compris) dans une table
+        temporaire, puis fusionnées avec un unique `INSERT ... SELECT ... ON CONFLICT`. L'empreinte
+        de `contents` est enregistrée avec chaque ligne (voir `get_content_hashes`) et les centroïdes
+        des séries touchées sont recalculés dans la même transaction.
 
         Args:
-            df: Un DataFrame pandas contenant les données à insérer ou mettre à jour.
+            records: Un DataFrame pandas, une table Arrow ou un dictionnaire de colonnes NumPy/listes.
                 Colonnes attendues: id, metadata, contents, embedding
         """
-        import json
-        with self.conn.cursor() as cur:
-            for _, row in df.iterrows():
-                cur.execute(f"""
-                    INSERT INTO {self.vector_settings.table_name} 
-                    (id, metadata, contents, embedding) 
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        metadata = EXCLUDED.metadata,
-                        contents = EXCLUDED.contents,
-                        embedding = EXCLUDED.embedding
-                """, (
-                    row['id'],
-                    json.dumps(row['metadata']),
-                    row['contents'],
-                    row['embedding']
-                ))
-            self.conn.commit()
+        ids, metadata, contents, embeddings = self._upsert_columns(records)
+        if not ids:
+            return
+        start_time = time.time()
+        staging_table = f"{self.vector_settings.table_name}_staging"
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE {staging_table} (
+                    ord BIGINT, id UUID, metadata JSONB, contents TEXT, embedding vector, content_hash TEXT
+                ) ON COMMIT DROP
+            """)
+            with cur.copy(f"COPY {staging_table} FROM STDIN WITH (FORMAT BINARY)") as copy:
+                copy.set_types(["int8", "uuid", "jsonb", "text", "vector", "text"])
+                for i, row in enumerate(zip(ids, metadata, contents, embeddings)):
+                    copy.write_row((i, *row, content_hash(row[2])))
+            # Séries touchées : celles des lignes écrites et celles que les lignes mises à jour quittent
+            cur.execute(f"""
+                SELECT metadata ->> 'serie_id' FROM {staging_table}
+                UNION
+                SELECT e.serie_id
+                FROM {self.vector_settings.table_name} e JOIN {staging_table} s ON s.id = e.id
+            """)
+            serie_ids = [row[0] for row in cur.fetchall()]
+            cur.execute(self._merge_staging_sql(staging_table))
+            self._refresh_series(cur, serie_ids)
+            self._notify_catalog_change(cur)
+        self._sync_ivf_index("volume", ids)
+        self._sync_ivf_index("series", serie_ids)
+        catalog_events.publish(self.vector_settings.table_name)
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Inserted {len(ids)} records into {self.vector_settings.table_name} in {elapsed_time:.3f} seconds"
+        )
+
+    def get_content_hashes(self, ids: Sequence[Union[str, uuid.UUID]]) -> dict:
+        """
+        Retourne l'empreinte du contenu stocké pour chacun des ids existants.
+
+        Returns:
+            Un dictionnaire uuid.UUID -> empreinte, limité aux ids présents en base.
+        """
+        if not ids:
+            return {}
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, content_hash FROM {self.vector_settings.table_name} WHERE id = ANY(%s)",
+                ([value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)) for value in ids],),
+            ).fetchall()
+        return dict(rows)
+
+    def delete_except(self, ids: Sequence[Union[str, uuid.UUID]]) -> int:
+        """
+        Supprime tous les enregistrements dont l'id n'est pas dans `ids`.
+
+        Returns:
+            Le nombre d'enregistrements supprimés.
+        """
+        keep = [value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)) for value in ids]
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM {self.vector_settings.table_name} WHERE id <> ALL(%s) RETURNING id, serie_id",
+                (keep,),
+            )
+            deleted_rows = cur.fetchall()
+            deleted = len(deleted_rows)
+            if deleted:
+                self._refresh_series(cur, [row[1] for row in deleted_rows])
+                self._notify_catalog_change(cur)
+        if deleted:
+            self._sync_ivf_index("volume", [row[0] for row in deleted_rows])
+            self._sync_ivf_index("series", [row[1] for row in deleted_rows])
+            catalog_events.publish(self.vector_settings.table_name)
+        logging.info(f"Deleted {deleted} records missing from the source from {self.vector_settings.table_name}")
+        return deleted
+
+    def get_volume_embeddings(self, volume_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Retourne les embeddings stockés des volumes donnés, en une requête indexée.
+
+        Returns:
+            Un dictionnaire `volume_id` -> embedding float32, limité aux volumes présents en base.
+        """
+        if not volume_ids:
+            return {}
+        with self.pool.connection() as conn, conn.cursor(binary=True) as cur:
+            register_raw_vector_loader(cur, self.vector_settings.vector_type)
+            rows = cur.execute(
+                self._volume_embeddings_sql(),
+                ([str(volume_id) for volume_id in volume_ids],),
+                prepare=self.settings.database.prepare_statements,
+            ).fetchall()
+        return self._volume_embeddings_by_id(rows)
+
+    def read_embeddings(
+        self,
+        level: str = "volume",
+        batch_size: int = 10000,
+        allocate: Optional[Callable[[Tuple[int, int]], np.ndarray]] = None,
+    ) -> Tuple[List[Any], List[dict], np.ndarray]:
+        """
+        Lit tous les embeddings d'une table dans une matrice float32 préallouée (export, classement en mémoire).
+
+        Les lignes sont lues par lots avec un curseur serveur au format binaire, dans un même instantané
+        (REPEATABLE READ) : la matrice est allouée une fois au nombre de lignes compté et chaque lot y
+        est décodé directement.
+
+        Args:
+            level: La table lue, "volume" ou "series" (voir `search`).
+            batch_size: Le nombre de lignes transférées par lot.
+            allocate: Alloue la matrice float32 de forme (n, d) à remplir, par exemple un fichier
+                projeté en mémoire ; `np.empty` par défaut.
+
+        Returns:
+            Les ids, les métadonnées et la matrice (n, d) des embeddings, triés par id.
+        """
+        table = self._search_table(level)
+        vector_type = self.vector_settings.vector_type
+        allocate = allocate or (lambda shape: np.empty(shape, dtype=np.float32))
+        ids: List[Any] = []
+        metadata: List[dict] = []
+        matrix = None
+        with self.pool.connection() as conn, conn.transaction():
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            count = conn.execute(f"SELECT count(*) FROM {table} WHERE embedding IS NOT NULL").fetchone()[0]
+            with conn.cursor(name=f"{table}_read_embeddings", binary=True) as cur:
+                register_raw_vector_loader(cur, vector_type)
+                cur.execute(f"SELECT id, metadata, embedding FROM {table} WHERE embedding IS NOT NULL ORDER BY id")
+                while rows := cur.fetchmany(batch_size):
+                    if not ids:
+                        dimensions, _ = VECTOR_HEADER.unpack_from(rows[0][2])
+                        matrix = allocate((count, dimensions))
+                    start = len(ids)
+                    decode_vectors([row[2] for row in rows], vector_type, out=matrix[start:start + len(rows)])
+                    ids.extend(row[0] for row in rows)
+                    metadata.extend(row[1] for row in rows)
+        if matrix is None:
+            matrix = allocate((0, self.vector_settings.embedding_dimensions))
+        logging.info(f"Read {len(ids)} embeddings from {table}")
+        return ids, metadata, matrix
+
+    def _search_many_ivf(
+        self,
+        query_vectors: Sequence[List[float]],
+        limit: int,
+        metadata_filter: Union[dict, List[dict], None],
+        predicates: Any,
+        time_range: Optional[Tuple[datetime, datetime]],
+        level: str,
+        exclude_series_ids: Optional[Sequence[str]],
+        one_per_series: bool,
+        columns: Optional[Sequence[str]],
+    ) -> Optional[List[List[SearchResult]]]:
+        """
+        Recherche avec l'index IVF (voir `_ivf_candidates`) ; les candidats d'un index quantifié sont
+        reclassés avec leurs embeddings lus en base.
+
+        Returns:
+            Les résultats par requête, ou None si la recherche doit passer par Postgres.
+        """
+        found = self._ivf_candidates(
+            query_vectors, limit, metadata_filter, predicates, time_range,
+            level, exclude_series_ids, one_per_series, columns,
+        )
+        if found is None:
+            return None
+        candidates, rescore = found
+        embeddings = None
+        if rescore:
+            ids = list({str(row_id): row_id for results in candidates for row_id, _, _ in results}.values())
+            embeddings, missing = self._rescore_embeddings(level, ids)
+            if missing:
+                with self.pool.connection() as conn, conn.cursor(binary=True) as cur:
+                    register_raw_vector_loader(cur, self.vector_settings.vector_type)
+                    rows = cur.execute(self._rows_by_id_sql(level, "id, embedding"), (missing,)).fetchall()
+                embeddings.update(self._normalized_embeddings_by_id(rows))
+        return self._ivf_results(candidates, query_vectors, limit, embeddings)
+
+    def build_ivf_index(self, level: str = "volume") -> IVFIndex:
+        """
+        Construit l'index IVF en mémoire d'une table, utilisé par le moteur "ivf".
+
+        L'index est ensuite tenu à jour par `upsert` et `delete` ; les écritures faites par d'autres
+        processus ne sont pas vues, d'où sa péremption après `ivf_max_age` secondes. Avec
+        `snapshot_dir`, l'index des volumes est construit depuis l'instantané courant, sans lire la
+        base, et périmé dès qu'une nouvelle version est exportée.
+
+        Args:
+            level: La table indexée, "volume" ou "series" (voir `search`).
+        """
+        snapshot = self._current_snapshot(level)
+        ids, metadata, matrix = self._snapshot_rows(snapshot) if snapshot is not None else self.read_embeddings(level)
+        start_time = time.time()
+        normalized = snapshot is not None and snapshot.normalized
+        index = self._new_ivf_index(level).build(ids, metadata, matrix, normalized=normalized)
+        self._set_ivf_index(level, index, snapshot.version if snapshot is not None else None)
+        elapsed_time = time.time() - start_time
         logging.info(
-            f"Inserted {len(df)} records into {self.vector_settings.table_name}"
+            f"Built IVF index of {len(index)} rows in {len(index.centroids)} lists "
+            f"for {self._search_table(level)} in {elapsed_time:.3f} seconds"
+        )
+        return index
+
+    def _sync_ivf_index(self, level: str, ids: Optional[Sequence[Any]]) -> None:
+        """
+        Reporte dans l'index IVF d'un niveau (s'il existe) l'état en base des lignes données.
+
+        Les lignes relues sont ajoutées ou remplacées, les absentes supprimées ; avec `ids` à None,
+        l'index est abandonné (repli sur Postgres jusqu'à sa reconstruction).
+        """
+        index = self._ivf_indexes.get(level)
+        if index is None:
+            return
+        if ids is None:
+            del self._ivf_indexes[level]
+            self._ivf_snapshot_versions.pop(level, None)
+            return
+        ids = list(dict.fromkeys(value for value in ids if value is not None))
+        if not ids:
+            return
+        vector_type = self.vector_settings.vector_type
+        with self.pool.connection() as conn, conn.cursor(binary=True) as cur:
+            register_raw_vector_loader(cur, vector_type)
+            rows = cur.execute(self._rows_by_id_sql(level, "id, metadata, embedding"), (ids,)).fetchall()
+        found = {str(row[0]) for row in rows}
+        index.remove([value for value in ids if str(value) not in found])
+        if rows:
+            embeddings = decode_vectors([row[2] for row in rows], vector_type)
+            index.upsert([row[0] for row in rows], [row[1] for row in rows], embeddings)
+
+    def _notify_catalog_change(self, cur) -> None:
+        """Signale la modification du catalogue aux autres processus (NOTIFY émis au commit)."""
+        cur.execute(
+            "SELECT pg_notify(%s, %s)",
+            (catalog_events.CATALOG_CHANNEL, self.vector_settings.table_name),
         )
 
     def search(
@@ -136,19 +1355,34 @@ class VectorStore:
         time_range: Optional[Tuple[datetime, datetime]] = None,
         return_dataframe: bool = True,
         predicates=None,
-    ) -> Union[List[Tuple[Any, ...]], pd.DataFrame]:
+        engine: Optional[str] = None,
+        level: str = "volume",
+        exclude_series_ids: Optional[Sequence[str]] = None,
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Union[List[SearchResult], "pd.DataFrame"]:
         """
         Interroge la base de données vectorielle pour des embeddings similaires basés sur le texte d'entrée.
 
         Args:
             query_text: Le texte d'entrée à rechercher.
             limit: Le nombre maximum de résultats à retourner.
-            metadata_filter: Un dictionnaire pour le filtrage de métadonnées par égalité.
+            metadata_filter: Un dictionnaire (ou une liste de dictionnaires combinés par OU) pour le filtrage de métadonnées par égalité.
             time_range: Un tuple de (date_début, date_fin) pour filtrer les résultats par temps.
             return_dataframe: Si les résultats doivent être retournés comme DataFrame (défaut: True).
+            predicates: Des prédicats timescale-vector appliqués en plus des filtres.
+            engine: Le moteur de classement, "database" (pgvector), "python" ou "ivf" (index en
+                mémoire, voir `build_ivf_index`, avec repli sur Postgres). Par défaut, la valeur de
+                `search_engine` des paramètres.
+            level: "volume" pour classer les volumes, "series" pour classer directement les
+                centroïdes des séries (un résultat par série, métadonnées de la série).
+            exclude_series_ids: Les `serie_id` à écarter des résultats (séries possédées ou lues).
+            one_per_series: Ne garder que le volume le plus proche de chaque série.
+            columns: Les colonnes facultatives à lire ("contents", "embedding") ; par défaut toutes.
+                Une colonne non demandée vaut None dans les résultats.
 
         Returns:
-            Soit une liste de tuples soit un DataFrame pandas contenant les résultats de recherche.
+            Soit une liste de `SearchResult` soit un DataFrame pandas contenant les résultats de recherche.
 
         Exemples:
             Recherche simple:
@@ -157,125 +1391,229 @@ class VectorStore:
                 vector_store.search("Manga d'action", metadata_filter={"genre": "Manga"})
             Recherche avec plage temporelle:
                 vector_store.search("Mises à jour récentes", time_range=(datetime(2024, 1, 1), datetime(2024, 1, 31)))
+            Une recommandation par série, hors séries déjà possédées:
+                vector_store.search("Manga d'action", exclude_series_ids=["12"], one_per_series=True)
+            Sans pandas, ni le texte ni l'embedding des résultats:
+                vector_store.search("Manga d'action", return_dataframe=False, columns=())
         """
         query_embedding = self.get_embedding(query_text)
+        engine = engine or self.vector_settings.search_engine
         start_time = time.time()
-        
-        # Build SQL for fetching candidates without vector operations
-        sql_query = f"SELECT id, metadata, contents, embedding FROM {self.vector_settings.table_name}"
-        conditions = []
-        params = []
-        
-        if metadata_filter:
-            if isinstance(metadata_filter, dict):
-                for key, value in metadata_filter.items():
-                    conditions.append(f"metadata ->> %s = %s")
-                    params.extend([key, str(value)])
-        
-        # Handle timescale-vector predicates
-        if predicates:
-            conditions.append(self._convert_predicates_to_sql(predicates, params))
-        
-        if time_range:
-            start_date, end_date = time_range
-            conditions.append("created_at BETWEEN %s AND %s")
-            params.extend([start_date, end_date])
-        
-        if conditions:
-            sql_query += " WHERE " + " AND ".join(conditions)
-        
-        # Add basic limit to avoid memory issues  
-        sql_query += " LIMIT 1000"
-        
-        with self.conn.cursor() as cur:
-            cur.execute(sql_query, params)
-            db_results = cur.fetchall()
-        
-        # Compute similarities in Python
-        similarities = []
-        for row in db_results:
-            db_embedding = row[3]  # embedding column
-            if db_embedding is not None and len(db_embedding) > 0:
-                # Calculate cosine similarity
-                dot_product = sum(a * b for a, b in zip(query_embedding, db_embedding))
-                norm_a = sum(a * a for a in query_embedding) ** 0.5
-                norm_b = sum(b * b for b in db_embedding) ** 0.5
-                
-                if norm_a > 0 and norm_b > 0:
-                    similarity = dot_product / (norm_a * norm_b)
-                    similarities.append((row + (similarity,)))
-        
-        # Sort by similarity (descending) and limit results
-        similarities.sort(key=lambda x: x[4], reverse=True)
-        results = similarities[:limit]
+
+        where_clause, params = self._build_where_clause(
+            metadata_filter, predicates, time_range, level, exclude_series_ids
+        )
+
+        if engine == "database":
+            results = self._search_database(
+                query_embedding, limit, where_clause, params, level, one_per_series, columns
+            )
+        elif engine == "python":
+            results = self._search_python(
+                query_embedding, limit, where_clause, params, level, one_per_series, columns
+            )
+        elif engine == "ivf":
+            grouped = self._search_many_ivf(
+                [query_embedding], limit, metadata_filter, predicates, time_range,
+                level, exclude_series_ids, one_per_series, columns,
+            )
+            results = grouped[0] if grouped is not None else self._search_database(
+                query_embedding, limit, where_clause, params, level, one_per_series, columns
+            )
+        else:
+            raise ValueError(f"Unknown search engine: {engine}")
 
         elapsed_time = time.time() - start_time
-        logging.info(f"Vector search completed in {elapsed_time:.3f} seconds")
+        logging.info(f"Vector search ({engine}) completed in {elapsed_time:.3f} seconds")
 
         if return_dataframe:
             return self._create_dataframe_from_results(results)
         else:
             return results
 
-    def _convert_predicates_to_sql(self, predicates, params: list) -> str:
-        """Convert timescale-vector predicates to SQL WHERE conditions."""
-        if hasattr(predicates, 'field') and hasattr(predicates, 'operator') and hasattr(predicates, 'value'):
-            # Simple predicate
-            field = predicates.field
-            operator = predicates.operator
-            value = predicates.value
-            
-            # Map operators
-            op_mapping = {
-                "==": "=",
-                "!=": "!=", 
-                ">": ">",
-                ">=": ">=",
-                "<": "<",
-                "<=": "<="
-            }
-            
-            sql_op = op_mapping.get(operator, "=")
-            params.extend([field, str(value)])
-            return f"metadata ->> %s {sql_op} %s"
-        
-        elif hasattr(predicates, '__or__') or hasattr(predicates, '__and__'):
-            # Compound predicate - this is simplified, full implementation would need more logic
-            # For now, return a basic condition for genre
-            params.extend(['genre', 'Manga'])
-            return "metadata ->> %s = %s"
-        
-        return ""
+    def _search_database(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        where_clause: str,
+        params: list,
+        level: str = "volume",
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[SearchResult]:
+        """
+        Classe les embeddings directement dans Postgres avec l'opérateur de distance cosinus de pgvector.
 
-    def _create_dataframe_from_results(
+        Seuls les `limit` meilleurs enregistrements sont retournés, avec leur similarité (1 - distance).
+        """
+        return self._search_many_database(
+            [query_embedding], limit, where_clause, params, level, one_per_series, columns
+        )[0]
+
+    def _search_many_database(
         self,
-        results: List[Tuple[Any, ...]],
-    ) -> pd.DataFrame:
+        query_embeddings: Sequence[List[float]],
+        limit: int,
+        where_clause: str,
+        params: list,
+        level: str = "volume",
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[List[SearchResult]]:
         """
-        Crée un DataFrame pandas à partir des résultats de recherche.
+        Classe les embeddings pour toutes les requêtes en un seul aller-retour Postgres.
+
+        Une recherche filtrée ou dédupliquée par série passant par l'index HNSW est relancée avec
+        davantage de candidats (et un `hnsw.ef_search` relevé d'autant) tant qu'une requête rend moins
+        de `limit` résultats (voir `_next_candidates`).
+        """
+        query_vectors = [np.asarray(embedding, dtype=np.float32) for embedding in query_embeddings]
+        sql = self._search_many_sql(len(query_vectors), where_clause, level, one_per_series, columns)
+        adaptive = self._adaptive_search(where_clause, one_per_series, level)
+        candidates = self._initial_candidates(limit, one_per_series, level)
+
+        while True:
+            with self.pool.connection() as conn:
+                if adaptive:
+                    adaptive = self._has_hnsw_index(conn, level)
+                with conn.transaction() if candidates > HNSW_DEFAULT_EF_SEARCH else nullcontext():
+                    if candidates > HNSW_DEFAULT_EF_SEARCH:
+                        conn.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(candidates),))
+                    db_results = conn.execute(
+                        sql,
+                        [*query_vectors, *params, *self._search_limits(limit, candidates, one_per_series, level)],
+                        prepare=self.settings.database.prepare_statements,
+                    ).fetchall()
+            grouped = self._group_search_rows(db_results, len(query_vectors))
+            ranked_counts = self._ranked_counts(db_results, len(query_vectors), where_clause, one_per_series, level)
+            candidates = self._next_candidates(grouped, limit, candidates, adaptive, ranked_counts)
+            if candidates is None:
+                return grouped
+            logging.info(f"Short vector search results, retrying with {candidates} candidates")
+
+    def _search_python(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        where_clause: str,
+        params: list,
+        level: str = "volume",
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[SearchResult]:
+        """Récupère les candidats filtrés et les classe en mémoire avec le moteur NumPy."""
+        return self._search_many_python(
+            [query_embedding], limit, where_clause, params, level, one_per_series, columns
+        )[0]
+
+    def _fetch_candidates(
+        self,
+        where_clause: str,
+        params: list,
+        level: str = "volume",
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Récupère tous les candidats correspondant aux filtres, sans opération vectorielle.
+
+        Les lignes sont transférées au format binaire, l'embedding restant en octets bruts (voir `_decode_candidates`).
+        """
+        with self.pool.connection() as conn, conn.cursor(binary=True) as cur:
+            register_raw_vector_loader(cur, self.vector_settings.vector_type)
+            return cur.execute(
+                self._candidates_sql(where_clause, level, columns),
+                params,
+                prepare=self.settings.database.prepare_statements,
+            ).fetchall()
+
+    def _search_many_python(
+        self,
+        query_embeddings: Sequence[List[float]],
+        limit: int,
+        where_clause: str,
+        params: list,
+        level: str = "volume",
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[List[SearchResult]]:
+        """Classe les candidats pour toutes les requêtes avec un seul produit matriciel."""
+        rows, embeddings = self._decode_candidates(self._fetch_candidates(where_clause, params, level, columns))
+        return self._rank_candidates(rows, query_embeddings, limit, one_per_series, level, columns, embeddings)
+
+    def search_many(
+        self,
+        query_vectors: Sequence[List[float]],
+        limit: int = 5,
+        metadata_filter: Union[dict, List[dict]] = None,
+        time_range: Optional[Tuple[datetime, datetime]] = None,
+        return_dataframe: bool = False,
+        predicates=None,
+        engine: Optional[str] = None,
+        level: str = "volume",
+        exclude_series_ids: Optional[Sequence[str]] = None,
+        one_per_series: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Union[List[SearchResult], "pd.DataFrame"]]:
+        """
+        Recherche les embeddings les plus similaires pour plusieurs vecteurs de requête à la fois.
+
+        Les filtres sont communs à toutes les requêtes. Avec le moteur "database", toutes les
+        requêtes sont exécutées dans une seule instruction SQL ; avec le moteur "python", les
+        candidats sont récupérés une seule fois et toutes les requêtes sont classées en un seul appel.
 
         Args:
-            results: Une liste de tuples contenant les résultats de recherche.
+            query_vectors: Les embeddings des requêtes (liste de vecteurs ou matrice (m, d)).
+            limit: Le nombre maximum de résultats par requête.
+            metadata_filter: Un dictionnaire (ou une liste de dictionnaires) pour le filtrage de métadonnées.
+            time_range: Un tuple de (date_début, date_fin) pour filtrer les résultats par temps.
+            return_dataframe: Si chaque groupe de résultats doit être retourné comme DataFrame.
+            predicates: Des prédicats timescale-vector appliqués en plus des filtres.
+            engine: Le moteur de classement, "database", "python" ou "ivf" (voir `search`).
+            level: Le niveau de recherche, "volume" ou "series" (voir `search`).
+            exclude_series_ids: Les `serie_id` à écarter des résultats.
+            one_per_series: Ne garder que le volume le plus proche de chaque série.
+            columns: Les colonnes facultatives à lire ("contents", "embedding") ; par défaut toutes.
 
         Returns:
-            Un DataFrame pandas contenant les résultats de recherche formatés.
+            Une liste de résultats par requête, dans l'ordre des vecteurs fournis.
         """
-        if not results:
-            return pd.DataFrame()
-            
-        # Convertir les résultats en DataFrame
-        df = pd.DataFrame(
-            results, columns=["id", "metadata", "content", "embedding", "similarity"]
+        engine = engine or self.vector_settings.search_engine
+        if len(query_vectors) == 0:
+            return []
+        start_time = time.time()
+
+        where_clause, params = self._build_where_clause(
+            metadata_filter, predicates, time_range, level, exclude_series_ids
         )
 
-        # Étendre la colonne metadata
-        metadata_df = pd.json_normalize(df['metadata'])
-        df = pd.concat([df.drop(['metadata'], axis=1), metadata_df], axis=1)
+        if engine == "database":
+            grouped = self._search_many_database(
+                query_vectors, limit, where_clause, params, level, one_per_series, columns
+            )
+        elif engine == "python":
+            grouped = self._search_many_python(
+                query_vectors, limit, where_clause, params, level, one_per_series, columns
+            )
+        elif engine == "ivf":
+            grouped = self._search_many_ivf(
+                query_vectors, limit, metadata_filter, predicates, time_range,
+                level, exclude_series_ids, one_per_series, columns,
+            )
+            if grouped is None:
+                grouped = self._search_many_database(
+                    query_vectors, limit, where_clause, params, level, one_per_series, columns
+                )
+        else:
+            raise ValueError(f"Unknown search engine: {engine}")
 
-        # Convertir l'id en chaîne pour une meilleure lisibilité
-        df["id"] = df["id"].astype(str)
+        elapsed_time = time.time() - start_time
+        logging.info(
+            f"Vector search ({engine}) for {len(query_vectors)} queries completed in {elapsed_time:.3f} seconds"
+        )
 
-        return df
+        if return_dataframe:
+            return [self._create_dataframe_from_results(results) for results in grouped]
+        return grouped
 
     def delete(
         self,
@@ -308,23 +1646,36 @@ class VectorStore:
                 "Provide exactly one of: ids, metadata_filter, or delete_all"
             )
 
-        with self.conn.cursor() as cur:
+        deleted_rows = []
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            # Les séries des volumes supprimés sont recalculées (voir `refresh_series`)
+            returning = " RETURNING id, serie_id"
             if delete_all:
                 cur.execute(f"DELETE FROM {self.vector_settings.table_name}")
+                cur.execute(f"DELETE FROM {self.vector_settings.series_table_name}")
                 logging.info(f"Deleted all records from {self.vector_settings.table_name}")
             elif ids:
                 placeholders = ','.join(['%s'] * len(ids))
-                cur.execute(f"DELETE FROM {self.vector_settings.table_name} WHERE id IN ({placeholders})", ids)
+                cur.execute(
+                    f"DELETE FROM {self.vector_settings.table_name} WHERE id IN ({placeholders}){returning}", ids
+                )
+                deleted_rows = cur.fetchall()
+                self._refresh_series(cur, [row[1] for row in deleted_rows])
                 logging.info(f"Deleted {len(ids)} records from {self.vector_settings.table_name}")
             elif metadata_filter:
-                conditions = []
-                params = []
-                for key, value in metadata_filter.items():
-                    conditions.append(f"metadata ->> %s = %s")
-                    params.extend([key, value])
-                
-                where_clause = " AND ".join(conditions)
-                cur.execute(f"DELETE FROM {self.vector_settings.table_name} WHERE {where_clause}", params)
+                where_clause, params = self._build_where_clause(metadata_filter)
+                cur.execute(
+                    f"DELETE FROM {self.vector_settings.table_name}{where_clause}{returning}", params
+                )
+                deleted_rows = cur.fetchall()
+                self._refresh_series(cur, [row[1] for row in deleted_rows])
                 logging.info(f"Deleted records matching metadata filter from {self.vector_settings.table_name}")
             
-            self.conn.commit()
+            self._notify_catalog_change(cur)
+        for level in ("volume", "series"):
+            if delete_all and level in self._ivf_indexes:
+                index = self._ivf_indexes[level]
+                index.remove(index.ids())
+            elif not delete_all:
+                self._sync_ivf_index(level, [row[0 if level == "volume" else 1] for row in deleted_rows])
+        catalog_events.publish(self.vector_settings.table_name)
@@ -1,10 +1,23 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .routes.predict_routes import router as predict_router
+from .config.llm_clients import get_llm_clients
+from .routes.predict_routes import router as predict_router, predict_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await predict_service.start()
+    yield
+    await predict_service.close()
+    await get_llm_clients().aclose()
+
 
 app = FastAPI(
     title="Book Sync API Agent",
     description="API pour la recommandation personnalisée de mangas et livres",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.include_router(router=predict_router)
\ No newline at end of file
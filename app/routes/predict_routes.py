@@ -1,4 +1,7 @@
-from fastapi import APIRouter, HTTPException, Request
+import json
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from app.services.predict_service import PredictService
 from app.models.predict_request import PredictRequest
 from app.models.predict_response import PredictResponse
@@ -35,25 +38,54 @@ async def predict_raw(request: Request):
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
 @router.post("/", response_model=PredictResponse)
-async def predict(request: PredictRequest):
+async def predict(request: PredictRequest, http_response: Response):
     """
     Endpoint pour effectuer des prédictions et recommandations personnalisées.
     
     Cette route utilise le profil utilisateur pour générer des recommandations
     intelligentes ou répondre à des questions spécifiques sur les mangas/livres.
+    L'en-tête `X-Cache` indique si la réponse provient du cache de prédictions (HIT, MISS, BYPASS).
     """
 
     print("dd")
     try:
-        response = await predict_service.predict(request)
+        response, cache_status = await predict_service.predict_cached(request)
+        http_response.headers["X-Cache"] = cache_status
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
 
+@router.post("/stream")
+async def predict_stream(request: PredictRequest):
+    """
+    Endpoint de prédiction en streaming (Server-Sent Events).
+    
+    Émet l'événement `serie_recomendees` dès la fin de la recherche vectorielle, puis la réponse
+    globale de l'agent IA fragment par fragment (`token`) et enfin `done` avec la réponse complète.
+    """
+    async def events():
+        async for event, data in predict_service.predict_stream(request):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/health")
 async def health_check():
     """
     Endpoint de vérification de santé pour le service de prédiction.
     """
-    return {"status": "healthy", "service": "predict"}
\ No newline at end of file
+    return {"status": "healthy", "service": "predict"}
+
+
+@router.get("/stats")
+async def stats():
+    """
+    Endpoint exposant les compteurs de succès/échecs des caches du service de prédiction.
+    """
+    return predict_service.stats()
@@ -0,0 +1,302 @@
+"""
+Ingestion du catalogue de volumes dans le magasin de vecteurs.
+
+Le CSV est lu par blocs, les embeddings sont générés par lots avec un nombre borné de requêtes
+simultanées et chaque lot est écrit en une fois. La progression est enregistrée après chaque lot
+dans un fichier de reprise : une exécution interrompue reprend là où elle s'était arrêtée.
+
+L'ingestion est incrémentale : l'id de chaque enregistrement est dérivé du `volume_id` et du modèle
+d'embedding, et l'empreinte du texte embeddé est stockée en base. Les lignes inchangées ne sont
+ni ré-embeddées ni réécrites, et les volumes absents du CSV sont supprimés en fin d'exécution.
+
+    python -m app.services.ingest --csv data/volume_content.csv --batch-size 256 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+from app.config.llm_clients import get_llm_clients
+from app.database.async_vector_store import AsyncVectorStore
+from app.database.vector_store import VectorStore, content_hash
+
+# Formats du texte embeddé : "full" inclut genre et catégorie, "short" seulement la série et le volume
+CONTENT_FORMATS = {
+    "full": "Serie: {serie_title}\nGenre: {genre}\nCategorie: {categorie}\nVolume {volume_number}: {content}",
+    "short": "Serie: {serie_title}\nVolume {volume_number}: {content}",
+}
+
+# Espace de noms des ids d'enregistrement : ne pas modifier, les ids stockés en dépendent
+RECORD_ID_NAMESPACE = uuid.UUID("6f1c2b9e-3d4a-5e8f-9a0b-1c2d3e4f5a6b")
+
+
+def record_id(volume_id, model_version: str) -> str:
+    """
+    Id déterministe de l'enregistrement d'un volume.
+
+    Args:
+        volume_id: L'identifiant du volume dans le CSV.
+        model_version: Le modèle et les dimensions d'embedding (voir `Ingestor.model_version`) ;
+            changer de modèle produit de nouveaux ids plutôt que de mélanger les espaces vectoriels.
+    """
+    return str(uuid.uuid5(RECORD_ID_NAMESPACE, f"{model_version}:{volume_id}"))
+
+
+def format_contents(rows: pd.DataFrame, content_format: str) -> List[str]:
+    """Construit le texte embeddé de chaque ligne du CSV."""
+    template = CONTENT_FORMATS[content_format]
+    return [template.format(**row) for row in rows.to_dict("records")]
+
+
+def build_records(
+    rows: pd.DataFrame, ids: List[str], contents: List[str], embeddings: List[List[float]]
+) -> pd.DataFrame:
+    """Crée les enregistrements à insérer (conversion des types pandas vers Python natifs)."""
+    created_at = datetime.now().isoformat()
+    return pd.DataFrame([{
+        "id": row_id,
+        "metadata": {
+            "serie_id": str(row["serie_id"]),
+            "serie_title": str(row["serie_title"]),
+            "genre": str(row["genre"]) if pd.notna(row["genre"]) else "No Genre",
+            "categorie": str(row["categorie"]) if pd.notna(row["categorie"]) else "No Categorie",
+            "volume_id": str(row["volume_id"]),
+            "volume_number": int(row["volume_number"]),
+            "created_at": created_at,
+        },
+        "contents": content,
+        "embedding": embedding,
+    } for row, row_id, content, embedding in zip(rows.to_dict("records"), ids, contents, embeddings)])
+
+
+class Checkpoint:
+    """Fichier de reprise mémorisant le nombre de lignes du CSV déjà écrites en base."""
+
+    def __init__(self, path: str, source: str, content_format: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.content_format = content_format
+
+    def load(self) -> int:
+        """
+        Retourne le nombre de lignes déjà traitées (0 sans fichier de reprise).
+
+        Raises:
+            ValueError: Si le fichier de reprise concerne un autre CSV ou un autre format.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("source") != self.source or state.get("content_format") != self.content_format:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to {state.get('source')} ({state.get('content_format')}); "
+                f"use --restart to ignore it"
+            )
+        return int(state["rows_done"])
+
+    def save(self, rows_done: int) -> None:
+        """Enregistre la progression de façon atomique."""
+        state = {
+            "source": self.source,
+            "content_format": self.content_format,
+            "rows_done": rows_done,
+            "updated_at": datetime.now().isoformat(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """Supprime le fichier de reprise à la fin d'une ingestion complète."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Ingestor:
+    """Pipeline d'ingestion : lecture par blocs, embeddings concurrents, écriture ordonnée par lot."""
+
+    def __init__(
+        self,
+        csv_path: str,
+        sep: str = ";",
+        chunk_size: int = 5000,
+        batch_size: int = 256,
+        concurrency: int = 4,
+        content_format: str = "full",
+        checkpoint: Optional[Checkpoint] = None,
+        keep_missing: bool = False,
+    ):
+        self.csv_path = csv_path
+        self.sep = sep
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.content_format = content_format
+        self.checkpoint = checkpoint or Checkpoint(
+            f"{csv_path}.checkpoint.json", csv_path, content_format
+        )
+        self.keep_missing = keep_missing
+        self.writer = VectorStore()
+        self.embedder = AsyncVectorStore()
+        self.rows_done = 0
+        self.rows_written = 0
+        self.rows_skipped = 0
+        self.rows_deleted = 0
+
+    @property
+    def model_version(self) -> str:
+        """Le modèle et les dimensions d'embedding, qui entrent dans les ids des enregistrements."""
+        return f"{self.writer.embedding_model}:{self.writer.vector_settings.embedding_dimensions}"
+
+    def _record_ids(self, volume_ids) -> List[str]:
+        return [record_id(volume_id, self.model_version) for volume_id in volume_ids]
+
+    async def _embed(self, semaphore: asyncio.Semaphore, contents: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await self.embedder.get_embeddings(contents, use_cache=False)
+
+    def _report(self, start_time: float) -> str:
+        elapsed = max(time.time() - start_time, 1e-9)
+        return (
+            f"{self.rows_written} lignes écrites, {self.rows_skipped} inchangées en {elapsed:.1f} s "
+            f"({self.rows_written / elapsed:.1f} lignes/s, {self.embedder.embedding_tokens / elapsed:.0f} tokens/s)"
+        )
+
+    async def run(self, start_row: int = 0, build_index: bool = True) -> None:
+        """
+        Ingère les lignes modifiées du CSV à partir de `start_row`, supprime les volumes disparus
+        puis construit l'index HNSW.
+
+        Args:
+            start_row: Le nombre de lignes déjà traitées, lu dans le fichier de reprise.
+            build_index: Si l'index HNSW doit être construit à la fin de l'ingestion.
+        """
+        self.rows_done = start_row
+        if self.rows_done:
+            print(f"Reprise après {self.rows_done} lignes déjà traitées")
+
+        self.writer.create_tables()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start_time = time.time()
+
+        reader = pd.read_csv(
+            self.csv_path,
+            sep=self.sep,
+            chunksize=self.chunk_size,
+            skiprows=range(1, self.rows_done + 1),
+        )
+        for chunk in reader:
+            chunk_start = self.rows_done
+            ids = self._record_ids(chunk["volume_id"])
+            contents = format_contents(chunk, self.content_format)
+            stored_hashes = await asyncio.to_thread(self.writer.get_content_hashes, ids)
+            # Seules les lignes nouvelles ou dont le texte a changé sont embeddées et écrites
+            changed = [
+                i for i, (row_id, text) in enumerate(zip(ids, contents))
+                if stored_hashes.get(uuid.UUID(row_id)) != content_hash(text)
+            ]
+            self.rows_skipped += len(chunk) - len(changed)
+            batches = [changed[i:i + self.batch_size] for i in range(0, len(changed), self.batch_size)]
+            # Les lots sont embeddés en parallèle mais écrits dans l'ordre du fichier,
+            # pour que le point de reprise reste un simple nombre de lignes
+            tasks = [
+                asyncio.create_task(self._embed(semaphore, [contents[i] for i in batch])) for batch in batches
+            ]
+            try:
+                for batch, task in zip(batches, tasks):
+                    embeddings = await task
+                    records = build_records(
+                        chunk.iloc[batch], [ids[i] for i in batch], [contents[i] for i in batch], embeddings
+                    )
+                    await asyncio.to_thread(self.writer.upsert, records)
+                    self.rows_done = chunk_start + batch[-1] + 1
+                    self.rows_written += len(batch)
+                    self.checkpoint.save(self.rows_done)
+                    print(f"Lignes 1-{self.rows_done} traitées : {self._report(start_time)}")
+            finally:
+                for task in tasks:
+                    task.cancel()
+            self.rows_done = chunk_start + len(chunk)
+            self.checkpoint.save(self.rows_done)
+
+        if not self.keep_missing:
+            await asyncio.to_thread(self._delete_missing)
+        self.checkpoint.clear()
+        print(f"\nInsertion terminée ! {self._report(start_time)}, {self.rows_deleted} supprimées")
+
+        if not build_index:
+            return
+        print("\nCréation de l'index...")
+        if self.writer.supports_index():
+            await asyncio.to_thread(self.writer.create_index)
+        else:
+            print(
+                f"Index désactivé : {self.writer.vector_column_type} dépasse la limite HNSW, "
+                f"voir app/database/migrate_vectors.py"
+            )
+
+    def _delete_missing(self) -> None:
+        """Supprime les enregistrements dont le volume n'est plus dans le CSV."""
+        volume_ids = pd.read_csv(self.csv_path, sep=self.sep, usecols=["volume_id"])["volume_id"]
+        self.rows_deleted = self.writer.delete_except(self._record_ids(volume_ids))
+
+    async def close(self) -> None:
+        await self.embedder.close()
+        self.writer.close()
+        await get_llm_clients().aclose()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingère le catalogue de volumes dans le magasin de vecteurs")
+    parser.add_argument("--csv", default="data/volume_content.csv", help="Fichier CSV des volumes")
+    parser.add_argument("--sep", default=";", help="Séparateur du CSV")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Lignes lues par bloc")
+    parser.add_argument("--batch-size", type=int, default=256, help="Lignes par appel d'embedding et par écriture")
+    parser.add_argument("--concurrency", type=int, default=4, help="Appels d'embedding simultanés")
+    parser.add_argument("--content-format", choices=sorted(CONTENT_FORMATS), default="full", help="Texte embeddé")
+    parser.add_argument("--checkpoint", help="Fichier de reprise (défaut : <csv>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignorer le fichier de reprise")
+    parser.add_argument("--no-index", action="store_true", help="Ne pas construire l'index HNSW")
+    parser.add_argument(
+        "--keep-missing", action="store_true", help="Conserver les volumes absents du CSV au lieu de les supprimer"
+    )
+    args = parser.parse_args(argv)
+
+    checkpoint = Checkpoint(
+        args.checkpoint or f"{args.csv}.checkpoint.json", args.csv, args.content_format
+    )
+    try:
+        start_row = 0 if args.restart else checkpoint.load()
+    except ValueError as e:
+        parser.error(str(e))
+
+    ingestor = Ingestor(
+        args.csv,
+        sep=args.sep,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        content_format=args.content_format,
+        checkpoint=checkpoint,
+        keep_missing=args.keep_missing,
+    )
+
+    async def run():
+        try:
+            await ingestor.run(start_row, build_index=not args.no_index)
+        finally:
+            await ingestor.close()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
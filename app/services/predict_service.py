@@ -1,8 +1,15 @@
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 
-from app.database.vector_store import VectorStore
-from app.services.synthesizer import Synthesizer
+import numpy as np
+
+from app.database import catalog_events
+from app.database.async_vector_store import AsyncVectorStore
+from app.database.reranker import normalize_rows
+from app.database.search_results import SearchResult
+from app.services.prediction_cache import PredictionCache
+from app.services.synthesizer import FallbackResponse, Synthesizer
 from app.models.predict_request import PredictRequest
 from app.models.predict_response import PredictResponse, RecommendedSerie
 
@@ -11,111 +18,238 @@ class PredictService:
     """Service pour gérer les prédictions basées sur la recherche vectorielle."""
     
     def __init__(self):
-        self.vector_store = VectorStore()
+        self.vector_store = AsyncVectorStore()
         self.synthesizer = Synthesizer()
+        cache_settings = self.vector_store.settings.prediction_cache
+        self.prediction_cache = PredictionCache(cache_settings) if cache_settings.enabled else None
+        self.taste_settings = self.vector_store.settings.taste_vector
+        self._catalog_listener: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """
+        Abonne le cache de prédictions et les index IVF aux modifications du catalogue (processus
+        courant et Postgres).
+        """
+        uses_ivf = self.vector_store.vector_settings.search_engine == "ivf"
+        if (self.prediction_cache is None and not uses_ivf) or self._catalog_listener is not None:
+            return
+        catalog_events.subscribe(self._on_catalog_change)
+        self._catalog_listener = asyncio.create_task(
+            self.vector_store.listen_catalog_changes(self._on_catalog_change)
+        )
+    
+    def _on_catalog_change(self, table_name: str) -> None:
+        """Invalide ce qui dépend du catalogue : cache de prédictions et index IVF."""
+        if self.prediction_cache is not None:
+            self.prediction_cache.invalidate(table_name)
+        self.vector_store.invalidate_ivf_indexes(table_name)
     
-    def _search_similar_volumes(self, request: PredictRequest, limit: int = 10):
+    async def close(self):
         """
-        Recherche les volumes similaires à la collection et aux volumes lus de l'utilisateur.
+        Libère les connexions du service.
         """
-        all_results = []
+        if self._catalog_listener is not None:
+            catalog_events.unsubscribe(self._on_catalog_change)
+            self._catalog_listener.cancel()
+            try:
+                await self._catalog_listener
+            except asyncio.CancelledError:
+                pass
+            self._catalog_listener = None
+        await self.vector_store.close()
+    
+    def _build_series_queries(self, owned, request: PredictRequest) -> List[str]:
+        """
+        Construit une requête de recherche par série d'une collection ou d'une liste de lectures.
+        """
+        search_queries = []
+        
+        if not owned or owned == "{}" or not isinstance(owned, dict):
+            return search_queries
+        
+        # Ordre stable, pour que le résultat ne dépende pas de l'ordre des clés (cache de prédictions)
+        for serie_name, serie_data in sorted(owned.items(), key=lambda item: item[0]):
+            if isinstance(serie_data, dict) and 'volumes' in serie_data:
+                # Utiliser le nom de la série pour la recherche
+                search_queries.append(f"Serie: {serie_name} Genre: {request.category_preference}")
+        
+        return search_queries
+    
+    @staticmethod
+    def _series_ids(owned) -> List[str]:
+        """
+        Retourne les id_series d'une collection ou d'une liste de lectures.
+        """
+        if not isinstance(owned, dict):
+            return []
+        return [
+            str(serie_data['id_series'])
+            for serie_data in owned.values()
+            if isinstance(serie_data, dict) and serie_data.get('id_series')
+        ]
+    
+    @staticmethod
+    def _volume_ids(owned) -> List[str]:
+        """
+        Retourne les volume_id d'une collection ou d'une liste de lectures.
+        """
+        volume_ids = []
+        if not isinstance(owned, dict):
+            return volume_ids
+        for serie_data in owned.values():
+            if isinstance(serie_data, dict) and 'volumes' in serie_data:
+                volumes = serie_data['volumes']
+                values = volumes.values() if isinstance(volumes, dict) else (volumes or [])
+                volume_ids.extend(str(volume_id) for volume_id in values)
+        return volume_ids
+    
+    def _volume_weights(self, request: PredictRequest) -> Dict[str, float]:
+        """
+        Associe chaque volume possédé ou lu à son poids dans le vecteur de goût.
+        """
+        weights: Dict[str, float] = {}
+        for owned, weight in (
+            (request.collection, self.taste_settings.owned_weight),
+            (request.read, self.taste_settings.read_weight),
+        ):
+            for volume_id in dict.fromkeys(self._volume_ids(owned)):
+                weights[volume_id] = weights.get(volume_id, 0.0) + weight
+        return weights
+    
+    @staticmethod
+    def _weighted_taste_vector(stored: Dict[str, np.ndarray], weights: Dict[str, float]) -> Optional[np.ndarray]:
+        """
+        Combine les embeddings normalisés des volumes en un vecteur de goût unitaire.
+
+        Returns:
+            Le vecteur de goût, ou None si la somme pondérée est nulle.
+        """
+        volume_ids = sorted(stored)
+        matrix = normalize_rows(np.stack([stored[volume_id] for volume_id in volume_ids]))
+        volume_weights = np.array([weights[volume_id] for volume_id in volume_ids], dtype=np.float32)
+        taste = volume_weights @ matrix
+        if not np.any(taste):
+            return None
+        return normalize_rows(taste[np.newaxis, :])[0]
+    
+    async def _build_taste_vector(self, request: PredictRequest) -> Optional[np.ndarray]:
+        """
+        Construit le vecteur de goût de l'utilisateur à partir des embeddings stockés de ses volumes.
+
+        Les volumes possédés et lus sont récupérés en une requête, sans appel à l'API d'embedding.
+
+        Returns:
+            Le vecteur de goût, ou None si aucun des volumes n'est présent dans le catalogue.
+        """
+        weights = self._volume_weights(request)
+        if not weights:
+            return None
+        stored = await self.vector_store.get_volume_embeddings(sorted(weights))
+        logging.debug(f"Volumes retrouvés pour le vecteur de goût: {len(stored)}/{len(weights)}")
+        if not stored:
+            return None
+        return self._weighted_taste_vector(stored, weights)
+    
+    @staticmethod
+    def _first_per_series(results: List[SearchResult], limit: int) -> List[SearchResult]:
+        """
+        Garde la première occurrence de chaque série, une même série pouvant ressortir de plusieurs requêtes.
+        """
+        seen = set()
+        kept = []
+        for result in results:
+            serie_id = result.get('serie_id')
+            if serie_id in seen:
+                continue
+            seen.add(serie_id)
+            kept.append(result)
+            if len(kept) >= limit:
+                break
+        return kept
+    
+    async def _search_similar_volumes(self, request: PredictRequest, limit: int = 10) -> List[SearchResult]:
+        """
+        Recherche les séries similaires à la collection et aux volumes lus de l'utilisateur.
+
+        Le vecteur de goût (embeddings stockés des volumes de l'utilisateur) alimente une recherche
+        unique ; à défaut, chaque série de l'utilisateur est embeddée via l'API puis recherchée.
+        Au niveau "series" (défaut), les centroïdes des séries sont classés directement ; au niveau
+        "volume", chaque volume trouvé représente sa série.
+        """
+        all_results: List[SearchResult] = []
+        # Les séries possédées ou lues sont écartées et chaque série ne ressort qu'une fois, en SQL ;
+        # seules les métadonnées sont lues (ni texte ni embedding)
+        search_options = {
+            'level': self.vector_store.vector_settings.search_level,
+            'exclude_series_ids': self._series_ids(request.collection) + self._series_ids(request.read),
+            'one_per_series': True,
+            'return_dataframe': False,
+            'columns': (),
+        }
         
         try:
-            # Rechercher des volumes similaires à ceux de la collection
-            if request.collection:
-                for serie_name, serie_data in request.collection.items():
-                    if isinstance(serie_data, dict) and 'volumes' in serie_data:
-                        # Utiliser le nom de la série pour la recherche
-                        search_query = f"Serie: {serie_name} Genre: {request.category_preference}"
-                        
-                        results = self.vector_store.search(
-                            query_text=search_query,
-                            limit=5,
-                            return_dataframe=True
-                        )
-                        
-                        if not results.empty:
-                            all_results.append(results)
+            if self.taste_settings.enabled:
+                taste_vector = await self._build_taste_vector(request)
+                if taste_vector is not None:
+                    taste_results = await self.vector_store.search_many(
+                        [taste_vector], limit=limit, **search_options
+                    )
+                    all_results.extend(taste_results[0])
             
-            # Rechercher des volumes similaires à ceux déjà lus
-            if request.read and request.read != "{}":
-                read_data = request.read if isinstance(request.read, dict) else {}
-                for serie_name, serie_data in read_data.items():
-                    if isinstance(serie_data, dict) and 'volumes' in serie_data:
-                        # Utiliser le nom de la série pour la recherche
-                        search_query = f"Serie: {serie_name} Genre: {request.category_preference}"
-                        
-                        results = self.vector_store.search(
-                            query_text=search_query,
-                            limit=5,
-                            return_dataframe=True
-                        )
-                        
-                        if not results.empty:
-                            all_results.append(results)
+            # Rechercher des séries similaires à chaque série de la collection et des lectures
+            collection_queries = self._build_series_queries(request.collection, request)
+            read_queries = self._build_series_queries(request.read, request)
+            search_queries = collection_queries + read_queries
+            if search_queries and not all_results:
+                query_vectors = await self.vector_store.get_embeddings(search_queries)
+                
+                # Les recherches de la collection et des lectures sont indépendantes :
+                # elles s'exécutent en parallèle sur des connexions distinctes du pool
+                query_groups = [
+                    query_vectors[:len(collection_queries)],
+                    query_vectors[len(collection_queries):]
+                ]
+                searches = await asyncio.gather(*(
+                    self.vector_store.search_many(vectors, limit=5, **search_options)
+                    for vectors in query_groups if vectors
+                ))
+                
+                for grouped_results in searches:
+                    for results in grouped_results:
+                        all_results.extend(results)
             
             # Si pas de collection/lecture, recherche basée sur les préférences
             if not all_results:
                 mood_text = f" {request.user_mood}" if request.user_mood else ""
                 search_query = f"Genre: {request.category_preference}{mood_text} manga"
                 
-                results = self.vector_store.search(
+                results = await self.vector_store.search(
                     query_text=search_query,
                     limit=limit,
-                    return_dataframe=True
+                    **search_options
                 )
-                
-                if not results.empty:
-                    all_results.append(results)
-            
-            # Combiner tous les résultats
-            if all_results:
-                import pandas as pd
-                combined_results = pd.concat(all_results, ignore_index=True)
-                
-                # Supprimer les doublons basés sur serie_title dans metadata
-                if not combined_results.empty and 'metadata' in combined_results.columns:
-                    seen_series = set()
-                    unique_results = []
-                    
-                    for _, row in combined_results.iterrows():
-                        metadata = row.get('metadata', {})
-                        if isinstance(metadata, dict):
-                            serie_title = metadata.get('serie_title', '')
-                            if serie_title and serie_title not in seen_series:
-                                seen_series.add(serie_title)
-                                unique_results.append(row)
-                    
-                    if unique_results:
-                        return pd.DataFrame(unique_results).head(limit)
-                
-                return combined_results.head(limit)
+                all_results.extend(results)
             
-            # Retourner un DataFrame vide si aucun résultat
-            import pandas as pd
-            return pd.DataFrame()
+            return self._first_per_series(all_results, limit)
             
         except Exception as e:
             logging.error(f"Erreur lors de la recherche de volumes similaires: {e}")
-            import pandas as pd
-            return pd.DataFrame()
+            return []
     
-    def _extract_series_recommendations(self, search_results, request: PredictRequest) -> List[RecommendedSerie]:
+    def _extract_series_recommendations(
+        self, search_results: List[SearchResult], request: PredictRequest
+    ) -> List[RecommendedSerie]:
         """
         Extrait les recommandations de séries avec id_series et format demandé.
         """
         recommended_series = []
         
-        if search_results.empty:
-            return recommended_series
-        
-        for _, row in search_results.iterrows():
+        for result in search_results:
             try:
-                # Les métadonnées sont étendues dans les colonnes du DataFrame
-                serie_title = row.get('serie_title', '')
-                serie_id = row.get('serie_id', '')
-                genre = row.get('genre', '')
-                category = row.get('categorie', '')
+                serie_title = result.get('serie_title', '')
+                serie_id = result.get('serie_id', '')
+                genre = result.get('genre', '')
+                category = result.get('categorie', '')
                 
                 print(f"Série trouvée: {serie_title} | ID: {serie_id} | Genre: {genre}")
                 
@@ -164,10 +298,71 @@ class PredictService:
         
         return f"{title} - {' et '.join(reasons[:2])}"
     
+    @staticmethod
+    def _build_user_profile(request: PredictRequest) -> Dict[str, Any]:
+        """
+        Construit le profil utilisateur transmis au Synthesizer.
+        """
+        return {
+            'user_age': request.user_age,
+            'user_genre': request.user_genre,
+            'genre_preference': request.genre_preference,
+            'category_preference': request.category_preference,
+            'user_mood': request.user_mood,
+            'prediction_type': request.prediction_type,
+            'collection': request.collection,
+            'read': request.read
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retourne les compteurs des caches et du pool de connexions utilisés par le service.
+        """
+        embedding_cache = self.vector_store.embedding_cache
+        semantic_cache = self.synthesizer.semantic_cache
+        return {
+            'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+            'prediction_cache': self.prediction_cache.stats() if self.prediction_cache is not None else None,
+            'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+            'database_pool': self.vector_store.pool_stats()
+        }
+    
+    async def predict_cached(self, request: PredictRequest) -> Tuple[PredictResponse, str]:
+        """
+        Effectue une prédiction en consultant d'abord le cache de prédictions.
+
+        Returns:
+            La réponse et le statut du cache : "HIT", "MISS" ou "BYPASS" (cache désactivé).
+        """
+        if self.prediction_cache is None:
+            return await self.predict(request), "BYPASS"
+        
+        key = PredictionCache.make_key(request)
+        cached = self.prediction_cache.get(key)
+        if cached is not None:
+            return cached, "HIT"
+        
+        generation = self.prediction_cache.generation
+        response, cacheable = await self._predict(request)
+        if cacheable:
+            self.prediction_cache.put(key, response, generation)
+        return response, "MISS"
+    
     async def predict(self, request: PredictRequest) -> PredictResponse:
         """
         Effectue une prédiction basée sur le profil utilisateur et ses préférences.
         """
+        response, _ = await self._predict(request)
+        return response
+    
+    async def _predict(self, request: PredictRequest) -> Tuple[PredictResponse, bool]:
+        """
+        Effectue une prédiction (voir `predict`).
+
+        Returns:
+            La réponse et si elle peut être mise en cache : ni les erreurs ni les réponses de repli
+            du Synthesizer, propres au profil de l'utilisateur, ne le sont.
+        """
         try:
             print(f"=== DEBUT PREDICT SERVICE ===")
             print(f"Profil: {request.user_genre} {request.user_age} ans")
@@ -176,7 +371,7 @@ class PredictService:
             print(f"Type: {request.prediction_type}")
             
             # Rechercher les volumes similaires (10 max)
-            search_results = self._search_similar_volumes(request, limit=10)
+            search_results = await self._search_similar_volumes(request, limit=10)
             print(f"Résultats trouvés: {len(search_results)}")
             
             # Extraire les séries recommandées
@@ -184,34 +379,26 @@ class PredictService:
             print(f"Séries extraites: {len(recommended_series)}")
             
             # Générer la réponse globale via l'agent IA
-            if search_results.empty:
+            if not search_results:
                 context_text = "Aucun contexte spécifique trouvé."
             else:
                 context_text = "Recommandations basées sur votre profil et vos préférences."
             
             # Préparer le profil pour l'agent
-            user_profile = {
-                'user_age': request.user_age,
-                'user_genre': request.user_genre,
-                'genre_preference': request.genre_preference,
-                'category_preference': request.category_preference,
-                'user_mood': request.user_mood,
-                'prediction_type': request.prediction_type,
-                'collection': request.collection,
-                'read': request.read
-            }
+            user_profile = self._build_user_profile(request)
             
             # Générer la réponse globale
-            synthesizer_response = self.synthesizer.generate_global_response(
+            synthesizer_response = await self.synthesizer.agenerate_global_response(
                 recommended_series=recommended_series,
                 user_profile=user_profile
             )
             
-            return PredictResponse(
+            response = PredictResponse(
                 serie_recomendees=recommended_series,
                 status="success",
                 responce_IA_global=synthesizer_response
             )
+            return response, not isinstance(synthesizer_response, FallbackResponse)
             
         except Exception as e:
             logging.error(f"Erreur lors de la prédiction: {e}")
@@ -219,4 +406,40 @@ class PredictService:
                 serie_recomendees=[],
                 status="error",
                 responce_IA_global=f"Une erreur s'est produite: {str(e)}"
-            )
\ No newline at end of file
+            ), False
+    
+    async def predict_stream(self, request: PredictRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Variante de `predict` produisant des événements (nom, données) au fil du traitement.
+
+        Les séries recommandées sont émises dès la fin de la recherche (`serie_recomendees`), puis
+        la réponse globale fragment par fragment (`token`) et enfin la réponse complète (`done`).
+        Une erreur produit un unique événement `error`.
+        """
+        try:
+            search_results = await self._search_similar_volumes(request, limit=10)
+            recommended_series = self._extract_series_recommendations(search_results, request)
+        except Exception as e:
+            logging.error(f"Erreur lors de la prédiction: {e}")
+            yield 'error', {
+                'status': 'error',
+                'responce_IA_global': f"Une erreur s'est produite: {str(e)}"
+            }
+            return
+        
+        yield 'serie_recomendees', {
+            'serie_recomendees': [serie.model_dump() for serie in recommended_series]
+        }
+        
+        fragments = []
+        async for fragment in self.synthesizer.astream_global_response(
+            recommended_series=recommended_series,
+            user_profile=self._build_user_profile(request)
+        ):
+            fragments.append(fragment)
+            yield 'token', {'text': fragment}
+        
+        yield 'done', {
+            'status': 'success',
+            'responce_IA_global': ''.join(fragments).strip()
+        }
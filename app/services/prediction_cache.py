@@ -0,0 +1,139 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from app.config.settings import PredictionCacheSettings
+from app.models.predict_request import PredictRequest
+from app.models.predict_response import PredictResponse
+
+# Bornes inférieures des tranches d'âge ; 18 correspond au seuil utilisé par les recommandations
+AGE_BANDS = (0, 13, 18, 25, 35, 50)
+
+
+class PredictionCache:
+    """
+    Cache des prédictions complètes clé sur le profil canonique de la requête.
+
+    Deux requêtes ne différant que par l'ordre des clés de la collection ou des lectures, la casse
+    de l'humeur ou de la catégorie, ou l'âge au sein d'une même tranche partagent la même entrée.
+    Les entrées expirent après `ttl`, les plus anciennes sont évincées au-delà de `max_size` et
+    tout le cache est invalidé à chaque modification du catalogue.
+    """
+
+    def __init__(self, settings: PredictionCacheSettings, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            settings: Les paramètres du cache.
+            clock: La source de temps utilisée pour l'expiration des entrées.
+        """
+        self.settings = settings
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrémenté à chaque invalidation pour écarter les prédictions calculées avant celle-ci
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        """Normalise une valeur textuelle (Unicode NFC, espaces regroupés, casse ignorée)."""
+        text = unicodedata.normalize("NFC", str(value or ""))
+        return re.sub(r"\s+", " ", text).strip().casefold()
+
+    @staticmethod
+    def _age_band(user_age: str) -> str:
+        """Retourne la tranche d'âge, ou l'âge normalisé s'il n'est pas numérique."""
+        try:
+            age = int(str(user_age).strip())
+        except ValueError:
+            return PredictionCache._normalize(user_age)
+        lower = max((bound for bound in AGE_BANDS if bound <= age), default=AGE_BANDS[0])
+        return f">={lower}"
+
+    @classmethod
+    def _canonical_series(cls, owned) -> List[list]:
+        """Retourne les séries (nom, id, volumes triés) triées, dans l'ordre utilisé par la recherche."""
+        if not isinstance(owned, dict):
+            return []
+        series = []
+        for serie_name, serie_data in owned.items():
+            if isinstance(serie_data, dict) and 'volumes' in serie_data:
+                volumes = serie_data['volumes']
+                volume_ids = volumes.values() if isinstance(volumes, dict) else (volumes or [])
+                series.append([
+                    re.sub(r"\s+", " ", unicodedata.normalize("NFC", str(serie_name))).strip(),
+                    str(serie_data.get('id_series', '')),
+                    sorted(str(volume_id) for volume_id in volume_ids),
+                ])
+        return sorted(series)
+
+    @classmethod
+    def make_key(cls, request: PredictRequest) -> str:
+        """Construit la clé de cache du profil canonique de la requête."""
+        profile = {
+            "age": cls._age_band(request.user_age),
+            "genre": cls._normalize(request.user_genre),
+            "genre_preference": cls._normalize(request.genre_preference),
+            "category": cls._normalize(request.category_preference),
+            "mood": cls._normalize(request.user_mood),
+            "prediction_type": request.prediction_type,
+            "collection": cls._canonical_series(request.collection),
+            "read": cls._canonical_series(request.read),
+        }
+        encoded = json.dumps(profile, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[PredictResponse]:
+        """Retourne la prédiction en cache, ou None si elle est absente ou expirée."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: PredictResponse, generation: int) -> None:
+        """
+        Enregistre une prédiction calculée pendant la génération `generation`.
+
+        La prédiction est ignorée si le catalogue a été modifié depuis le début de son calcul.
+        """
+        expires_at = self._clock() + self.settings.ttl.total_seconds()
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.settings.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        """Vide le cache après une modification du catalogue."""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Retourne les compteurs de succès, d'échecs et d'invalidations du cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import SemanticCacheSettings
+from app.database.reranker import normalize_rows, to_float32_matrix
+
+
+class SemanticResponseCache:
+    """
+    Cache sémantique des réponses générées par le LLM.
+
+    Chaque entrée associe le texte de contexte (profil + séries recommandées) et son embedding à
+    la réponse générée. Un contexte identique est retrouvé sans embedding ; sinon la réponse de
+    l'entrée la plus proche est réutilisée si sa similarité cosinus atteint `threshold`.
+    Les embeddings occupent les lignes d'une matrice pré-allouée de `max_size` lignes, la moins
+    récemment utilisée étant évincée lorsque la matrice est pleine.
+    """
+
+    def __init__(self, settings: SemanticCacheSettings, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            settings: Les paramètres du cache.
+            clock: La source de temps utilisée pour l'expiration des entrées.
+        """
+        self.settings = settings
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(settings.max_size, dtype=bool)
+        self._last_used = np.zeros(settings.max_size, dtype=np.int64)
+        self._entries: Dict[int, Tuple[float, str, str]] = {}
+        self._slots_by_key: Dict[str, int] = {}
+        self._tick = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        """Construit la clé exacte d'un texte de contexte."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _touch(self, slot: int) -> None:
+        self._tick += 1
+        self._last_used[slot] = self._tick
+
+    def _free(self, slot: int) -> None:
+        _, key, _ = self._entries.pop(slot)
+        self._slots_by_key.pop(key, None)
+        self._valid[slot] = False
+
+    def _live_entry(self, slot: int, now: float) -> Optional[str]:
+        """Retourne la réponse de l'emplacement, ou None en la libérant si elle a expiré."""
+        expires_at, _, answer = self._entries[slot]
+        if expires_at <= now:
+            self._free(slot)
+            return None
+        self._touch(slot)
+        return answer
+
+    def get_exact(self, text: str) -> Optional[str]:
+        """Retourne la réponse d'un contexte identique, sans calcul d'embedding."""
+        with self._lock:
+            slot = self._slots_by_key.get(self.make_key(text))
+            answer = self._live_entry(slot, self._clock()) if slot is not None else None
+            if answer is not None:
+                self.exact_hits += 1
+            return answer
+
+    def get_similar(self, embedding: List[float]) -> Optional[str]:
+        """
+        Retourne la réponse de l'entrée la plus proche si elle atteint le seuil de similarité.
+
+        Un échec est comptabilisé lorsque aucune entrée ne convient.
+        """
+        query = normalize_rows(to_float32_matrix(embedding))[0]
+        with self._lock:
+            if self._vectors is not None and self._valid.any():
+                scores = self._vectors @ query
+                scores[~self._valid] = -np.inf
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.settings.threshold:
+                    answer = self._live_entry(slot, self._clock())
+                    if answer is not None:
+                        self.semantic_hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def put(self, text: str, embedding: List[float], answer: str) -> None:
+        """Enregistre la réponse générée pour un contexte, en évinçant l'entrée la moins récente si besoin."""
+        vector = normalize_rows(to_float32_matrix(embedding))[0]
+        key = self.make_key(text)
+        expires_at = self._clock() + self.settings.ttl.total_seconds()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.settings.max_size, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries.clear()
+                self._slots_by_key.clear()
+
+            slot = self._slots_by_key.get(key)
+            if slot is None:
+                free = np.flatnonzero(~self._valid)
+                if len(free):
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self._free(slot)
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = (expires_at, key, answer)
+            self._slots_by_key[key] = slot
+            self._touch(slot)
+
+    def clear(self) -> None:
+        """Vide le cache."""
+        with self._lock:
+            self._valid[:] = False
+            self._entries.clear()
+            self._slots_by_key.clear()
+
+    def stats(self) -> dict:
+        """Retourne les compteurs de succès (exacts et sémantiques) et d'échecs du cache."""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "size": int(self._valid.sum()),
+            }
@@ -71,6 +71,12 @@ vec = VectorStore()
 #     "volume_number", ">", 1
 # )
 # results = vec.search(relevant_question, limit=3, predicates=predicates)
+#
+#
+# predicates = client.Predicates("serie_id", "in", ["12", "42"]) & ~client.Predicates(
+#     "volume_number", "<=", 2
+# )
+# results = vec.search(relevant_question, limit=3, predicates=predicates)
 
 # --------------------------------------------------------------
 # Filtrage basé sur le temps
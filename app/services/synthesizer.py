@@ -1,11 +1,10 @@
 import logging
-import os
-from typing import List
-import pandas as pd
+from typing import AsyncIterator, List, Optional, Tuple
 from pydantic import BaseModel
 
+from app.config.llm_clients import LLMClients, get_llm_clients
 from app.config.settings import get_settings
-from openai import OpenAI, AzureOpenAI
+from app.services.semantic_cache import SemanticResponseCache
 
 
 class SynthesizerResponse(BaseModel):
@@ -15,44 +14,46 @@ class SynthesizerResponse(BaseModel):
     enough_context: bool
 
 
+class FallbackResponse(str):
+    """
+    Réponse de repli renvoyée lorsque la génération par le LLM échoue. Elle reprend le profil de
+    l'utilisateur et ne doit pas être mise en cache.
+    """
+
+
 class Synthesizer:
     """Service pour synthétiser des réponses basées sur le contexte récupéré."""
 
-    def generate_global_response(self, recommended_series: List, user_profile: dict) -> str:
+    def __init__(
+        self,
+        clients: Optional[LLMClients] = None,
+        semantic_cache: Optional[SemanticResponseCache] = None,
+    ):
         """
-        Génère une réponse globale personnalisée pour l'utilisateur.
+        Args:
+            clients: Le registre des clients LLM (par défaut celui partagé par l'application).
+            semantic_cache: Le cache sémantique des réponses (par défaut créé selon les paramètres).
         """
-        print("=== DEBUT generate_global_response ===")
-        print(f"Séries recommandées: {len(recommended_series)}")
-        print(f"Profil utilisateur: {user_profile.get('user_genre')} {user_profile.get('user_age')} ans")
+        self.clients = clients or get_llm_clients()
+        if semantic_cache is None:
+            cache_settings = get_settings().semantic_cache
+            semantic_cache = SemanticResponseCache(cache_settings) if cache_settings.enabled else None
+        self.semantic_cache = semantic_cache
+
+    def _build_prompt(self, recommended_series: List, user_profile: dict) -> str:
+        """
+        Construit le prompt de la réponse globale.
+        """
+        # Construire la liste des séries recommandées
+        series_list = ""
+        if recommended_series:
+            for i, serie in enumerate(recommended_series, 1):
+                series_list += f"{i}. {serie.title}\n"
+        else:
+            series_list = "Aucune série trouvée dans la base de données."
         
-        try:
-            settings = get_settings()
-            
-            # Vérifier si Azure OpenAI doit être utilisé
-            use_azure = os.getenv("USE_AZURE_OPENAI", "false").lower() == "true"
-            
-            if use_azure:
-                client = AzureOpenAI(
-                    api_key=settings.azure_openai.api_key,
-                    api_version=settings.azure_openai.api_version,
-                    azure_endpoint=settings.azure_openai.azure_endpoint
-                )
-                model = settings.azure_openai.default_model
-            else:
-                client = OpenAI(api_key=settings.openai.api_key)
-                model = settings.openai.default_model
-            
-            # Construire la liste des séries recommandées
-            series_list = ""
-            if recommended_series:
-                for i, serie in enumerate(recommended_series, 1):
-                    series_list += f"{i}. {serie.title}\n"
-            else:
-                series_list = "Aucune série trouvée dans la base de données."
-            
-            # Prompt pour générer une réponse globale personnalisée
-            prompt = f"""
+        # Prompt pour générer une réponse globale personnalisée
+        prompt = f"""
 <Role_and_Objectives>
   <Role>
     You are a recommendation engine embedded in Book Sync, a full-stack Django web application designed to help users manage and discover Asian literature, including manga, manhwa, and manhua. You are an expert in Japanese, Chinese, and Korean literary formats, with deep knowledge of genres such as shonen, seinen, shoujo, josei, horror, romance, fantasy, thriller, slice of life, and more. You understand both mainstream and niche titles, and your expertise allows you to curate personalized reading journeys.
@@ -91,6 +92,88 @@ Generate a warm and personalized response (2–3 sentences max) that:
 
 Only return the response text, without JSON or additional structure.
 """
+        
+        return prompt
+
+    def _fallback_response(self, user_profile: dict) -> FallbackResponse:
+        """
+        Réponse utilisée lorsque la génération par le LLM échoue.
+        """
+        return FallbackResponse(f"Voici mes recommandations basées sur votre profil {user_profile.get('user_genre')} de {user_profile.get('user_age')} ans avec des préférences pour le {user_profile.get('category_preference')}.")
+
+    def _cache_context(self, recommended_series: List, user_profile: dict) -> str:
+        """
+        Résume le profil et les séries recommandées : seul contexte dont dépend la réponse globale.
+        """
+        titles = "; ".join(serie.title for serie in recommended_series) or "-"
+        return (
+            f"Profile: {user_profile.get('user_age')} {user_profile.get('user_genre')} | "
+            f"{user_profile.get('genre_preference')} - {user_profile.get('category_preference')} | "
+            f"mood {user_profile.get('user_mood')} | {user_profile.get('prediction_type')}\n"
+            f"Series: {titles}"
+        )
+
+    def _embedding_options(self) -> dict:
+        return {
+            "model": self.clients.embedding_model,
+            "dimensions": self.semantic_cache.settings.embedding_dimensions,
+        }
+
+    def _cached_response(self, context: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Cherche une réponse en cache pour le contexte.
+
+        Returns:
+            La réponse trouvée (ou None) et l'embedding du contexte lorsqu'il a été calculé.
+        """
+        cached = self.semantic_cache.get_exact(context)
+        if cached is not None:
+            return cached, None
+        try:
+            response = self.clients.client.embeddings.create(input=[context], **self._embedding_options())
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed: {e}")
+            return None, None
+        embedding = response.data[0].embedding
+        return self.semantic_cache.get_similar(embedding), embedding
+
+    async def _acached_response(self, context: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Variante asynchrone de `_cached_response`."""
+        cached = self.semantic_cache.get_exact(context)
+        if cached is not None:
+            return cached, None
+        try:
+            response = await self.clients.async_client.embeddings.create(
+                input=[context], **self._embedding_options()
+            )
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed: {e}")
+            return None, None
+        embedding = response.data[0].embedding
+        return self.semantic_cache.get_similar(embedding), embedding
+
+    def generate_global_response(self, recommended_series: List, user_profile: dict, use_cache: bool = True) -> str:
+        """
+        Génère une réponse globale personnalisée pour l'utilisateur.
+
+        Une réponse générée pour un contexte identique ou assez proche est réutilisée, sauf si
+        `use_cache` est faux. Si la génération échoue, la réponse de repli est une `FallbackResponse`.
+        """
+        print("=== DEBUT generate_global_response ===")
+        print(f"Séries recommandées: {len(recommended_series)}")
+        print(f"Profil utilisateur: {user_profile.get('user_genre')} {user_profile.get('user_age')} ans")
+        
+        context = embedding = None
+        if use_cache and self.semantic_cache is not None:
+            context = self._cache_context(recommended_series, user_profile)
+            cached, embedding = self._cached_response(context)
+            if cached is not None:
+                print(f"Réponse globale en cache: {cached}")
+                return cached
+        
+        try:
+            client, model = self.clients.client, self.clients.chat_model
+            prompt = self._build_prompt(recommended_series, user_profile)
             
             print('--------------------------------------------------------------')
             print(prompt)
@@ -108,8 +191,102 @@ Only return the response text, without JSON or additional structure.
             global_response = response.choices[0].message.content.strip()
             print(f"Réponse globale générée: {global_response}")
             
+            if embedding is not None:
+                self.semantic_cache.put(context, embedding, global_response)
+            return global_response
+            
+        except Exception as e:
+            logging.error(f"Erreur lors de la génération de la réponse globale: {e}")
+            return self._fallback_response(user_profile)
+
+    async def agenerate_global_response(self, recommended_series: List, user_profile: dict, use_cache: bool = True) -> str:
+        """
+        Variante asynchrone de `generate_global_response`, qui ne bloque pas la boucle d'événements.
+        """
+        context = embedding = None
+        if use_cache and self.semantic_cache is not None:
+            context = self._cache_context(recommended_series, user_profile)
+            cached, embedding = await self._acached_response(context)
+            if cached is not None:
+                return cached
+        
+        try:
+            client, model = self.clients.async_client, self.clients.chat_model
+            prompt = self._build_prompt(recommended_series, user_profile)
+            
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=200
+            )
+            
+            global_response = response.choices[0].message.content.strip()
+            logging.info(f"Réponse globale générée: {global_response}")
+            
+            if embedding is not None:
+                self.semantic_cache.put(context, embedding, global_response)
             return global_response
             
         except Exception as e:
             logging.error(f"Erreur lors de la génération de la réponse globale: {e}")
-            return f"Voici mes recommandations basées sur votre profil {user_profile.get('user_genre')} de {user_profile.get('user_age')} ans avec des préférences pour le {user_profile.get('category_preference')}."
\ No newline at end of file
+            return self._fallback_response(user_profile)
+
+    async def astream_global_response(
+        self,
+        recommended_series: List,
+        user_profile: dict,
+        use_cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """
+        Génère la réponse globale fragment par fragment, au fil du flux renvoyé par le LLM.
+
+        Une réponse en cache est émise en un seul fragment. La réponse de repli est émise si la
+        génération échoue avant le premier fragment.
+        """
+        context = embedding = None
+        if use_cache and self.semantic_cache is not None:
+            context = self._cache_context(recommended_series, user_profile)
+            cached, embedding = await self._acached_response(context)
+            if cached is not None:
+                yield cached
+                return
+        
+        fragments = []
+        try:
+            client, model = self.clients.async_client, self.clients.chat_model
+            prompt = self._build_prompt(recommended_series, user_profile)
+            
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=200,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    # Les espaces de tête sont retirés comme dans la réponse non streamée
+                    if not fragments:
+                        content = content.lstrip()
+                        if not content:
+                            continue
+                    fragments.append(content)
+                    yield content
+            
+        except Exception as e:
+            logging.error(f"Erreur lors du streaming de la réponse globale: {e}")
+            if not fragments:
+                yield self._fallback_response(user_profile)
+            return
+        
+        if embedding is not None and fragments:
+            self.semantic_cache.put(context, embedding, "".join(fragments).strip())
@@ -0,0 +1,114 @@
+import importlib.util
+
+import httpx
+import pytest
+from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
+
+from app.config import llm_clients
+from app.config.llm_clients import LLMClients
+from app.config.settings import AzureOpenAISettings, OpenAISettings, Settings
+
+
+def make_settings(use_azure=False, **llm):
+    return Settings(
+        use_azure=use_azure,
+        openai=OpenAISettings(api_key="openai-key", embedding_model="text-embedding-3-small", **llm),
+        azure_openai=AzureOpenAISettings(
+            api_key="azure-key",
+            azure_endpoint="https://example.openai.azure.com",
+            api_version="2024-02-01",
+            default_model="gpt-4-deployment",
+            embedding_model="embedding-deployment",
+            **llm,
+        ),
+    )
+
+
+class RecordingHttpxClient:
+    """Enregistre les options passées au client httpx sans ouvrir de connexion."""
+
+    def __init__(self, calls, base):
+        self.calls = calls
+        self.base = base
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.base(**kwargs)
+
+
+class TestClientCreation:
+    def test_clients_created_once(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            llm_clients, "DefaultHttpxClient", RecordingHttpxClient(calls, llm_clients.DefaultHttpxClient)
+        )
+        monkeypatch.setattr(
+            llm_clients, "DefaultAsyncHttpxClient", RecordingHttpxClient(calls, llm_clients.DefaultAsyncHttpxClient)
+        )
+        clients = LLMClients(make_settings())
+        assert clients.client is clients.client
+        assert clients.async_client is clients.async_client
+        # Un seul client httpx par client OpenAI : le pool keep-alive est partagé entre les appels
+        assert len(calls) == 2
+
+    def test_close_releases_the_client(self):
+        clients = LLMClients(make_settings())
+        first = clients.client
+        clients.close()
+        assert clients.client is not first
+
+    def test_openai_selection(self):
+        clients = LLMClients(make_settings())
+        assert not clients.use_azure
+        assert clients.embedding_model == "text-embedding-3-small"
+        assert type(clients.client) is OpenAI
+        assert type(clients.async_client) is AsyncOpenAI
+        assert clients.client.api_key == "openai-key"
+
+    def test_azure_selection(self):
+        clients = LLMClients(make_settings(use_azure=True))
+        assert clients.use_azure
+        assert clients.chat_model == "gpt-4-deployment"
+        assert clients.embedding_model == "embedding-deployment"
+        assert isinstance(clients.client, AzureOpenAI)
+        assert isinstance(clients.async_client, AsyncAzureOpenAI)
+        assert clients.client.api_key == "azure-key"
+        assert str(clients.client.base_url).startswith("https://example.openai.azure.com")
+
+
+class TestClientOptions:
+    def test_timeouts_from_settings(self):
+        clients = LLMClients(make_settings(connect_timeout=2.0, read_timeout=15.0, max_retries=1))
+        timeout = clients.client.timeout
+        assert isinstance(timeout, httpx.Timeout)
+        assert timeout.connect == 2.0 and timeout.read == 15.0
+        assert clients.client.max_retries == 1
+        assert clients.async_client.timeout == timeout
+
+    def test_limits_from_settings(self):
+        clients = LLMClients(make_settings(max_connections=7, max_keepalive_connections=3, keepalive_expiry=12.0))
+        limits = clients._http_options()["limits"]
+        assert limits == httpx.Limits(max_connections=7, max_keepalive_connections=3, keepalive_expiry=12.0)
+
+    def test_azure_options(self):
+        options = LLMClients(make_settings(use_azure=True))._client_options()
+        assert options["api_version"] == "2024-02-01"
+        assert options["azure_endpoint"] == "https://example.openai.azure.com"
+        assert "api_version" not in LLMClients(make_settings())._client_options()
+
+
+class TestHttp2:
+    def test_http2_follows_h2_availability(self):
+        assert llm_clients.HTTP2_AVAILABLE is (importlib.util.find_spec("h2") is not None)
+
+    @pytest.mark.skipif(importlib.util.find_spec("h2") is not None, reason="h2 est installé")
+    def test_clients_fall_back_to_http1_without_h2(self):
+        # Sans le paquet `h2`, httpx refuserait http2=True : les clients restent en HTTP/1.1
+        clients = LLMClients(make_settings())
+        assert clients._http_options()["http2"] is False
+        assert clients.client is not None
+        assert clients.async_client is not None
+
+    def test_http2_enabled_when_available(self, monkeypatch):
+        monkeypatch.setattr(llm_clients, "HTTP2_AVAILABLE", True)
+        assert LLMClients(make_settings())._http_options()["http2"] is True
@@ -0,0 +1,160 @@
+import asyncio
+from types import SimpleNamespace
+
+import psycopg
+import pytest
+
+from app.config.settings import DatabaseSettings, EmbeddingCacheSettings, VectorStoreSettings
+from app.database import async_vector_store
+from app.database.async_vector_store import AsyncVectorStore
+from app.database.embedding_cache import EmbeddingCache
+from app.database.search_results import SearchResult
+
+
+def make_async_store(calls, missing_series=True):
+    store = AsyncVectorStore.__new__(AsyncVectorStore)
+    store.vector_settings = VectorStoreSettings(table_name="volumes", series_table_name="series")
+    store.pool = object()
+    store._series_ready = True
+
+    async def search_at_level(*args):
+        level, one_per_series = args[-2:]
+        calls.append((level, one_per_series))
+        if level == "series" and missing_series:
+            raise psycopg.errors.UndefinedTable('relation "series" does not exist')
+        return [[SearchResult("id", {"serie_id": "s1"}, None, None, 0.9)]]
+
+    store._search_many_at_level = search_at_level
+    return store
+
+
+class TestSeriesLevelFallback:
+    @pytest.mark.asyncio
+    async def test_missing_series_table_falls_back_to_volume_level(self):
+        calls = []
+        store = make_async_store(calls)
+        results = await store.search_many([[1.0, 0.0]], level="series", engine="database")
+        assert results[0][0].get("serie_id") == "s1"
+        assert calls == [("series", False), ("volume", True)]
+        # La table manquante n'est plus interrogée
+        await store.search_many([[1.0, 0.0]], level="series", engine="database")
+        assert calls[2:] == [("volume", True)]
+
+    @pytest.mark.asyncio
+    async def test_volume_level_errors_are_raised(self):
+        calls = []
+        store = make_async_store(calls)
+
+        async def failing(*args):
+            raise psycopg.errors.UndefinedColumn('column "serie_id" does not exist')
+
+        store._search_many_at_level = failing
+        with pytest.raises(psycopg.errors.UndefinedColumn):
+            await store.search_many([[1.0, 0.0]], level="volume", engine="database")
+
+    @pytest.mark.asyncio
+    async def test_migrated_series_table_is_used(self):
+        calls = []
+        store = make_async_store(calls, missing_series=False)
+        await store.search_many([[1.0, 0.0]], level="series", engine="database")
+        assert calls == [("series", False)] and store._series_ready
+
+
+class FakeEmbeddings:
+    """Client d'embeddings rendant chaque lot dans le désordre, les premiers lots terminant en dernier."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def create(self, input, model, **options):
+        self.batches.append(list(input))
+        await asyncio.sleep(0.01 / len(self.batches))
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1], usage=SimpleNamespace(total_tokens=len(input)))
+
+
+def make_embedding_store(**settings):
+    store = AsyncVectorStore.__new__(AsyncVectorStore)
+    store.vector_settings = VectorStoreSettings(request_dimensions=False, **settings)
+    store.embedding_model = "model"
+    store.embedding_tokens = 0
+    store.embedding_cache = None
+    store.openai_client = SimpleNamespace(embeddings=FakeEmbeddings())
+    return store
+
+
+class TestEmbeddingBatches:
+    def test_batches_respect_size_and_token_budget(self):
+        store = make_embedding_store(embedding_batch_size=3, embedding_batch_max_tokens=10)
+        assert list(store._batch_texts(["a", "b", "c", "d"])) == [["a", "b", "c"], ["d"]]
+        # 12 caractères valent 5 tokens estimés : deux textes remplissent le budget
+        long = "x" * 12
+        assert list(store._batch_texts([long, long, long, "a"])) == [[long, long], [long, "a"]]
+        # Un texte dépassant seul le budget part dans son propre lot
+        assert list(store._batch_texts(["y" * 60, "a"])) == [["y" * 60], ["a"]]
+
+    @pytest.mark.asyncio
+    async def test_embeddings_follow_input_order(self):
+        store = make_embedding_store(embedding_batch_size=2)
+        texts = ["a", "bb", " ccc\n", "dddd", "a", "eeeee"]
+        embeddings = await store.get_embeddings(texts, use_cache=False)
+        assert embeddings == [[1.0], [2.0], [3.0], [4.0], [1.0], [5.0]]
+        # Textes normalisés et dédupliqués avant l'envoi
+        assert store.openai_client.embeddings.batches == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+        assert store.embedding_tokens == 5
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.executed = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        return SimpleNamespace(rowcount=3)
+
+
+class FakePool:
+    check_connection = None
+
+    def __init__(self, *args, **kwargs):
+        self.opened = False
+
+    async def open(self):
+        self.opened = True
+
+
+class TestPoolSetup:
+    @pytest.mark.asyncio
+    async def test_opening_the_pool_purges_the_embedding_cache(self, monkeypatch):
+        conn = RecordingConnection()
+
+        async def connect(*args, **kwargs):
+            return conn
+
+        async def check_search_tables(conn):
+            return True
+
+        monkeypatch.setattr(psycopg.AsyncConnection, "connect", connect)
+        monkeypatch.setattr(async_vector_store, "AsyncConnectionPool", FakePool)
+        store = AsyncVectorStore.__new__(AsyncVectorStore)
+        store.settings = SimpleNamespace(
+            database=DatabaseSettings(service_url="postgresql://test"),
+            embedding_cache=EmbeddingCacheSettings(enabled=True, persistent=True),
+        )
+        store.embedding_cache = EmbeddingCache(store.settings.embedding_cache)
+        store.pool = None
+        store._pool_lock = asyncio.Lock()
+        store._check_search_tables = check_search_tables
+
+        pool = await store._get_pool()
+        assert pool.opened and await store._get_pool() is pool
+        statements = [sql for sql, _ in conn.executed]
+        assert statements[-1] == "DELETE FROM embedding_cache WHERE created_at <= LOCALTIMESTAMP - %s"
+        assert conn.executed[-1][1] == (store.settings.embedding_cache.persistent_ttl,)
+        assert any("embedding_cache_created_at_idx" in sql for sql in statements)
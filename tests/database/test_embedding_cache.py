@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+
+from app.config.settings import EmbeddingCacheSettings
+from app.database.embedding_cache import EmbeddingCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(max_size=3, ttl_seconds=60):
+    clock = FakeClock()
+    settings = EmbeddingCacheSettings(
+        enabled=True, max_size=max_size, ttl=timedelta(seconds=ttl_seconds), persistent=False
+    )
+    return EmbeddingCache(settings, clock=clock), clock
+
+
+class TestEmbeddingCache:
+    def test_normalized_texts_share_a_key(self):
+        first = EmbeddingCache.normalize_text("Serie: One Piece\n Genre:  Action ")
+        second = EmbeddingCache.normalize_text("Serie: One Piece Genre: Action")
+        assert first == second
+        assert EmbeddingCache.make_key("m", 256, first) == EmbeddingCache.make_key("m", 256, second)
+        assert EmbeddingCache.make_key("m", 256, first) != EmbeddingCache.make_key("m", 512, first)
+
+    def test_hit_and_miss_counters(self):
+        cache, _ = make_cache()
+        assert cache.get("a") is None
+        cache.put("a", [1.0, 0.0], "m", 2)
+        assert cache.get("a") == [1.0, 0.0]
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_lru_eviction(self):
+        cache, _ = make_cache(max_size=2)
+        cache.put("a", [1.0], "m", 1)
+        cache.put("b", [2.0], "m", 1)
+        cache.get("a")
+        cache.put("c", [3.0], "m", 1)
+        assert cache.get("b") is None
+        assert cache.get("a") == [1.0]
+        assert cache.get("c") == [3.0]
+
+    def test_ttl_expiration(self):
+        cache, clock = make_cache(ttl_seconds=10)
+        cache.put("a", [1.0], "m", 1)
+        clock.now = 11
+        assert cache.get("a") is None
+        assert cache.stats()["memory_size"] == 0
+
+
+class RecordingPool:
+    """Pool consignant les requêtes exécutées, sans base de données."""
+
+    def __init__(self):
+        self.executed = []
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Connection:
+            def execute(self, sql, params=None):
+                pool.executed.append((" ".join(sql.split()), params))
+                return SimpleNamespace(rowcount=2, fetchall=lambda: [])
+
+        yield Connection()
+
+
+class TestPersistentExpiration:
+    def test_expired_entries_are_purged_and_ignored(self):
+        pool = RecordingPool()
+        ttl = timedelta(days=7)
+        settings = EmbeddingCacheSettings(enabled=True, persistent=True, persistent_ttl=ttl)
+        cache = EmbeddingCache(settings, pool=pool)
+        # La table est créée puis purgée à l'ouverture du cache
+        assert pool.executed[-1] == (
+            "DELETE FROM embedding_cache WHERE created_at <= LOCALTIMESTAMP - %s", (ttl,)
+        )
+        assert cache.purge_expired() == 2
+
+        assert cache.get("a") is None
+        sql, params = pool.executed[-1]
+        assert "created_at > LOCALTIMESTAMP - %s" in sql and params == (["a"], ttl)
+
+    def test_expired_entries_are_rewritten(self):
+        cache, _ = make_cache()
+        insert = " ".join(cache._insert_sql().split())
+        assert "ON CONFLICT (key) DO UPDATE" in insert
+        assert insert.endswith("WHERE embedding_cache.created_at <= LOCALTIMESTAMP - %s")
+        (row,) = cache._put_memory_many({"a": [1.0]}, "m", 1)
+        assert len(row) == insert.count("%s") and row[-1] == cache.settings.persistent_ttl
@@ -0,0 +1,163 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from app.config.settings import VectorStoreSettings
+from app.database.embedding_snapshot import (
+    CURRENT_FILE,
+    RECORDS_FILE,
+    EmbeddingSnapshot,
+    SnapshotError,
+    SnapshotReader,
+    export_snapshot,
+    write_records,
+)
+from app.database.ivf_index import IVFIndex
+from app.database.vector_store import BaseVectorStore
+
+
+class SnapshotSource(BaseVectorStore):
+    """Magasin dont `read_embeddings` rend des lignes en mémoire, comme `VectorStore.read_embeddings`."""
+
+    def __init__(self, ids, metadata, vectors, tmp_path):
+        self.vector_settings = VectorStoreSettings(
+            table_name="volumes", embedding_dimensions=vectors.shape[1], snapshot_dir=str(tmp_path)
+        )
+        self._ivf_indexes = {}
+        self._ivf_snapshot_versions = {}
+        self._snapshot_reader = None
+        self.rows = ids, metadata, vectors
+
+    def read_embeddings(self, level="volume", batch_size=10000, allocate=None):
+        ids, metadata, vectors = self.rows
+        matrix = allocate(vectors.shape)
+        matrix[...] = vectors
+        return ids, metadata, matrix
+
+
+def make_source(tmp_path, count=50, dimensions=8):
+    rng = np.random.default_rng(0)
+    ids = sorted(uuid.uuid4() for _ in range(count))
+    metadata = [{"serie_id": f"s{i % 5}", "serie_title": "Série \"][\" é", "volume_number": i} for i in range(count)]
+    vectors = rng.normal(size=(count, dimensions)).astype(np.float32)
+    return SnapshotSource(ids, metadata, vectors, tmp_path)
+
+
+class TestEmbeddingSnapshot:
+    def test_export_round_trip(self, tmp_path):
+        source = make_source(tmp_path)
+        ids, metadata, vectors = source.rows
+        version = export_snapshot(source, str(tmp_path))
+        assert (tmp_path / CURRENT_FILE).read_text().strip() == version
+
+        snapshot = EmbeddingSnapshot(tmp_path / version)
+        assert snapshot.version == version and len(snapshot) == 50 and snapshot.dimensions == 8
+        assert snapshot.header["table"] == "volumes"
+        assert isinstance(snapshot.vectors, np.memmap) and not snapshot.vectors.flags.writeable
+        # Les vecteurs sont normalisés à l'export
+        assert snapshot.normalized
+        np.testing.assert_allclose(snapshot.vectors, vectors / np.linalg.norm(vectors, axis=1, keepdims=True), rtol=1e-6)
+        assert snapshot.record(3) == (str(ids[3]), metadata[3])
+        assert snapshot.records() == ([str(row_id) for row_id in ids], metadata)
+
+        positions = snapshot.positions([ids[7], str(ids[0]), "missing", str(ids[1]) + "-longer"])
+        assert positions.tolist() == [7, 0, -1, -1]
+        embeddings, missing = snapshot.normalized_embeddings([ids[2], "missing"])
+        assert missing == ["missing"]
+        np.testing.assert_allclose(embeddings[str(ids[2])], vectors[2] / np.linalg.norm(vectors[2]), rtol=1e-6)
+
+    def test_empty_snapshot(self, tmp_path):
+        source = make_source(tmp_path)
+        source.rows = [], [], np.empty((0, 8), dtype=np.float32)
+        snapshot = EmbeddingSnapshot(tmp_path / export_snapshot(source, str(tmp_path)))
+        assert len(snapshot) == 0 and snapshot.records() == ([], [])
+        assert snapshot.positions(["x"]).tolist() == [-1]
+
+    def test_invalid_records(self, tmp_path):
+        source = make_source(tmp_path)
+        path = tmp_path / export_snapshot(source, str(tmp_path))
+        data = bytearray((path / RECORDS_FILE).read_bytes())
+        data[:8] = b"NOTSNAPS"
+        (path / RECORDS_FILE).write_bytes(bytes(data))
+        with pytest.raises(SnapshotError):
+            EmbeddingSnapshot(path)
+
+    def test_reader_swaps_versions(self, tmp_path):
+        reader = SnapshotReader(str(tmp_path), check_interval=0)
+        assert reader.current() is None
+        source = make_source(tmp_path)
+        first = export_snapshot(source, str(tmp_path), keep=1)
+        snapshot = reader.current()
+        assert snapshot.version == first
+
+        source.rows = source.rows[0][:10], source.rows[1][:10], source.rows[2][:10]
+        second = export_snapshot(source, str(tmp_path), keep=1)
+        assert second != first and not (tmp_path / first).exists()
+        # La version supprimée reste lisible par ceux qui la projettent encore
+        assert len(snapshot.records()[0]) == 50
+        assert reader.current().version == second and len(reader.current()) == 10
+
+        # Une version illisible laisse la précédente en place
+        (tmp_path / CURRENT_FILE).write_text("unknown\n")
+        assert reader.current().version == second
+
+    def test_ivf_index_from_snapshot(self, tmp_path):
+        source = make_source(tmp_path)
+        ids, _, vectors = source.rows
+        source.vector_settings = source.vector_settings.model_copy(update={"snapshot_check_interval": 0})
+        version = export_snapshot(source, str(tmp_path))
+
+        snapshot = source._current_snapshot("volume")
+        assert snapshot.version == version and source._current_snapshot("series") is None
+        index = IVFIndex(source._metadata_columns()).build(*source._snapshot_rows(snapshot))
+        source._set_ivf_index("volume", index, snapshot.version)
+        assert source._fresh_ivf_index("volume") is index
+        assert index.search(vectors[4], 1, nprobe=len(index.centroids))[0][0][0] == str(ids[4])
+
+        embeddings, missing = source._rescore_embeddings("volume", [ids[1], "new"])
+        assert list(embeddings) == [str(ids[1])] and missing == ["new"]
+
+        # Un nouvel export périme l'index construit depuis l'ancienne version
+        export_snapshot(source, str(tmp_path))
+        assert source._fresh_ivf_index("volume") is None
+
+    def test_ivf_index_shares_snapshot_pages(self, tmp_path):
+        source = make_source(tmp_path)
+        ids, metadata, vectors = source.rows
+        snapshot = EmbeddingSnapshot(tmp_path / export_snapshot(source, str(tmp_path)))
+
+        # Sans quantification, l'index garde une vue sur le mmap au lieu d'une copie par worker
+        index = IVFIndex(source._metadata_columns()).build(*source._snapshot_rows(snapshot), normalized=True)
+        assert np.shares_memory(index._vectors, snapshot.vectors)
+        assert index.search(vectors[4], 1, nprobe=len(index.centroids))[0][0][0] == str(ids[4])
+
+        # Une écriture bascule sur une copie privée, l'instantané restant en lecture seule
+        index.upsert([ids[4]], [metadata[4]], -vectors[4:5])
+        assert not np.shares_memory(index._vectors, snapshot.vectors)
+        assert index.search(-vectors[4], 1, nprobe=len(index.centroids))[0][0][0] == ids[4]
+        assert len(index) == len(ids)
+
+        quantized = IVFIndex(source._metadata_columns(), quantization="int8").build(
+            *source._snapshot_rows(snapshot), normalized=True
+        )
+        assert not np.shares_memory(quantized._vectors, snapshot.vectors)
+
+    def test_snapshot_of_another_level_or_dimension_is_ignored(self, tmp_path):
+        source = make_source(tmp_path)
+        source.vector_settings = source.vector_settings.model_copy(update={"snapshot_check_interval": 0})
+        ids, metadata, _ = source.rows
+        version = export_snapshot(source, str(tmp_path))
+        assert source._current_snapshot("volume").version == version
+
+        # Un instantané des séries écrit dans le même dossier n'est pas pris pour celui des volumes
+        series = export_snapshot(source, str(tmp_path))
+        write_records(
+            tmp_path / series / RECORDS_FILE, series, ids, metadata,
+            {"table": "series_embeddings", "level": "series", "dimensions": 8},
+        )
+        assert source._current_snapshot("volume").version == version
+
+        # Un magasin configuré pour une autre dimension n'utilise pas l'instantané
+        source.vector_settings = source.vector_settings.model_copy(update={"embedding_dimensions": 16})
+        assert source._current_snapshot("volume") is None
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.database.ivf_index import IVFIndex, UnsupportedFilterError
+from app.database.vector_store import METADATA_COLUMNS
+
+
+def make_rows(count=600, dimensions=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimensions)).astype(np.float32)
+    ids = [f"v{i}" for i in range(count)]
+    metadata = [
+        {"serie_id": f"s{i % 50}", "genre": "shonen" if i % 3 else "seinen", "volume_number": i % 10}
+        for i in range(count)
+    ]
+    return ids, metadata, vectors
+
+
+def brute_force(vectors, query, k, mask=None):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    return list(np.argsort(-scores, kind="stable")[:k])
+
+
+class TestIVFIndex:
+    def test_full_probe_matches_brute_force(self):
+        ids, metadata, vectors = make_rows()
+        index = IVFIndex(METADATA_COLUMNS).build(ids, metadata, vectors)
+        assert len(index) == len(ids) and len(index.centroids) == int(np.sqrt(len(ids)))
+        queries = np.random.default_rng(1).normal(size=(5, 16)).astype(np.float32)
+        results = index.search(queries, 10, nprobe=len(index.centroids))
+        for query, ranked in zip(queries, results):
+            assert [row_id for row_id, _, _ in ranked] == [ids[i] for i in brute_force(vectors, query, 10)]
+            similarities = [similarity for _, _, similarity in ranked]
+            assert similarities == sorted(similarities, reverse=True)
+
+    def test_partial_probe_recall(self):
+        ids, metadata, vectors = make_rows(count=2000)
+        index = IVFIndex(METADATA_COLUMNS).build(ids, metadata, vectors)
+        # Des requêtes proches de lignes existantes, comme les vecteurs de goût
+        queries = vectors[:20] + np.random.default_rng(2).normal(scale=0.1, size=(20, 16)).astype(np.float32)
+        found = 0
+        for query, ranked in zip(queries, index.search(queries, 10, nprobe=8)):
+            expected = {ids[i] for i in brute_force(vectors, query, 10)}
+            found += len(expected & {row_id for row_id, _, _ in ranked})
+        assert found / 200 >= 0.9
+
+    def test_filters_and_exclusion(self):
+        ids, metadata, vectors = make_rows()
+        metadata[0] = {"genre": "seinen"}
+        index = IVFIndex(METADATA_COLUMNS).build(ids, metadata, vectors)
+        query = vectors[0]
+        ranked = index.search(query, 20, nprobe=1, metadata_filter={"genre": "seinen", "volume_number": "3"})[0]
+        assert ranked and all(m["genre"] == "seinen" and m["volume_number"] == 3 for _, m, _ in ranked)
+        ranked = index.search(query, 5, nprobe=1, metadata_filter=[{"serie_id": "s1"}, {"serie_id": "s2"}])[0]
+        assert len(ranked) == 5 and {m["serie_id"] for _, m, _ in ranked} <= {"s1", "s2"}
+        # Comme en SQL, l'exclusion écarte aussi les lignes sans serie_id
+        ranked = index.search(query, 50, nprobe=1, exclude_series_ids=["s1", "unknown"])[0]
+        assert len(ranked) == 50
+        assert all(m.get("serie_id") not in (None, "s1") for _, m, _ in ranked)
+        with pytest.raises(UnsupportedFilterError):
+            index.search(query, 5, nprobe=1, metadata_filter={"author": "x"})
+        with pytest.raises(UnsupportedFilterError):
+            index.search(query, 5, nprobe=1, metadata_filter={"genre": ["seinen"]})
+
+    def test_one_per_series(self):
+        ids, metadata, vectors = make_rows()
+        index = IVFIndex(METADATA_COLUMNS).build(ids, metadata, vectors)
+        ranked = index.search(vectors[0], 30, nprobe=2, one_per_series=True)[0]
+        assert len(ranked) == 30
+        assert len({m["serie_id"] for _, m, _ in ranked}) == 30
+
+    def test_upsert_and_remove(self):
+        ids, metadata, vectors = make_rows()
+        index = IVFIndex(METADATA_COLUMNS).build(ids[:400], metadata[:400], vectors[:400])
+        index.upsert(ids[400:], metadata[400:], vectors[400:])
+        assert len(index) == 600
+        assert index.search(vectors[500], 1, nprobe=2)[0][0][0] == "v500"
+
+        # Un upsert remplace la ligne existante
+        index.upsert(["v0"], [{"serie_id": "s0"}], vectors[1:2])
+        assert len(index) == 600
+        assert {row_id for row_id, _, _ in index.search(vectors[1], 2, nprobe=2)[0]} == {"v0", "v1"}
+
+        assert index.remove(ids[:350] + ["missing"]) == 350
+        assert len(index) == 250 and sorted(index.ids()) == sorted(ids[350:])
+        ranked = index.search(vectors[0], 10, nprobe=len(index.centroids))[0]
+        assert all(row_id not in ids[:350] for row_id, _, _ in ranked)
+        assert index.search(vectors[360], 1, nprobe=2)[0][0][0] == "v360"
+
+    def test_empty_index(self):
+        index = IVFIndex(METADATA_COLUMNS)
+        with pytest.raises(ValueError):
+            index.upsert(["v0"], [{}], np.ones((1, 4)))
+        index.build([], [], np.empty((0, 4)))
+        assert index.search(np.ones(4), 5, nprobe=1) == [[]]
+        ids, metadata, vectors = make_rows(count=100, dimensions=4)
+        index.upsert(ids, metadata, vectors)
+        assert len(index) == 100 and len(index.centroids) == 10
+
+    def test_concurrent_first_upserts_build_once(self, monkeypatch):
+        ids, metadata, vectors = make_rows(count=200, dimensions=4)
+        index = IVFIndex(METADATA_COLUMNS).build([], [], np.empty((0, 4)))
+        train = index._train
+
+        def slow_train(matrix):
+            time.sleep(0.05)
+            return train(matrix)
+
+        monkeypatch.setattr(index, "_train", slow_train)
+        threads = [
+            threading.Thread(target=index.upsert, args=(ids[i:i + 100], metadata[i:i + 100], vectors[i:i + 100]))
+            for i in (0, 100)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Le second lot est ajouté à l'index entraîné sur le premier au lieu de le remplacer
+        assert len(index) == 200 and sorted(index.ids()) == sorted(ids)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from timescale_vector.client import Predicates
+
+from app.database.predicates import PredicateCompiler
+from app.database.vector_store import METADATA_COLUMNS
+
+
+def compile_predicates(predicates):
+    params = []
+    return PredicateCompiler(METADATA_COLUMNS).compile(predicates, params), params
+
+
+class TestPredicateCompiler:
+    def test_compound_predicates(self):
+        predicates = Predicates("genre", "==", "Manga") & (
+            Predicates("volume_number", ">", 1) | Predicates("serie_title", "==", "008 Apprenti espion")
+        )
+        sql, params = compile_predicates(predicates)
+        assert sql == "(genre = %s) AND ((volume_number > %s) OR (serie_title = %s))"
+        assert params == ["Manga", 1, "008 Apprenti espion"]
+
+    def test_not(self):
+        sql, params = compile_predicates(~Predicates("genre", "==", "Manga"))
+        assert sql == "TRUE IS DISTINCT FROM ((genre = %s))"
+        assert params == ["Manga"]
+
+    def test_in_lists(self):
+        sql, params = compile_predicates(Predicates("volume_number", "in", ["1", 2]))
+        assert sql == "volume_number = ANY(%s)"
+        assert params == [[1, 2]]
+        sql, _ = compile_predicates(Predicates("serie_id", "!=", ("a", "b")))
+        assert sql == "serie_id <> ALL(%s)"
+        sql, _ = compile_predicates(Predicates("genre", "in", []))
+        assert sql == "FALSE"
+
+    def test_unpromoted_fields_are_typed_by_value(self):
+        sql, params = compile_predicates(
+            Predicates(("editor", "Kana"), ("pages", ">=", 200), ("published", "<", datetime(2024, 1, 1)))
+        )
+        assert sql == (
+            "((metadata @> %s) AND metadata ->> %s = %s)"
+            " AND (jsonb_typeof(metadata -> %s) = 'number' AND metadata -> %s >= %s)"
+            " AND (metadata ->> %s)::timestamptz < %s"
+        )
+        assert params[0].obj == {"editor": "Kana"} and params[1:3] == ["editor", "Kana"]
+        assert params[5].obj == 200
+
+    def test_unpromoted_equality_compares_text(self):
+        # "3" et 3 désignent la même valeur, quel que soit le type JSON stocké ; l'inclusion JSON
+        # de chaque écriture sert l'index GIN
+        for value in ("3", 3):
+            sql, params = compile_predicates(Predicates("tome", "==", value))
+            assert sql == "((metadata @> %s OR metadata @> %s) AND metadata ->> %s = %s)"
+            assert [param.obj for param in params[:2]] == [{"tome": "3"}, {"tome": 3}]
+            assert params[2:] == ["tome", "3"]
+        sql, params = compile_predicates(Predicates("tome", "in", [3, "4", True]))
+        assert sql == (
+            "((metadata @> %s OR metadata @> %s OR metadata @> %s OR metadata @> %s"
+            " OR metadata @> %s OR metadata @> %s) AND metadata ->> %s = ANY(%s))"
+        )
+        assert [param.obj["tome"] for param in params[:6]] == ["3", 3, "4", 4, "true", True]
+        assert params[6:] == ["tome", ["3", "4", "true"]]
+        sql, params = compile_predicates(Predicates("tome", "!=", 3))
+        assert sql == "metadata ->> %s <> %s" and params == ["tome", "3"]
+        sql, params = compile_predicates(Predicates("editor", "==", "Kana"))
+        assert len(params) == 3
+
+    def test_invalid_operator(self):
+        with pytest.raises(ValueError):
+            compile_predicates(Predicates("genre", "~", "Manga"))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.database.ivf_index import IVFIndex
+from app.database.quantization import (
+    BinaryQuantizer,
+    ScalarQuantizer,
+    make_quantizer,
+    quantization_report,
+)
+from app.database.vector_store import METADATA_COLUMNS, BaseVectorStore
+
+
+def clustered(count, dimensions=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dimensions))
+    vectors = centers[rng.integers(0, 20, count)] + rng.normal(scale=0.5, size=(count, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+class TestQuantization:
+    def test_int8_scores_approximate_dot_products(self):
+        vectors = clustered(500)
+        quantizer = ScalarQuantizer().fit(vectors)
+        codes = quantizer.encode(vectors)
+        assert codes.dtype == np.int8 and codes.nbytes * 4 == vectors.nbytes
+        query = vectors[0]
+        np.testing.assert_allclose(quantizer.scores(codes, query), vectors @ query, atol=0.02)
+
+    def test_binary_scores_follow_hamming_distance(self, monkeypatch):
+        vectors = clustered(300)
+        quantizer = BinaryQuantizer().fit(vectors)
+        codes = quantizer.encode(vectors)
+        assert codes.shape == (300, 8) and codes.dtype == np.uint8
+        scores = quantizer.scores(codes, vectors[0])
+        assert scores[0] == 1.0 and scores.min() >= -1.0
+        # Même résultat sans `np.bitwise_count` (NumPy < 2.0)
+        monkeypatch.delattr(np, "bitwise_count", raising=False)
+        np.testing.assert_array_equal(quantizer.scores(codes, vectors[0]), scores)
+
+    def test_unknown_mode(self):
+        assert make_quantizer("none") is None
+        with pytest.raises(ValueError):
+            make_quantizer("pq")
+
+    def test_report(self):
+        vectors = clustered(1000)
+        report = quantization_report(vectors[100:], vectors[:100], k=5, rescore_factors=(1, 10))
+        rows = {(row["mode"], row["rescore_factor"]): row for row in report}
+        assert set(rows) == {("none", 1), ("int8", 1), ("int8", 10), ("binary", 1), ("binary", 10)}
+        assert rows["none", 1]["recall"] == 1.0
+        assert rows["binary", 1]["compression"] == 32 and rows["int8", 1]["compression"] == 4
+        assert rows["binary", 10]["recall"] >= rows["binary", 1]["recall"]
+        assert rows["int8", 10]["recall"] >= 0.95
+
+    @pytest.mark.parametrize("mode", ["int8", "binary"])
+    def test_quantized_ivf_index_with_rescoring(self, mode):
+        vectors = clustered(2000)
+        ids = [f"v{i}" for i in range(len(vectors))]
+        metadata = [{"serie_id": f"s{i % 100}"} for i in range(len(vectors))]
+        index = IVFIndex(METADATA_COLUMNS, quantization=mode).build(ids, metadata, vectors)
+        assert index.quantized and index.memory_usage() <= vectors.nbytes // 4
+        index.upsert(["extra"], [{"serie_id": "s0"}], vectors[:1])
+
+        queries = vectors[:10]
+        candidates = index.search(queries, 10 * 10, nprobe=len(index.centroids))
+        embeddings = {row_id: vector for row_id, vector in zip(ids, vectors)}
+        results = BaseVectorStore._ivf_results(candidates, queries, 10, embeddings)
+        found = 0
+        for query, ranked in zip(queries, results):
+            assert len(ranked) == 10 and ranked[0].contents is None
+            similarities = [result.similarity for result in ranked]
+            assert similarities == sorted(similarities, reverse=True)
+            # Le candidat "extra" n'a pas d'embedding : il est écarté
+            assert "extra" not in [result.id for result in ranked]
+            expected = {ids[i] for i in np.argsort(-(vectors @ query))[:10]}
+            found += len(expected & {result.id for result in ranked})
+        assert found / 100 >= 0.9
@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.database.reranker import EmbeddingMatrix, top_k_indices
+
+
+rng = np.random.default_rng(42)
+candidates = rng.normal(size=(500, 32)).astype(np.float32)
+queries = rng.normal(size=(4, 32)).astype(np.float32)
+
+
+def brute_force_top_k(query, k):
+    similarities = [
+        float(np.dot(query, row) / (np.linalg.norm(query) * np.linalg.norm(row)))
+        for row in candidates
+    ]
+    return sorted(range(len(similarities)), key=lambda i: similarities[i], reverse=True)[:k]
+
+
+class TestEmbeddingMatrix:
+    def test_top_k_matches_brute_force(self):
+        matrix = EmbeddingMatrix(candidates)
+        indices, scores = matrix.top_k(queries, 10)
+        assert indices.shape == (4, 10)
+        for query, row_indices in zip(queries, indices):
+            assert list(row_indices) == brute_force_top_k(query, 10)
+        assert np.all(np.diff(scores, axis=1) <= 0)
+
+    def test_single_query_vector(self):
+        matrix = EmbeddingMatrix(candidates)
+        indices, scores = matrix.top_k(candidates[7].tolist(), 1)
+        assert indices[0, 0] == 7
+        assert abs(scores[0, 0] - 1.0) < 1e-5
+
+    def test_k_larger_than_candidates(self):
+        matrix = EmbeddingMatrix(candidates[:3])
+        indices, _ = matrix.top_k(queries, 10)
+        assert indices.shape == (4, 3)
+
+    def test_empty_candidates(self):
+        matrix = EmbeddingMatrix([])
+        indices, scores = matrix.top_k(queries, 5)
+        assert indices.shape == (4, 0)
+        assert scores.shape == (4, 0)
+
+    def test_rank_appends_similarity_to_rows(self):
+        rows = [(f"id-{i}", {}, f"content-{i}", candidates[i]) for i in range(len(candidates))]
+        ranked = EmbeddingMatrix.from_rows(rows).rank(rows, queries[:2], 3)
+        assert len(ranked) == 2
+        assert all(len(row) == 5 for row in ranked[0])
+        assert ranked[0][0][4] >= ranked[0][1][4]
+
+    def test_top_k_indices_sorted(self):
+        scores = np.array([[0.1, 0.9, 0.5, 0.7]])
+        assert top_k_indices(scores, 2).tolist() == [[1, 3]]
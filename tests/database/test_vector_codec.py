@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from pgvector import Vector
+
+from app.database.vector_codec import NumpyVectorDumper, decode_vectors
+
+
+def dump(vector):
+    return NumpyVectorDumper(np.ndarray).dump(vector)
+
+
+class TestVectorCodec:
+    def test_dump_matches_pgvector_binary_format(self):
+        vector = np.array([1.5, -2.0, 0.25], dtype=np.float32)
+        assert dump(vector) == Vector(vector).to_binary()
+        assert dump(Vector([1.0, 2.0])) == Vector([1.0, 2.0]).to_binary()
+        with pytest.raises(ValueError):
+            dump(np.ones((2, 2)))
+
+    def test_decode_round_trip(self):
+        matrix = np.random.default_rng(0).normal(size=(4, 5)).astype(np.float32)
+        decoded = decode_vectors([dump(row) for row in matrix])
+        assert decoded.dtype == np.float32 and decoded.flags.c_contiguous
+        np.testing.assert_array_equal(decoded, matrix)
+
+    def test_decode_into_preallocated_buffer(self):
+        matrix = np.arange(6, dtype=np.float32).reshape(3, 2)
+        out = np.zeros((4, 2), dtype=np.float32)
+        decode_vectors([dump(row) for row in matrix], out=out[1:])
+        np.testing.assert_array_equal(out[1:], matrix)
+        with pytest.raises(ValueError):
+            decode_vectors([dump(row) for row in matrix], out=out)
+
+    def test_decode_halfvec(self):
+        values = np.array([0.5, -1.0, 2.0], dtype=">f2")
+        data = b"\x00\x03\x00\x00" + values.tobytes()
+        np.testing.assert_array_equal(decode_vectors([data], "halfvec"), [[0.5, -1.0, 2.0]])
+
+    def test_mixed_dimensions(self):
+        with pytest.raises(ValueError):
+            decode_vectors([dump(np.ones(2)), dump(np.ones(3))])
+        assert decode_vectors([]).shape == (0, 0)
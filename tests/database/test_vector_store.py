@@ -0,0 +1,325 @@
+import uuid
+from contextlib import contextmanager, nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.config.settings import DatabaseSettings, VectorStoreSettings
+from app.database import vector_store
+from app.database.vector_store import BaseVectorStore, VectorStore
+
+
+class TestUpsertColumns:
+    def test_dataframe_records(self):
+        record_id = str(uuid.uuid4())
+        df = pd.DataFrame([{"id": record_id, "metadata": {"a": 1}, "contents": "x", "embedding": [1.0, 2.0]}])
+        ids, metadata, contents, embeddings = BaseVectorStore._upsert_columns(df)
+        assert ids == [uuid.UUID(record_id)]
+        assert metadata == [{"a": 1}]
+        assert contents == ["x"]
+        assert embeddings.dtype == np.float32 and embeddings.shape == (1, 2)
+
+    def test_numpy_columns(self):
+        records = {
+            "id": [uuid.uuid4(), uuid.uuid4()],
+            "metadata": ['{"a": 1}', {"a": 2}],
+            "contents": np.array(["x", "y"]),
+            "embedding": np.ones((2, 3)),
+        }
+        _, metadata, _, embeddings = BaseVectorStore._upsert_columns(records)
+        assert metadata == [{"a": 1}, {"a": 2}]
+        assert embeddings.shape == (2, 3)
+
+    def test_mismatched_lengths(self):
+        records = {"id": [uuid.uuid4()], "metadata": [{}], "contents": ["x", "y"], "embedding": np.ones((1, 3))}
+        with pytest.raises(ValueError):
+            BaseVectorStore._upsert_columns(records)
+
+
+def make_base_store():
+    store = BaseVectorStore.__new__(BaseVectorStore)
+    store.vector_settings = VectorStoreSettings(table_name="volumes", series_table_name="series")
+    return store
+
+
+class TestSearchLevel:
+    def test_search_table(self):
+        store = make_base_store()
+        assert "FROM volumes" in store._candidates_sql("")
+        assert "FROM series" in store._candidates_sql("", level="series")
+        assert "FROM series WHERE" in store._search_many_sql(2, " WHERE true", level="series")
+        with pytest.raises(ValueError):
+            store._search_table("volumes")
+
+    def test_refresh_series_scope(self):
+        store = make_base_store()
+        delete_sql, upsert_sql = store._refresh_series_sql()
+        assert "id = ANY(%s)" in delete_sql
+        assert "serie_id = ANY(%s)" in upsert_sql
+        assert all("%s" not in sql for sql in store._refresh_series_sql(all_series=True))
+
+
+class TestWhereClause:
+    def test_promoted_fields_target_columns(self):
+        where, params = make_base_store()._build_where_clause({"serie_id": 12, "volume_number": "3"})
+        assert where == " WHERE ((serie_id = %s AND volume_number = %s))"
+        assert params == ["12", 3]
+
+    def test_other_fields_compare_metadata_text(self):
+        where, params = make_base_store()._build_where_clause([{"genre": "Action"}, {"tome": 3}])
+        assert where == " WHERE ((genre = %s) OR (((metadata @> %s OR metadata @> %s) AND metadata ->> %s = %s)))"
+        assert params[0] == "Action" and params[3:] == ["tome", "3"]
+
+    def test_series_level_columns(self):
+        where, _ = make_base_store()._build_where_clause({"serie_id": "s1", "volume_id": "v1"}, level="series")
+        assert where == " WHERE ((id = %s AND ((metadata @> %s) AND metadata ->> %s = %s)))"
+
+
+def make_database_store(executed, embedding_dimensions, rows, bound=None):
+    """
+    VectorStore dont le pool consigne les requêtes (et dans `bound` leurs paramètres) et rend
+    toujours les mêmes lignes.
+    """
+    store = VectorStore.__new__(VectorStore)
+    store.vector_settings = VectorStoreSettings(
+        table_name="volumes", series_table_name="series", embedding_dimensions=embedding_dimensions
+    )
+    store.settings = SimpleNamespace(database=SimpleNamespace(prepare_statements=False))
+    store._hnsw_indexes = {}
+
+    class Connection:
+        def execute(self, sql, params=None, prepare=None):
+            executed.append(sql)
+            if bound is not None:
+                bound.append(params)
+            return SimpleNamespace(fetchall=lambda: rows, fetchone=lambda: (True,))
+
+        def transaction(self):
+            return nullcontext()
+
+    @contextmanager
+    def connection():
+        yield Connection()
+
+    store.pool = SimpleNamespace(connection=connection)
+    return store
+
+
+class TestSeriesDeduplication:
+    def test_exclude_series_ids(self):
+        where, params = make_base_store()._build_where_clause(exclude_series_ids=["s1", 2])
+        assert where == " WHERE serie_id <> ALL(%s)"
+        assert params == [["s1", "2"]]
+        where, _ = make_base_store()._build_where_clause(exclude_series_ids=["s1"], level="series")
+        assert where == " WHERE id <> ALL(%s)"
+
+    def test_one_per_series_sql(self):
+        store = make_base_store()
+        assert "DISTINCT ON (serie_id)" in store._search_many_sql(1, "", one_per_series=True)
+        assert "DISTINCT ON" not in store._search_many_sql(1, "", level="series", one_per_series=True)
+        assert store._search_limits(10, 40, True, "volume") == [40, 10]
+        assert store._search_limits(10, 160, False, "volume") == [10]
+
+    def test_adaptive_overfetch(self):
+        store = make_base_store()
+        short, full = [[("row",)] * 3], [[("row",)] * 10]
+        assert store._next_candidates(full, 10, 40, adaptive=True) is None
+        assert store._next_candidates(short, 10, 10, adaptive=False) is None
+        assert store._next_candidates(short, 10, 10, adaptive=True) == 160
+        assert store._next_candidates(short, 10, 640, adaptive=True) == 1000
+        assert store._next_candidates(short, 10, 1000, adaptive=True) is None
+
+    def test_short_pool_is_not_widened(self):
+        store = make_base_store()
+        short = [[("row",)] * 3, [("row",)] * 10]
+        # La première requête n'a classé que 25 candidats sur 40 : la table est épuisée
+        assert store._next_candidates(short, 10, 40, adaptive=True, ranked_counts=[25, 40]) is None
+        assert store._next_candidates(short, 10, 40, adaptive=True, ranked_counts=[40, 40]) == 160
+        rows = [(0, "a", {}, None, None, 0.1, 25), (1, "b", {}, None, None, 0.2, 40)]
+        assert store._ranked_counts(rows, 3, "", True, "volume") == [25, 40, 0]
+        assert store._ranked_counts(rows, 3, " WHERE genre = %s", True, "volume") is None
+        assert store._ranked_counts(rows, 3, "", False, "volume") is None
+
+    def test_short_exact_result_stops_after_one_query(self):
+        executed = []
+        store = make_database_store(executed, embedding_dimensions=3072, rows=[(0, "a", {}, None, None, 0.1)])
+        results = store._search_many_database([[1.0] * 3072], 10, " WHERE genre = %s", ["seinen"])
+        assert [result.id for result in results[0]] == ["a"]
+        # Sans index HNSW (3072 dimensions en vector), le parcours exact a tout rendu
+        assert len(executed) == 1 and "LATERAL" in executed[0]
+
+    def test_short_hnsw_result_is_retried(self):
+        executed = []
+        store = make_database_store(executed, embedding_dimensions=16, rows=[(0, "a", {}, None, None, 0.1)])
+        store._search_many_database([[1.0] * 16], 10, " WHERE genre = %s", ["seinen"])
+        searches = [sql for sql in executed if "LATERAL" in sql]
+        assert len(searches) == 4 and sum("pg_am" in sql for sql in executed) == 1
+        assert [sql for sql in executed if "set_config" in sql] == ["SELECT set_config('hnsw.ef_search', %s, true)"] * 3
+
+        # Sans index HNSW créé, le parcours est exact
+        executed.clear()
+        store._hnsw_indexes = {"volumes": False}
+        store._search_many_database([[1.0] * 16], 10, " WHERE genre = %s", ["seinen"])
+        assert len(executed) == 1
+
+    def test_python_engine_keeps_best_volume_per_series(self):
+        results = [
+            ("a", {"serie_id": "s1"}, "", None, 0.9),
+            ("b", {"serie_id": "s1"}, "", None, 0.8),
+            ("c", {"serie_id": "s2"}, "", None, 0.7),
+        ]
+        assert [row[0] for row in BaseVectorStore._one_per_series(results, 5)] == ["a", "c"]
+
+
+class TestSearchSql:
+    def test_top_k_is_ranked_in_database(self):
+        store = make_base_store()
+        sql = " ".join(store._search_many_sql(1, " WHERE genre = %s").split())
+        assert "FROM (VALUES (0, %s::vector)) AS q(query_index, query_embedding) CROSS JOIN LATERAL" in sql
+        assert "embedding <=> q.query_embedding AS distance FROM volumes WHERE genre = %s" in sql
+        assert "ORDER BY distance LIMIT %s" in sql
+        assert sql.endswith("ORDER BY q.query_index, r.distance")
+
+    def test_one_lateral_subquery_per_batch(self):
+        store = make_base_store()
+        store.vector_settings = store.vector_settings.model_copy(update={"vector_type": "halfvec"})
+        sql = store._search_many_sql(3, " WHERE genre = %s", level="series")
+        assert "VALUES (0, %s::halfvec), (1, %s::halfvec), (2, %s::halfvec)" in sql
+        assert sql.count("LATERAL") == 1 and "FROM series WHERE genre = %s" in sql
+        # Vecteurs de requête, paramètres du filtre puis limite
+        assert sql.count("%s") == 3 + 1 + 1
+        sql = store._search_many_sql(3, " WHERE genre = %s", one_per_series=True)
+        assert sql.count("%s") == 3 + 1 + len(store._search_limits(10, 40, True, "volume"))
+
+    def test_parameters_follow_placeholders(self):
+        executed, bound = [], []
+        rows = [(1, "b", {}, None, None, 0.5), (0, "a", {}, None, None, 0.25)]
+        store = make_database_store(executed, embedding_dimensions=3072, rows=rows, bound=bound)
+        results = store._search_many_database([[1.0] * 3072, [0.0] * 3072], 5, " WHERE genre = %s", ["seinen"])
+        (params,) = bound
+        assert executed[0].count("%s") == len(params)
+        assert [vector.dtype for vector in params[:2]] == [np.float32, np.float32] and params[1][0] == 0.0
+        assert params[2:] == ["seinen", 5]
+        assert [[result.id for result in query_results] for query_results in results] == [["a"], ["b"]]
+
+
+class TestSearchResults:
+    def test_projection_skips_unrequested_columns(self):
+        store = make_base_store()
+        sql = store._search_many_sql(1, "", columns=())
+        assert "SELECT id, metadata, NULL AS contents, NULL AS embedding" in sql
+        assert "SELECT id, metadata, contents, embedding" in store._search_many_sql(1, "")
+        assert store._candidates_sql("", columns=()).startswith("SELECT id, metadata, NULL AS contents, embedding")
+        with pytest.raises(ValueError):
+            store._search_many_sql(1, "", columns=("vector",))
+
+    def test_rows_become_search_results(self):
+        rows = [(0, "a", {"serie_id": "s1"}, None, None, 0.25), (1, "b", {}, "x", None, 0.5)]
+        grouped = BaseVectorStore._group_search_rows(rows, 2)
+        assert grouped[0][0].similarity == 0.75 and grouped[0][0].get("serie_id") == "s1"
+        assert grouped[1][0][0] == "b" and grouped[1][0].contents == "x"
+
+    def test_python_engine_drops_embedding_unless_requested(self):
+        rows = [("a", {"serie_id": "s1"}, "x", [1.0, 0.0]), ("b", {"serie_id": "s2"}, "y", [0.0, 1.0])]
+        store = make_base_store()
+        (results,) = store._rank_candidates(rows, [[1.0, 0.0]], 1, columns=("contents",))
+        assert [(r.id, r.contents, r.embedding) for r in results] == [("a", "x", None)]
+        (results,) = store._rank_candidates(rows, [[1.0, 0.0]], 1)
+        assert results[0].embedding == [1.0, 0.0]
+
+
+class TestStorageMigration:
+    def test_parse_column_type(self):
+        assert VectorStore._parse_column_type("vector(3072)") == ("vector", 3072)
+        assert VectorStore._parse_column_type("halfvec(1536)") == ("halfvec", 1536)
+        # Colonne créée sans dimension : à migrer vers le type configuré
+        assert VectorStore._parse_column_type("vector") == ("vector", None)
+        with pytest.raises(ValueError):
+            VectorStore._parse_column_type("bytea")
+
+    def test_migration_using(self):
+        assert VectorStore._migration_using(3072, 3072, "halfvec(3072)") == "embedding::halfvec(3072)"
+        assert VectorStore._migration_using(None, 1536, "vector(1536)") == "embedding::vector(1536)"
+        assert VectorStore._migration_using(3072, 1536, "halfvec(1536)") == (
+            "l2_normalize(subvector(embedding, 1, 1536))::halfvec(1536)"
+        )
+        with pytest.raises(ValueError):
+            VectorStore._migration_using(1536, 3072, "vector(3072)")
+
+
+def make_pool_settings(**database):
+    database = DatabaseSettings(service_url="postgresql://localhost/test", **database)
+    return SimpleNamespace(
+        database=database,
+        vector_store=VectorStoreSettings(),
+        embedding_cache=SimpleNamespace(enabled=False),
+    )
+
+
+class StatsPool:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+class TestConnectionPool:
+    def test_pool_options(self):
+        store = make_base_store()
+        store.settings = make_pool_settings(pool_min_size=2, pool_max_size=8, pool_timeout=5, pool_max_idle=60)
+        options = store._pool_options()
+        assert (options["min_size"], options["max_size"]) == (2, 8)
+        assert options["timeout"] == 5 and options["max_idle"] == 60
+        assert options["kwargs"] == {"autocommit": True, "prepare_threshold": 5}
+
+    def test_prepared_statements_disabled(self):
+        store = make_base_store()
+        store.settings = make_pool_settings(prepare_statements=False)
+        # Derrière un PgBouncer en mode transaction, aucune requête n'est préparée
+        assert store._pool_options()["kwargs"]["prepare_threshold"] is None
+
+    def test_pool_checks_connections(self, monkeypatch):
+        created, executed = [], []
+
+        @contextmanager
+        def fake_connect(conninfo, **kwargs):
+            yield SimpleNamespace(execute=executed.append)
+
+        class FakePool:
+            check_connection = vector_store.ConnectionPool.check_connection
+
+            def __init__(self, conninfo, **kwargs):
+                created.append((conninfo, kwargs))
+
+        settings = make_pool_settings(pool_max_size=4, prepare_statements=False)
+        clients = SimpleNamespace(use_azure=False, embedding_model="text-embedding-3-large", client=object())
+        monkeypatch.setattr(vector_store, "get_settings", lambda: settings)
+        monkeypatch.setattr(vector_store, "get_llm_clients", lambda: clients)
+        monkeypatch.setattr(vector_store.psycopg, "connect", fake_connect)
+        monkeypatch.setattr(vector_store, "ConnectionPool", FakePool)
+
+        store = VectorStore()
+        assert isinstance(store.pool, FakePool)
+        assert executed == ["CREATE EXTENSION IF NOT EXISTS vector"]
+        (conninfo, kwargs), = created
+        assert conninfo == "postgresql://localhost/test"
+        # Les connexions rompues sont détectées à l'emprunt et remplacées
+        assert kwargs["check"] is FakePool.check_connection
+        assert kwargs["configure"] is vector_store.configure_connection
+        assert kwargs["open"] is True
+        assert kwargs["max_size"] == 4
+        assert kwargs["kwargs"] == {"autocommit": True, "prepare_threshold": None}
+
+    def test_pool_stats_wait_average(self):
+        stats = BaseVectorStore._pool_stats(StatsPool({"requests_queued": 4, "requests_wait_ms": 100, "pool_size": 3}))
+        assert stats["requests_wait_avg_ms"] == 25.0
+        assert stats["pool_size"] == 3
+
+    def test_pool_stats_without_queued_requests(self):
+        # Aucune requête mise en attente : pas de division par zéro
+        assert BaseVectorStore._pool_stats(StatsPool({"requests_wait_ms": 0}))["requests_wait_avg_ms"] == 0.0
+        assert BaseVectorStore._pool_stats(StatsPool({"requests_queued": 0}))["requests_wait_avg_ms"] == 0.0
+        assert BaseVectorStore._pool_stats(None) is None
@@ -0,0 +1,181 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import pytest
+
+from app.config.settings import VectorStoreSettings
+from app.database.vector_store import content_hash
+from app.services.ingest import Checkpoint, Ingestor, build_records, format_contents, record_id
+
+ROWS = pd.DataFrame([{
+    "serie_id": 1, "serie_title": "Naruto", "genre": None, "categorie": "Shonen",
+    "volume_id": 42, "volume_number": 3, "content": "Résumé",
+}])
+
+
+class TestRecordId:
+    def test_is_deterministic(self):
+        assert record_id(42, "model:256") == record_id("42", "model:256")
+
+    def test_depends_on_volume_and_model(self):
+        assert record_id(42, "model:256") != record_id(43, "model:256")
+        assert record_id(42, "model:256") != record_id(42, "model:512")
+
+
+class TestBuildRecords:
+    def test_uses_given_ids(self):
+        contents = format_contents(ROWS, "short")
+        records = build_records(ROWS, ["id-1"], contents, [[0.1, 0.2]])
+        assert records.loc[0, "id"] == "id-1"
+        assert records.loc[0, "contents"] == "Serie: Naruto\nVolume 3: Résumé"
+        assert records.loc[0, "metadata"]["genre"] == "No Genre"
+
+
+class TestCheckpoint:
+    def test_save_load_clear(self, tmp_path):
+        path = str(tmp_path / "volumes.csv.checkpoint.json")
+        checkpoint = Checkpoint(path, "volumes.csv", "full")
+        assert checkpoint.load() == 0
+        checkpoint.save(1200)
+        assert checkpoint.load() == 1200
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f)["source"] == os.path.abspath("volumes.csv")
+        checkpoint.clear()
+        assert not os.path.exists(path) and checkpoint.load() == 0
+        checkpoint.clear()
+
+    def test_rejects_other_source_or_format(self, tmp_path):
+        path = str(tmp_path / "checkpoint.json")
+        Checkpoint(path, "volumes.csv", "full").save(10)
+        with pytest.raises(ValueError):
+            Checkpoint(path, "other.csv", "full").load()
+        with pytest.raises(ValueError):
+            Checkpoint(path, "volumes.csv", "short").load()
+
+    def test_save_replaces_atomically(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "checkpoint.json")
+        checkpoint = Checkpoint(path, "volumes.csv", "full")
+        checkpoint.save(10)
+        checkpoint.save(20)
+        assert os.listdir(tmp_path) == ["checkpoint.json"] and checkpoint.load() == 20
+
+        # Une écriture interrompue avant le remplacement laisse le fichier précédent intact
+        def interrupted(src, dst):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(os, "replace", interrupted)
+        with pytest.raises(OSError):
+            checkpoint.save(30)
+        assert checkpoint.load() == 20
+
+
+class StubWriter:
+    """Magasin d'écriture consignant les volumes écrits, sans base de données."""
+
+    embedding_model = "model"
+    vector_column_type = "vector(3072)"
+
+    def __init__(self, fail_on=None, stored_hashes=None, deleted=0):
+        self.vector_settings = VectorStoreSettings()
+        self.fail_on = fail_on
+        self.stored_hashes = stored_hashes or {}
+        self.deleted = deleted
+        self.written = []
+        self.kept_ids = None
+
+    def create_tables(self):
+        pass
+
+    def get_content_hashes(self, ids):
+        return {uuid.UUID(row_id): self.stored_hashes[row_id] for row_id in ids if row_id in self.stored_hashes}
+
+    def upsert(self, records):
+        volume_ids = [metadata["volume_id"] for metadata in records["metadata"]]
+        if self.fail_on in volume_ids:
+            raise RuntimeError("connection lost")
+        self.written.extend(volume_ids)
+
+    def delete_except(self, ids):
+        self.kept_ids = list(ids)
+        return self.deleted
+
+    def supports_index(self):
+        return False
+
+
+class StubEmbedder:
+    embedding_tokens = 0
+
+    def __init__(self):
+        self.embedded = []
+
+    async def get_embeddings(self, texts, use_cache=True):
+        self.embedded.extend(texts)
+        return [[0.0, 1.0] for _ in texts]
+
+
+def make_ingestor(tmp_path, writer, rows=5):
+    csv_path = tmp_path / "volumes.csv"
+    pd.DataFrame([
+        {**ROWS.iloc[0].to_dict(), "volume_id": volume_id, "volume_number": volume_id}
+        for volume_id in range(1, rows + 1)
+    ]).to_csv(csv_path, sep=";", index=False)
+    ingestor = Ingestor.__new__(Ingestor)
+    ingestor.__dict__.update(
+        csv_path=str(csv_path), sep=";", chunk_size=2, batch_size=1, concurrency=2, content_format="full",
+        checkpoint=Checkpoint(f"{csv_path}.checkpoint.json", str(csv_path), "full"), keep_missing=False,
+        writer=writer, embedder=StubEmbedder(), rows_done=0, rows_written=0, rows_skipped=0, rows_deleted=0,
+    )
+    return ingestor
+
+
+class TestIngestorResume:
+    @pytest.mark.asyncio
+    async def test_resumes_after_rows_done(self, tmp_path):
+        writer = StubWriter()
+        ingestor = make_ingestor(tmp_path, writer)
+        await ingestor.run(start_row=2)
+        assert writer.written == ["3", "4", "5"]
+        assert ingestor.rows_done == 5 and ingestor.rows_written == 3
+        assert ingestor.checkpoint.load() == 0
+
+    @pytest.mark.asyncio
+    async def test_interrupted_run_resumes_where_it_stopped(self, tmp_path):
+        writer = StubWriter(fail_on="4")
+        ingestor = make_ingestor(tmp_path, writer)
+        with pytest.raises(RuntimeError):
+            await ingestor.run()
+        assert writer.written == ["1", "2", "3"] and ingestor.checkpoint.load() == 3
+
+        writer.fail_on = None
+        await ingestor.run(start_row=ingestor.checkpoint.load())
+        assert writer.written == ["1", "2", "3", "4", "5"]
+
+
+class TestIncrementalIngestion:
+    @pytest.mark.asyncio
+    async def test_unchanged_rows_are_skipped_and_missing_volumes_deleted(self, tmp_path):
+        writer = StubWriter(deleted=7)
+        ingestor = make_ingestor(tmp_path, writer)
+        rows = pd.read_csv(ingestor.csv_path, sep=";")
+        contents = format_contents(rows, "full")
+        ids = [record_id(volume_id, ingestor.model_version) for volume_id in rows["volume_id"]]
+        # Volumes 1 et 2 inchangés, volume 3 modifié, volumes 4 et 5 nouveaux
+        writer.stored_hashes = {ids[0]: content_hash(contents[0]), ids[1]: content_hash(contents[1]), ids[2]: "old"}
+
+        await ingestor.run()
+        assert ingestor.embedder.embedded == contents[2:]
+        assert writer.written == ["3", "4", "5"]
+        assert ingestor.rows_skipped == 2 and ingestor.rows_written == 3
+        # Seuls les enregistrements des volumes du CSV sont conservés
+        assert writer.kept_ids == ids and ingestor.rows_deleted == 7
+
+    @pytest.mark.asyncio
+    async def test_keep_missing_skips_deletion(self, tmp_path):
+        writer = StubWriter()
+        ingestor = make_ingestor(tmp_path, writer)
+        ingestor.keep_missing = True
+        await ingestor.run()
+        assert writer.kept_ids is None and ingestor.rows_deleted == 0
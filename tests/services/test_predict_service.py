@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.config.settings import PredictionCacheSettings
+from app.database.search_results import SearchResult
+from app.models.predict_request import PredictRequest
+from app.services.predict_service import PredictService
+from app.services.prediction_cache import PredictionCache
+from app.services.synthesizer import Synthesizer
+
+EXAMPLE = PredictRequest.model_config["json_schema_extra"]["example"]
+
+
+class TestTasteVector:
+    def test_volume_ids(self):
+        assert len(PredictService._volume_ids(EXAMPLE["collection"])) == 5
+        assert PredictService._volume_ids({"Naruto": {"volumes": ["a", "b"]}}) == ["a", "b"]
+        assert PredictService._volume_ids("{}") == []
+
+    def test_weighted_taste_vector(self):
+        stored = {"a": np.array([2.0, 0.0], dtype=np.float32), "b": np.array([0.0, 1.0], dtype=np.float32)}
+        taste = PredictService._weighted_taste_vector(stored, {"a": 1.0, "b": 3.0})
+        np.testing.assert_allclose(taste, np.array([1.0, 3.0]) / np.sqrt(10), rtol=1e-6)
+
+    def test_null_taste_vector(self):
+        stored = {"a": np.array([1.0, 0.0], dtype=np.float32)}
+        assert PredictService._weighted_taste_vector(stored, {"a": 0.0}) is None
+
+
+class TestSearchResults:
+    def test_first_per_series(self):
+        results = [
+            SearchResult("a", {"serie_id": "s1"}, None, None, 0.9),
+            SearchResult("b", {"serie_id": "s1"}, None, None, 0.8),
+            SearchResult("c", {"serie_id": "s2"}, None, None, 0.7),
+        ]
+        assert [r.id for r in PredictService._first_per_series(results, 10)] == ["a", "c"]
+        assert [r.id for r in PredictService._first_per_series(results, 1)] == ["a"]
+
+
+class Completions:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def create(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" Bonne lecture !"))])
+
+
+def make_service(completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    clients = SimpleNamespace(async_client=client, chat_model="model")
+    service = PredictService.__new__(PredictService)
+    service.synthesizer = Synthesizer(clients=clients)
+    service.synthesizer.semantic_cache = None
+    service.prediction_cache = PredictionCache(PredictionCacheSettings(enabled=True))
+
+    async def search(request, limit=10):
+        return []
+
+    service._search_similar_volumes = search
+    return service
+
+
+class TestPredictionCaching:
+    @pytest.mark.asyncio
+    async def test_generated_response_is_cached(self):
+        service = make_service(Completions())
+        response, status = await service.predict_cached(PredictRequest(**EXAMPLE))
+        assert status == "MISS" and response.responce_IA_global == "Bonne lecture !"
+        assert (await service.predict_cached(PredictRequest(**EXAMPLE)))[1] == "HIT"
+
+    @pytest.mark.asyncio
+    async def test_fallback_response_is_not_cached(self):
+        service = make_service(Completions(error=RuntimeError("boom")))
+        response, status = await service.predict_cached(PredictRequest(**EXAMPLE))
+        assert response.status == "success" and response.responce_IA_global.startswith("Voici mes recommandations")
+        # La réponse de repli cite l'âge et le genre : elle n'est pas servie à un autre profil de la tranche
+        assert (await service.predict_cached(PredictRequest(**EXAMPLE)))[1] == "MISS"
+        assert service.prediction_cache.stats()["size"] == 0
@@ -0,0 +1,78 @@
+import copy
+from datetime import timedelta
+
+from app.config.settings import PredictionCacheSettings
+from app.models.predict_request import PredictRequest
+from app.models.predict_response import PredictResponse
+from app.services.prediction_cache import PredictionCache
+
+EXAMPLE = PredictRequest.model_config["json_schema_extra"]["example"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_request(**overrides):
+    data = copy.deepcopy(EXAMPLE)
+    data.update(overrides)
+    return PredictRequest(**data)
+
+
+def make_cache(max_size=2, ttl_seconds=60):
+    clock = FakeClock()
+    settings = PredictionCacheSettings(enabled=True, max_size=max_size, ttl=timedelta(seconds=ttl_seconds))
+    return PredictionCache(settings, clock=clock), clock
+
+
+def make_response(text="ok"):
+    return PredictResponse(serie_recomendees=[], status="success", responce_IA_global=text)
+
+
+class TestPredictionCacheKey:
+    def test_equivalent_profiles_share_a_key(self):
+        collection = dict(reversed(list(EXAMPLE["collection"].items())))
+        collection["Hunter X Hunter"] = {
+            "id_series": collection["Hunter X Hunter"]["id_series"],
+            "volumes": dict(reversed(list(collection["Hunter X Hunter"]["volumes"].items()))),
+        }
+        equivalent = make_request(collection=collection, user_mood=" comique", user_age="30")
+        assert PredictionCache.make_key(equivalent) == PredictionCache.make_key(make_request())
+
+    def test_different_profiles_have_different_keys(self):
+        key = PredictionCache.make_key(make_request())
+        assert PredictionCache.make_key(make_request(user_age="17")) != key
+        assert PredictionCache.make_key(make_request(category_preference="Romance")) != key
+        assert PredictionCache.make_key(make_request(read=None)) != key
+
+
+class TestPredictionCache:
+    def test_hit_and_ttl_expiration(self):
+        cache, clock = make_cache(ttl_seconds=10)
+        cache.put("a", make_response(), cache.generation)
+        assert cache.get("a").responce_IA_global == "ok"
+        clock.now = 11
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1
+
+    def test_lru_eviction(self):
+        cache, _ = make_cache(max_size=2)
+        cache.put("a", make_response("a"), cache.generation)
+        cache.put("b", make_response("b"), cache.generation)
+        cache.get("a")
+        cache.put("c", make_response("c"), cache.generation)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+    def test_invalidation_discards_stale_predictions(self):
+        cache, _ = make_cache()
+        generation = cache.generation
+        cache.put("a", make_response(), generation)
+        cache.invalidate("embeddings")
+        assert cache.get("a") is None
+        cache.put("b", make_response(), generation)
+        assert cache.get("b") is None
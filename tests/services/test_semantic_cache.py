@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from app.config.settings import SemanticCacheSettings
+from app.services.semantic_cache import SemanticResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(max_size=2, threshold=0.9, ttl_seconds=60):
+    clock = FakeClock()
+    settings = SemanticCacheSettings(
+        enabled=True, threshold=threshold, max_size=max_size, ttl=timedelta(seconds=ttl_seconds)
+    )
+    return SemanticResponseCache(settings, clock=clock), clock
+
+
+class TestSemanticResponseCache:
+    def test_exact_and_semantic_hits(self):
+        cache, _ = make_cache()
+        cache.put("context", [1.0, 0.0], "answer")
+        assert cache.get_exact("context") == "answer"
+        assert cache.get_exact("other context") is None
+        assert cache.get_similar([0.99, 0.05]) == "answer"
+        assert cache.get_similar([0.0, 1.0]) is None
+        stats = cache.stats()
+        assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache, _ = make_cache(max_size=2)
+        cache.put("a", [1.0, 0.0], "a")
+        cache.put("b", [0.0, 1.0], "b")
+        cache.get_exact("a")
+        cache.put("c", [-1.0, 0.0], "c")
+        assert cache.get_exact("b") is None
+        assert cache.get_exact("a") == "a"
+        assert cache.stats()["size"] == 2
+
+    def test_expired_entries_are_not_served(self):
+        cache, clock = make_cache(ttl_seconds=10)
+        cache.put("a", [1.0, 0.0], "a")
+        clock.now = 11
+        assert cache.get_similar([1.0, 0.0]) is None
+        assert cache.stats()["size"] == 0
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.config.settings import SemanticCacheSettings
+from app.services.semantic_cache import SemanticResponseCache
+from app.services.synthesizer import FallbackResponse, Synthesizer
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class StreamingCompletions:
+    def __init__(self, contents=None, error=None):
+        self.contents = contents or []
+        self.error = error
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+
+        async def stream():
+            for content in self.contents:
+                yield chunk(content)
+
+        return stream()
+
+
+class FixedEmbeddings:
+    async def create(self, input, model, dimensions):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])])
+
+
+def make_synthesizer(completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions), embeddings=FixedEmbeddings())
+    clients = SimpleNamespace(async_client=client, client=None, chat_model="model", embedding_model="embedding")
+    settings = SemanticCacheSettings(enabled=True, threshold=0.9, max_size=4, ttl=timedelta(hours=1))
+    return Synthesizer(clients=clients, semantic_cache=SemanticResponseCache(settings))
+
+
+async def collect(synthesizer, use_cache=True, user_age=25):
+    user_profile = {"user_genre": "Homme", "user_age": user_age, "category_preference": "Manga"}
+    return [
+        fragment
+        async for fragment in synthesizer.astream_global_response([], user_profile, use_cache=use_cache)
+    ]
+
+
+class TestSynthesizerStreaming:
+    @pytest.mark.asyncio
+    async def test_streams_fragments(self):
+        synthesizer = make_synthesizer(StreamingCompletions(["  Bonjour", None, " lecteur", "", " !"]))
+        assert await collect(synthesizer) == ["Bonjour", " lecteur", " !"]
+
+    @pytest.mark.asyncio
+    async def test_fallback_when_generation_fails(self):
+        synthesizer = make_synthesizer(StreamingCompletions(error=RuntimeError("boom")))
+        fragments = await collect(synthesizer)
+        assert len(fragments) == 1
+        assert fragments[0].startswith("Voici mes recommandations")
+        assert isinstance(fragments[0], FallbackResponse)
+        # La réponse de repli n'entre pas dans le cache sémantique
+        assert synthesizer.semantic_cache.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_semantic_cache_serves_similar_contexts(self):
+        completions = StreamingCompletions(["Bonjour", " lecteur"])
+        synthesizer = make_synthesizer(completions)
+        assert await collect(synthesizer) == ["Bonjour", " lecteur"]
+        assert await collect(synthesizer, user_age=26) == ["Bonjour lecteur"]
+        assert completions.calls == 1
+        assert synthesizer.semantic_cache.stats()["semantic_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bypass_flag_skips_the_cache(self):
+        completions = StreamingCompletions(["Bonjour"])
+        synthesizer = make_synthesizer(completions)
+        await collect(synthesizer)
+        await collect(synthesizer, use_cache=False)
+        assert completions.calls == 2